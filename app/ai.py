@@ -1,19 +1,26 @@
 from __future__ import annotations
 
+import time
 from datetime import datetime, timedelta
-from typing import List
+from typing import Iterable, List
 
+import numpy as np
+import pandas as pd
+from sqlalchemy import desc, func, select
 from sqlalchemy.orm import Session
 
 from .models import SensorLog, SlotStatus
-from .crud import get_recent_logs, save_prediction
+from .crud import get_rollup_occupancy_ratios, save_predictions
+from .history import reading_history
+from .metrics import prediction_run_seconds
+from .occupancy_model import ROLLING_WINDOW, OccupancyModel, get_active_model
 
 
-def _compute_future_occupancy_probability(logs: List[SensorLog]) -> float:
+def _compute_future_occupancy_probability(logs: List[SensorLog], now: datetime | None = None) -> float:
     if not logs:
         return 0.3
 
-    now = datetime.utcnow()
+    now = now or datetime.utcnow()
     horizon = now - timedelta(hours=2)
     recent = [l for l in logs if l.timestamp >= horizon]
     window = recent if recent else logs
@@ -40,29 +47,190 @@ def _compute_future_occupancy_probability(logs: List[SensorLog]) -> float:
     return prob
 
 
-def generate_predictions(session: Session, valid_minutes: int = 10):
+def compute_occupancy_probabilities(
+    slot_index: np.ndarray,
+    timestamps: np.ndarray,
+    statuses: np.ndarray,
+    n_slots: int,
+    now: datetime | None = None,
+) -> np.ndarray:
+    """Vectorized ``_compute_future_occupancy_probability`` for many slots at once.
+
+    Rows must be grouped per slot in newest-first order (as ``get_recent_logs``
+    returns them) so the per-slot sums accumulate in the same order and give
+    bit-identical results.
+    """
+    now = now or datetime.utcnow()
+    horizon = np.datetime64(now - timedelta(hours=2), "us")
+    thirty_min_ago = np.datetime64(now - timedelta(minutes=30), "us")
+
+    recent = timestamps >= horizon
+    has_recent = np.bincount(slot_index[recent], minlength=n_slots) > 0
+    in_window = recent | ~has_recent[slot_index]
+
+    weights = np.where(timestamps >= thirty_min_ago, 1.5, 1.0)
+    idx = slot_index[in_window]
+    weighted_sum = np.bincount(idx, weights=(statuses * weights)[in_window], minlength=n_slots)
+    weight_total = np.bincount(idx, weights=weights[in_window], minlength=n_slots)
+
+    prob = np.full(n_slots, 0.3)
+    has_logs = weight_total > 0
+    prob[has_logs] = np.clip(weighted_sum[has_logs] / weight_total[has_logs], 0.05, 0.95)
+    return prob
+
+
+def _load_recent_history(session: Session, slot_ids: List[str], limit: int = 200, only_these: bool = False):
+    """Last ``limit`` logs of every slot in one windowed query, packed into arrays."""
+    ranked = select(
+        SensorLog.slot_id,
+        SensorLog.timestamp,
+        SensorLog.status,
+        func.row_number()
+        .over(partition_by=SensorLog.slot_id, order_by=(desc(SensorLog.timestamp), desc(SensorLog.id)))
+        .label("rn"),
+    )
+    if only_these:
+        ranked = ranked.where(SensorLog.slot_id.in_(slot_ids))
+    ranked = ranked.subquery()
+    stmt = (
+        select(ranked.c.slot_id, ranked.c.timestamp, ranked.c.status)
+        .where(ranked.c.rn <= limit)
+        .order_by(ranked.c.slot_id, ranked.c.rn)
+    )
+    position = {slot_id: i for i, slot_id in enumerate(slot_ids)}
+    rows = [(position[sid], ts, st) for sid, ts, st in session.execute(stmt) if sid in position]
+    if not rows:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype="datetime64[us]"), np.empty(0, dtype=np.int64)
+    slot_index, timestamps, statuses = zip(*rows)
+    return (
+        np.asarray(slot_index, dtype=np.intp),
+        np.asarray(timestamps, dtype="datetime64[us]"),
+        np.asarray(statuses, dtype=np.int64),
+    )
+
+
+def _classify(current_status: str, probability_occupied: float) -> tuple[str, float]:
+    if current_status == SlotStatus.available.value:
+        predicted_status = (
+            SlotStatus.predicted_occupied.value if probability_occupied >= 0.6 else SlotStatus.available.value
+        )
+    else:
+        predicted_status = SlotStatus.occupied.value
+
+    confidence = probability_occupied if predicted_status != SlotStatus.available.value else 1 - probability_occupied
+    return predicted_status, round(confidence, 3)
+
+
+def _rollup_probability(ratio: float) -> float:
+    return max(0.05, min(0.95, ratio))
+
+
+def _model_probabilities(
+    model: OccupancyModel,
+    slots: list,
+    slot_index: np.ndarray,
+    timestamps: np.ndarray,
+    statuses: np.ndarray,
+) -> np.ndarray:
+    """All-slots-at-once inference with the trained model; NaN for slots without raw readings.
+
+    Each slot is fed the row training built for its newest reading: hour and
+    weekday of that reading, its status and the occupancy of the last
+    ROLLING_WINDOW readings, so the model answers "occupied at the next reading".
+    """
+    n_slots = len(slots)
+    # rank of each row within its slot (rows are newest-first per slot)
+    order = np.argsort(slot_index, kind="stable")
+    counts = np.bincount(slot_index, minlength=n_slots)
+    starts = np.cumsum(counts) - counts
+    rank = np.empty(len(slot_index), dtype=np.intp)
+    rank[order] = np.arange(len(slot_index)) - starts[slot_index[order]]
+    window = rank < ROLLING_WINDOW
+    occupied = np.bincount(slot_index[window], weights=statuses[window], minlength=n_slots)
+    seen = np.bincount(slot_index[window], minlength=n_slots)
+    newest = rank == 0
+    with_logs = np.flatnonzero(seen > 0)
+    probabilities = np.full(n_slots, np.nan)
+    if not len(with_logs):
+        return probabilities
+
+    last_timestamp = np.empty(n_slots, dtype="datetime64[us]")
+    last_timestamp[slot_index[newest]] = timestamps[newest]
+    last_status = np.zeros(n_slots, dtype=np.int64)
+    last_status[slot_index[newest]] = statuses[newest]
+    when = pd.DatetimeIndex(last_timestamp[with_logs])
+    frame = pd.DataFrame(
+        {
+            "hour": when.hour + when.minute / 60,
+            "weekday": when.weekday,
+            "status": last_status[with_logs],
+            "rolling_occupancy": occupied[with_logs] / seen[with_logs],
+            "zone": [slots[i].zone for i in with_logs],
+            "distance_from_entry": [slots[i].distance_from_entry for i in with_logs],
+        }
+    )
+    probabilities[with_logs] = np.clip(model.predict_proba(frame), 0.05, 0.95)
+    return probabilities
+
+
+def _predict_slots(session: Session, slots: list, only_these: bool = False) -> list[tuple[str, str, float]]:
+    now = datetime.utcnow()
+    slot_ids = [slot.slot_id for slot in slots]
+    if reading_history.ready:
+        slot_index, timestamps, statuses = reading_history.recent(slot_ids)
+    else:
+        slot_index, timestamps, statuses = _load_recent_history(session, slot_ids, only_these=only_these)
+    without_logs = np.flatnonzero(np.bincount(slot_index, minlength=len(slots)) == 0)
+    fallback_ratios: dict[int, float] = {}
+    if len(without_logs):
+        # raw history compacted away: fall back to the hourly rollups
+        ratios = get_rollup_occupancy_ratios(session, [slots[i].slot_id for i in without_logs])
+        fallback_ratios = {int(i): ratios[slots[i].slot_id] for i in without_logs if slots[i].slot_id in ratios}
+
+    model = get_active_model()
+    if model is not None:
+        probabilities = _model_probabilities(model, slots, slot_index, timestamps, statuses)
+        # slots with only rollups (or nothing) stay on the heuristic: training never saw such a row
+        probabilities[without_logs] = 0.3  # the heuristic's value for a slot without readings
+        for i, ratio in fallback_ratios.items():
+            probabilities[i] = _rollup_probability(ratio)
+    else:
+        probabilities = compute_occupancy_probabilities(slot_index, timestamps, statuses, len(slots), now=now)
+        for i, ratio in fallback_ratios.items():
+            probabilities[i] = _rollup_probability(ratio)
+
+    rows = []
+    for slot, probability_occupied in zip(slots, probabilities.tolist()):
+        predicted_status, confidence = _classify(slot.current_status, probability_occupied)
+        rows.append((slot.slot_id, predicted_status, confidence))
+    return rows
+
+
+def refresh_slot_predictions(session: Session, slot_ids: Iterable[str], valid_minutes: int = 10):
+    """Recompute predictions only for the given slots (incremental path used on ingest)."""
     from .models import ParkingSlot  # local import to avoid circular
 
-    slots = session.query(ParkingSlot).all()
-    for slot in slots:
-        logs = get_recent_logs(session, slot.slot_id, limit=200)
-        probability_occupied = _compute_future_occupancy_probability(logs)
+    start = time.perf_counter()
+    slot_ids = list(dict.fromkeys(slot_ids))
+    # one IN select: session.get() would reload each slot the commit before us expired
+    found = {slot.slot_id: slot for slot in session.scalars(select(ParkingSlot).where(ParkingSlot.slot_id.in_(slot_ids)))}
+    slots = [found[slot_id] for slot_id in slot_ids if slot_id in found]
+    if slots:
+        save_predictions(session, _predict_slots(session, slots, only_these=True), valid_minutes=valid_minutes)
+    session.commit()
+    prediction_run_seconds.observe(time.perf_counter() - start, "incremental")
 
-        if slot.current_status == SlotStatus.available.value:
-            predicted_status = (
-                SlotStatus.predicted_occupied.value if probability_occupied >= 0.6 else SlotStatus.available.value
-            )
-        else:
-            predicted_status = SlotStatus.occupied.value
 
-        confidence = probability_occupied if predicted_status != SlotStatus.available.value else 1 - probability_occupied
-        confidence = round(confidence, 3)
+def generate_predictions(session: Session, valid_minutes: int = 10):
+    """Full sweep over every slot; use for startup and scheduled retraining, not per update.
+
+    Uses the trained model from ``app.occupancy_model`` when one is loaded and
+    the recency-weighted heuristic otherwise.
+    """
+    from .models import ParkingSlot  # local import to avoid circular
 
-        save_prediction(
-            session=session,
-            slot_id=slot.slot_id,
-            predicted_status=predicted_status,
-            confidence=confidence,
-            valid_minutes=valid_minutes,
-        )
+    start = time.perf_counter()
+    slots = session.query(ParkingSlot).order_by(ParkingSlot.slot_id).all()
+    save_predictions(session, _predict_slots(session, slots), valid_minutes=valid_minutes)
     session.commit()
+    prediction_run_seconds.observe(time.perf_counter() - start, "full")
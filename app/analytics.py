@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import DateTime, Integer, and_, case, cast, delete, desc, func, literal, literal_column, select, type_coerce
+from sqlalchemy.orm import Session, aliased
+
+from .config import get_settings
+from .models import ParkingSlot, SensorLog, SlotOccupancyHourly, ZoneOccupancy
+from .schemas import OccupancyAnalyticsResponse, OccupancyBucketOut
+
+BUCKETS = {"15m": timedelta(minutes=15), "1h": timedelta(hours=1), "1d": timedelta(days=1)}
+QUARTER = BUCKETS["15m"]
+
+
+def time_bucket(session: Session, column, bucket: str):
+    """Start of the 15m/1h/1d bucket containing ``column``, computed by the database."""
+    if session.get_bind().dialect.name == "sqlite":
+        # slicing SQLAlchemy's "YYYY-MM-DD HH:MM:SS.ffffff" text is much cheaper than strftime()
+        if bucket == "15m":
+            minute = func.printf("%02d", cast(func.substr(column, 15, 2), Integer) // 15 * 15)
+            text = func.substr(column, 1, 14).concat(minute).concat(":00.000000")
+        elif bucket == "1h":
+            text = func.substr(column, 1, 13).concat(":00:00.000000")
+        else:
+            text = func.substr(column, 1, 10).concat(" 00:00:00.000000")
+        return type_coerce(text, DateTime)
+    if bucket == "15m":
+        quarters = func.floor(func.date_part("minute", column) / 15)
+        return type_coerce(func.date_trunc("hour", column) + quarters * literal_column("interval '15 minutes'"), DateTime)
+    return func.date_trunc("hour" if bucket == "1h" else "day", column)
+
+
+def floor_bucket(moment: datetime, bucket: str = "15m") -> datetime:
+    if bucket == "1d":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == "1h":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(minute=moment.minute // 15 * 15, second=0, microsecond=0)
+
+
+def _zone_column():
+    return func.coalesce(ParkingSlot.zone, "")
+
+
+def _raw_rows(
+    session: Session,
+    start: datetime,
+    end: datetime,
+    bucket: str,
+    floor: Optional[str] = None,
+    zone: Optional[str] = None,
+):
+    """(floor, zone, bucket, samples, occupied, arrivals) aggregated from raw logs in [start, end)."""
+    window = (
+        select(ParkingSlot.floor, _zone_column().label("zone"), SensorLog.id, SensorLog.slot_id, SensorLog.timestamp, SensorLog.status)
+        .join(ParkingSlot, ParkingSlot.slot_id == SensorLog.slot_id)
+        .where(SensorLog.timestamp >= start, SensorLog.timestamp < end)
+    )
+    if floor:
+        window = window.where(ParkingSlot.floor == floor)
+    if zone is not None:
+        window = window.where(_zone_column() == zone)
+    # materialized so the range is read through the timestamp index instead of
+    # walking the whole (slot_id, timestamp) index in partition order
+    window = window.cte("log_window").prefix_with("MATERIALIZED")
+    earlier = aliased(SensorLog)
+    # the reading before the window decides whether the window's first reading is an arrival
+    before_window = (
+        select(earlier.status)
+        .where(earlier.slot_id == window.c.slot_id, earlier.timestamp < start)
+        .order_by(desc(earlier.timestamp), desc(earlier.id))
+        .limit(1)
+        .scalar_subquery()
+    )
+    previous = func.coalesce(
+        func.lag(window.c.status).over(partition_by=window.c.slot_id, order_by=(window.c.timestamp, window.c.id)),
+        before_window,
+    )
+    logs = select(
+        window.c.floor, window.c.zone, window.c.timestamp, window.c.status, previous.label("previous")
+    ).subquery()
+    bucket_start = time_bucket(session, logs.c.timestamp, bucket)
+    arrival = case((and_(logs.c.status == 1, logs.c.previous == 0), 1), else_=0)
+    stmt = select(
+        logs.c.floor,
+        logs.c.zone,
+        bucket_start,
+        func.count(),
+        func.sum(logs.c.status),
+        func.sum(arrival),
+    ).group_by(logs.c.floor, logs.c.zone, bucket_start)
+    return session.execute(stmt).all()
+
+
+def _compacted_rows(session: Session, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Floor/zone totals of the per-slot hourly rollups (logs compacted before the analytics rollup existed)."""
+    stmt = (
+        select(
+            ParkingSlot.floor,
+            _zone_column(),
+            SlotOccupancyHourly.hour,
+            func.sum(SlotOccupancyHourly.samples),
+            func.sum(SlotOccupancyHourly.occupied_samples),
+            literal(0),
+        )
+        .join(ParkingSlot, ParkingSlot.slot_id == SlotOccupancyHourly.slot_id)
+        .group_by(ParkingSlot.floor, _zone_column(), SlotOccupancyHourly.hour)
+    )
+    if start is not None:
+        stmt = stmt.where(SlotOccupancyHourly.hour >= start, SlotOccupancyHourly.hour < end)
+    return session.execute(stmt).all()
+
+
+def _add_rows(totals: dict, rows):
+    for *key, samples, occupied, arrivals in rows:
+        entry = totals.setdefault(tuple(key), [0, 0, 0])
+        entry[0] += samples
+        entry[1] += int(occupied or 0)
+        entry[2] += int(arrivals or 0)
+    return totals
+
+
+def _replace_grain(session: Session, grain: str, start: datetime, end: datetime, totals: dict):
+    """Swap the ``grain`` rows in [start, end) for ``totals`` keyed by (floor, zone, bucket_start)."""
+    from .crud import dialect_insert  # local import to avoid circular
+
+    session.execute(
+        delete(ZoneOccupancy).where(
+            ZoneOccupancy.grain == grain, ZoneOccupancy.bucket_start >= start, ZoneOccupancy.bucket_start < end
+        )
+    )
+    if not totals:
+        return
+    # upsert rather than insert: another worker may be refreshing the same buckets
+    stmt = dialect_insert(session, ZoneOccupancy)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ZoneOccupancy.grain, ZoneOccupancy.floor, ZoneOccupancy.zone, ZoneOccupancy.bucket_start],
+        set_={
+            "samples": stmt.excluded.samples,
+            "occupied_samples": stmt.excluded.occupied_samples,
+            "arrivals": stmt.excluded.arrivals,
+        },
+    )
+    session.execute(
+        stmt,
+        [
+            {
+                "grain": grain,
+                "floor": floor,
+                "zone": zone,
+                "bucket_start": bucket_start,
+                "samples": samples,
+                "occupied_samples": occupied,
+                "arrivals": arrivals,
+            }
+            for (floor, zone, bucket_start), (samples, occupied, arrivals) in totals.items()
+        ],
+    )
+
+
+def _ceil_bucket(moment: datetime, bucket: str = "15m") -> datetime:
+    start = floor_bucket(moment, bucket)
+    return start if start == moment else start + BUCKETS[bucket]
+
+
+def _rebuild_coarse_grains(session: Session, start: datetime, end: datetime):
+    """Recompute the 1h/1d rows overlapping [start, end) from the 15m rows."""
+    for grain in ("1h", "1d"):
+        grain_start, grain_end = floor_bucket(start, grain), _ceil_bucket(end, grain)
+        bucket_start = time_bucket(session, ZoneOccupancy.bucket_start, grain)
+        rows = session.execute(
+            select(
+                ZoneOccupancy.floor,
+                ZoneOccupancy.zone,
+                bucket_start,
+                func.sum(ZoneOccupancy.samples),
+                func.sum(ZoneOccupancy.occupied_samples),
+                func.sum(ZoneOccupancy.arrivals),
+            )
+            .where(
+                ZoneOccupancy.grain == "15m",
+                ZoneOccupancy.bucket_start >= grain_start,
+                ZoneOccupancy.bucket_start < grain_end,
+            )
+            .group_by(ZoneOccupancy.floor, ZoneOccupancy.zone, bucket_start)
+        )
+        _replace_grain(session, grain, grain_start, grain_end, _add_rows({}, rows))
+
+
+def refresh_occupancy_rollup(
+    session: Session, now: Optional[datetime] = None, lookback: Optional[timedelta] = None
+) -> int:
+    """Rebuild recent closed 15-minute buckets of ``zone_occupancy`` from raw logs, then their 1h/1d buckets.
+
+    Buckets are replaced, not incremented, so running it from several workers or
+    repeating it is harmless. The last ``lookback`` is recomputed to pick up late
+    readings; buckets whose raw logs were partly compacted are never rebuilt. The
+    first run also seeds the hours already compacted into slot_occupancy_hourly.
+    Returns the number of 15-minute rows written.
+    """
+    if lookback is None:
+        lookback = timedelta(minutes=get_settings().analytics_rollup_lookback_minutes)
+    end = floor_bucket(now or datetime.utcnow())
+    oldest = session.scalar(select(func.min(SensorLog.timestamp)))
+    last = session.scalar(select(func.max(ZoneOccupancy.bucket_start)).where(ZoneOccupancy.grain == "15m"))
+
+    totals: dict[tuple, list[int]] = {}
+    if last is None:
+        _add_rows(totals, _compacted_rows(session))
+        start = floor_bucket(oldest) if oldest is not None else end
+    else:
+        start = last - lookback
+        if oldest is not None:
+            start = max(start, _ceil_bucket(oldest))
+    if start < end:
+        _add_rows(totals, _raw_rows(session, start, end, "15m"))
+    start = min([start] + [bucket_start for _, _, bucket_start in totals])
+    if start >= end:
+        return 0
+    _replace_grain(session, "15m", start, end, totals)
+
+    _rebuild_coarse_grains(session, start, end)
+    session.commit()
+    return len(totals)
+
+
+def backfill_occupancy_rollup(session: Session, start: datetime, end: datetime) -> int:
+    """Rebuild the rollup for [start, end) from raw logs, e.g. after importing history.
+
+    ``refresh_occupancy_rollup`` only looks back ``lookback`` from its last
+    bucket, so readings older than that (a CSV import) never reach the rollup
+    without this. The range is widened to whole hours and clipped to what the
+    rollup already covers; later buckets are the regular refresh's. Hours
+    already compacted into slot_occupancy_hourly are added back, so buckets
+    whose raw logs are partly gone keep their totals.
+    Returns the number of 15-minute rows written.
+    """
+    last = session.scalar(select(func.max(ZoneOccupancy.bucket_start)).where(ZoneOccupancy.grain == "15m"))
+    if last is None:
+        # nothing rolled up yet: the first refresh covers all raw history
+        return refresh_occupancy_rollup(session)
+    start, end = floor_bucket(start, "1h"), min(_ceil_bucket(end, "1h"), last + QUARTER)
+    if start >= end:
+        return 0
+    totals = _add_rows({}, _raw_rows(session, start, end, "15m"))
+    _add_rows(totals, _compacted_rows(session, start, end))
+    _replace_grain(session, "15m", start, end, totals)
+    _rebuild_coarse_grains(session, start, end)
+    session.commit()
+    return len(totals)
+
+
+def occupancy_report(
+    session: Session,
+    start: datetime,
+    end: datetime,
+    bucket: str = "1h",
+    floor: Optional[str] = None,
+    zone: Optional[str] = None,
+    peaks: int = 3,
+) -> OccupancyAnalyticsResponse:
+    """Occupancy ratio, arrivals/turnover and peak buckets for a floor/zone over [start, end).
+
+    The range is widened to whole buckets. Rolled-up periods are read from the
+    ``zone_occupancy`` rows of the requested grain; only the stretch after the
+    last rolled-up 15 minutes is aggregated from raw logs. Everything is summed
+    by the database, and Python only merges the per-bucket totals.
+    """
+    start = floor_bucket(start, bucket)
+    if floor_bucket(end, bucket) != end:
+        end = floor_bucket(end, bucket) + BUCKETS[bucket]
+    last = session.scalar(select(func.max(ZoneOccupancy.bucket_start)).where(ZoneOccupancy.grain == "15m"))
+    split = max(start, last + QUARTER) if last is not None else start
+    split = min(split, end)
+
+    totals: dict[tuple, list[int]] = {}
+    if start < split:
+        # a coarse bucket straddling ``split`` holds exactly the 15m rows before it; the raw tail adds the rest
+        stmt = (
+            select(
+                ZoneOccupancy.bucket_start,
+                func.sum(ZoneOccupancy.samples),
+                func.sum(ZoneOccupancy.occupied_samples),
+                func.sum(ZoneOccupancy.arrivals),
+            )
+            .where(ZoneOccupancy.grain == bucket, ZoneOccupancy.bucket_start >= start, ZoneOccupancy.bucket_start < split)
+            .group_by(ZoneOccupancy.bucket_start)
+        )
+        if floor:
+            stmt = stmt.where(ZoneOccupancy.floor == floor)
+        if zone is not None:
+            stmt = stmt.where(ZoneOccupancy.zone == zone)
+        _add_rows(totals, session.execute(stmt))
+    if split < end:
+        _add_rows(totals, (row[2:] for row in _raw_rows(session, split, end, bucket, floor, zone)))
+
+    slot_count = select(func.count()).select_from(ParkingSlot)
+    if floor:
+        slot_count = slot_count.where(ParkingSlot.floor == floor)
+    if zone is not None:
+        slot_count = slot_count.where(_zone_column() == zone)
+    slots = session.scalar(slot_count) or 0
+
+    def bucket_out(moment: datetime, samples: int, occupied: int, arrivals: int) -> OccupancyBucketOut:
+        return OccupancyBucketOut(
+            start=moment,
+            samples=samples,
+            occupancy_ratio=round(occupied / samples, 4) if samples else None,
+            arrivals=arrivals,
+            turnover=round(arrivals / slots, 4) if slots else 0.0,
+        )
+
+    buckets = [bucket_out(moment, *values) for (moment,), values in sorted(totals.items())]
+    samples, occupied, arrivals = (sum(values[i] for values in totals.values()) for i in range(3))
+    summary = bucket_out(start, samples, occupied, arrivals)
+    return OccupancyAnalyticsResponse(
+        floor=floor,
+        zone=zone,
+        bucket=bucket,
+        start=start,
+        end=end,
+        slots=slots,
+        samples=summary.samples,
+        occupancy_ratio=summary.occupancy_ratio,
+        arrivals=summary.arrivals,
+        turnover=summary.turnover,
+        peaks=sorted(buckets, key=lambda b: (-(b.occupancy_ratio or 0.0), b.start))[:peaks],
+        buckets=buckets,
+    )
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[dict], None]
+
+
+class InProcessBroadcast:
+    """Events only reach connections of the worker that published them (single-process deployments)."""
+
+    def __init__(self):
+        self._deliver: Deliver | None = None
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        self._deliver = None
+
+    async def publish(self, event: dict):
+        if self._deliver is not None:
+            self._deliver(event)
+
+    def stats(self) -> dict:
+        return {}
+
+
+class RedisBroadcast:
+    """Redis pub/sub fan-out: every worker publishes to one channel and delivers what it receives.
+
+    A worker's own events come back through the subscription as well, so local
+    and remote dashboards see the same order. If Redis is unreachable, events
+    are delivered locally and counted in ``publish_errors``.
+    """
+
+    def __init__(self, url: str, channel: str = "parksmart:slot_updates", reconnect_seconds: float = 1.0):
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:  # optional dependency
+            raise RuntimeError("BROADCAST_BACKEND=redis needs the 'redis' package") from exc
+        self._redis = redis.from_url(url)
+        self.channel = channel
+        self.reconnect_seconds = reconnect_seconds
+        self._deliver: Deliver | None = None
+        self._listener: asyncio.Task | None = None
+        self._subscribed = asyncio.Event()
+        self.published = 0
+        self.received = 0
+        self.publish_errors = 0
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+            # don't accept traffic before we can hear our own events
+            try:
+                await asyncio.wait_for(self._subscribed.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                logger.warning("Redis broadcast not subscribed yet; continuing and retrying in the background")
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        await self._redis.aclose()
+
+    async def publish(self, event: dict):
+        try:
+            await self._redis.publish(self.channel, json.dumps(event, default=str))
+            self.published += 1
+        except Exception:
+            self.publish_errors += 1
+            logger.exception("Redis publish failed; delivering to local connections only")
+            if self._deliver is not None:
+                self._deliver(event)
+
+    async def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                self._subscribed.set()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    self.received += 1
+                    if self._deliver is not None:
+                        self._deliver(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._subscribed.clear()
+                logger.exception("Redis subscription lost; reconnecting")
+                await asyncio.sleep(self.reconnect_seconds)
+            finally:
+                await pubsub.aclose()
+
+    def stats(self) -> dict:
+        return {"published": self.published, "received": self.received, "publish_errors": self.publish_errors}
+
+
+def create_broadcast(backend: str, redis_url: str, channel: str):
+    if backend == "redis":
+        return RedisBroadcast(redis_url, channel)
+    return InProcessBroadcast()
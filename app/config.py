@@ -1,4 +1,6 @@
-from pydantic import Field
+from typing import Literal
+
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings
 
 
@@ -8,13 +10,101 @@ class Settings(BaseSettings):
         default="sqlite:///./parksmart.db",
         description="SQLAlchemy database URL",
     )
+    # optional replica for read-only endpoints (map, recommendation, predictions)
+    database_read_url: str | None = None
+    # "tuned": SQLite WAL + pragmas, PostgreSQL pool sizing/pre-ping; "default": driver defaults
+    database_profile: Literal["tuned", "default"] = "tuned"
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL"] = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size_kib: int = 64 * 1024
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_pre_ping: bool = True
+    db_pool_recycle_seconds: int = 1800
     cors_origins: list[str] = ["*"]
     prediction_valid_minutes: int = 10
     websocket_broadcast_queue: int = 100
+    websocket_client_queue: int = 100
+    websocket_slow_client_seconds: float = 5.0
+    websocket_batch_window_ms: int = 100
+    websocket_replay_buffer: int = 1000
+    # "redis" fans WebSocket events out across workers/replicas over pub/sub
+    broadcast_backend: Literal["memory", "redis"] = "memory"
+    broadcast_redis_url: str = "redis://localhost:6379/0"
+    broadcast_channel: str = "parksmart:slot_updates"
+    device_cache_ttl_seconds: float = 60.0
+    device_cache_max_size: int = 10000
+    device_last_seen_flush_seconds: float = 5.0
+    # how often a worker checks for devices disabled/re-keyed elsewhere (scripts/manage_devices.py,
+    # other workers); this, not the cache TTL, bounds how long a revoked key keeps working. 0 disables
+    device_invalidation_poll_seconds: float = 1.0
+    # write-behind ingest: queue readings and group-commit them in batches
+    ingest_write_behind: bool = False
+    ingest_queue_size: int = 10000
+    ingest_batch_max_items: int = 500
+    ingest_batch_max_delay_ms: int = 50
+    ingest_enqueue_timeout_ms: int = 200
+    # "queued" acks once the reading is queued, "committed" waits for its batch commit
+    ingest_ack_mode: Literal["queued", "committed"] = "committed"
+    # raw sensor_logs older than this are compacted into hourly rollups; scripts/compact_logs.py
+    # keeps them for model_training_days at least, since training reads raw readings only
+    log_raw_retention_hours: int = 72
+    log_compaction_batch_size: int = 5000
+    rollup_lookback_hours: int = 168
+    # floor/zone 15-minute rollups behind /api/analytics; 0 disables the in-app refresh loop
+    analytics_rollup_interval_seconds: float = 300.0
+    analytics_rollup_lookback_minutes: int = 60
+    analytics_max_buckets: int = 5000
+    # rows fetched and encoded per chunk by the sensor log export (endpoint and scripts/export_sensor_logs.py)
+    export_batch_size: int = 5000
+    # /api/export/sensor-logs needs this in X-Operator-Key (device keys don't grant it); unset disables it
+    operator_api_key: str = ""
+    # exports streaming at once; more get 429, since each holds a read connection for its whole stream
+    export_max_concurrent: int = 2
+    # trained occupancy model artifacts (scripts/train_predictions.py); heuristic is used when empty.
+    # "directory" keeps them in model_dir (local runs, or a volume both trainer and service mount);
+    # "database" keeps them in model_artifacts, which a trainer running elsewhere (the scheduled
+    # workflow's `railway run`) shares with the service
+    model_store: Literal["directory", "database"] = "directory"
+    model_dir: str = "models"
+    # artifacts are pickles, so loading one runs code in the API process. With MODEL_STORE=database
+    # the trainer signs each one (HMAC-SHA256) with this key and the service loads only artifacts
+    # whose signature matches; required there, so write access to the table alone is not enough
+    model_signing_key: str = ""
+    # how often the service looks for a newer artifact; 0 loads it only at startup
+    model_reload_interval_seconds: float = 900.0
+    model_training_days: int = 90
+    # serve map/predictions from the in-process slot store; it follows this process's writes only,
+    # so it defaults to off when several workers/replicas ingest (BROADCAST_BACKEND=redis)
+    slot_state_store: bool | None = None
+    # in-process reading history and recommendation index for the predictor and /recommendation;
+    # same caveat, so with BROADCAST_BACKEND=redis they default to off and the database paths are used
+    in_process_history: bool | None = None
+    # readings kept per slot in memory for the predictor and recommendation ratios (9 bytes each)
+    reading_history_size: int = 200
+    # create the schema and demo data on startup (local development); deployments run scripts/manage_db.py
+    startup_bootstrap: bool = False
+    # per-request SQL profile (query count/time, repeated statement shapes); off in production
+    sql_profiling: bool = False
+    sql_profiling_header: bool = True
+    sql_profiling_repeat_threshold: int = 5
 
     class Config:
         env_file = ".env"
 
+    @model_validator(mode="after")
+    def _in_process_defaults(self):
+        # each worker's stores only see its own writes, which is partial as soon as there are several
+        single_process = self.broadcast_backend != "redis"
+        if self.slot_state_store is None:
+            self.slot_state_store = single_process
+        if self.in_process_history is None:
+            self.in_process_history = single_process
+        if self.model_store == "database" and not self.model_signing_key:
+            raise ValueError("MODEL_STORE=database needs MODEL_SIGNING_KEY (shared by trainer and service)")
+        return self
+
 
 def get_settings() -> Settings:
     return Settings()
@@ -1,12 +1,41 @@
 from __future__ import annotations
 
+import heapq
 from datetime import datetime, timedelta
-from typing import List, Optional
-from sqlalchemy import select, func, desc
+from typing import Iterable, List, Optional
+from sqlalchemy import select, func, desc, delete, insert, update
 from sqlalchemy.orm import Session
-
-from .models import ParkingSlot, SensorLog, Prediction, SlotStatus, IoTDevice
-from .utils import generate_api_key
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .config import get_settings
+from .models import (
+    DeviceInvalidation,
+    IoTDevice,
+    ParkingSlot,
+    Prediction,
+    SensorLog,
+    SlotOccupancyHourly,
+    SlotStatus,
+    ZoneOccupancy,
+)
+from .utils import generate_api_key, to_naive_utc
+from .device_cache import device_cache
+from .database import on_commit
+from .recommendation import recommendation_index, score_slot
+from .slot_state import slot_state
+from .history import reading_history
+
+
+def dialect_insert(session: Session, model):
+    """INSERT construct with ON CONFLICT support for the session's database."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as _insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as _insert
+    else:
+        raise NotImplementedError(f"upsert not supported for {dialect}")
+    return _insert(model)
 
 
 def get_or_create_slot(
@@ -28,10 +57,21 @@ def get_or_create_slot(
         )
         session.add(slot)
         session.flush()
+        created_at = slot.last_updated
+
+        def _update_index():
+            recommendation_index.upsert_slot(slot_id, default_floor, zone, distance_from_entry, available=True)
+            slot_state.upsert_slot(
+                slot_id, default_floor, zone, distance_from_entry, SlotStatus.available.value, created_at
+            )
+
+        on_commit(session, _update_index)
     return slot
 
 
 def log_sensor_update(session: Session, slot_id: str, status: int, timestamp: datetime) -> ParkingSlot:
+    # the column drops any offset; normalize first so the in-process stores hold the same instant
+    timestamp = to_naive_utc(timestamp)
     slot = get_or_create_slot(session, slot_id)
     slot.current_status = SlotStatus.occupied.value if status == 1 else SlotStatus.available.value
     slot.last_updated = timestamp
@@ -39,19 +79,144 @@ def log_sensor_update(session: Session, slot_id: str, status: int, timestamp: da
     log = SensorLog(slot_id=slot_id, status=status, timestamp=timestamp)
     session.add(log)
     session.flush()
+    state = (slot_id, slot.floor, slot.zone, slot.distance_from_entry, slot.current_status, timestamp)
+
+    def _update_index():
+        recommendation_index.record_reading(slot_id, status, timestamp)
+        slot_state.upsert_slot(*state)
+        reading_history.append(slot_id, timestamp, status)
+
+    on_commit(session, _update_index)
     return slot
 
 
+def log_sensor_updates_bulk(
+    session: Session, readings: List[tuple[str, int, datetime]]
+) -> dict[str, ParkingSlot]:
+    """Write many (slot_id, status, timestamp) readings with set-based statements.
+
+    Missing slots are created together, the newest reading per slot decides its
+    current status, and all SensorLog rows go in as one executemany INSERT.
+    The caller owns the commit.
+    """
+    readings = [(slot_id, status, to_naive_utc(timestamp)) for slot_id, status, timestamp in readings]
+    slot_ids = list(dict.fromkeys(slot_id for slot_id, _, _ in readings))
+    slots = {
+        slot.slot_id: slot
+        for slot in session.scalars(select(ParkingSlot).where(ParkingSlot.slot_id.in_(slot_ids)))
+    }
+    now = datetime.utcnow()
+    missing = [
+        ParkingSlot(
+            slot_id=slot_id,
+            floor="B1",
+            distance_from_entry=30,
+            current_status=SlotStatus.available.value,
+            last_updated=now,
+        )
+        for slot_id in slot_ids
+        if slot_id not in slots
+    ]
+    if missing:
+        session.add_all(missing)
+        slots.update({slot.slot_id: slot for slot in missing})
+
+    latest: dict[str, tuple[int, datetime]] = {}
+    for slot_id, status, timestamp in readings:
+        if slot_id not in latest or timestamp >= latest[slot_id][1]:
+            latest[slot_id] = (status, timestamp)
+    new_slots = {slot.slot_id for slot in missing}
+    changes = []
+    for slot_id, (status, timestamp) in latest.items():
+        slot = slots[slot_id]
+        current_status = SlotStatus.occupied.value if status == 1 else SlotStatus.available.value
+        if slot_id in new_slots:
+            slot.current_status = current_status
+            slot.last_updated = timestamp
+            continue
+        changes.append({"slot_id": slot_id, "current_status": current_status, "last_updated": timestamp})
+        # the UPDATE below bypasses the unit of work; keep the loaded objects in step without dirtying them
+        set_committed_value(slot, "current_status", current_status)
+        set_committed_value(slot, "last_updated", timestamp)
+    session.flush()
+    if changes:
+        # one executemany by primary key; a flush would split it wherever the changed columns differ
+        session.execute(update(ParkingSlot), changes)
+
+    session.execute(
+        insert(SensorLog),
+        [{"slot_id": slot_id, "status": status, "timestamp": timestamp} for slot_id, status, timestamp in readings],
+    )
+
+    # captured now: the ORM objects are expired once the transaction commits
+    created = [(slot.slot_id, slot.floor, slot.zone, slot.distance_from_entry) for slot in missing]
+    states = [
+        (slot.slot_id, slot.floor, slot.zone, slot.distance_from_entry, slot.current_status, slot.last_updated)
+        for slot in (slots[slot_id] for slot_id in latest)
+    ]
+
+    def _update_index():
+        for slot_id, floor, zone, distance in created:
+            recommendation_index.upsert_slot(slot_id, floor, zone, distance, True)
+        in_order = sorted(readings, key=lambda r: r[2])
+        for slot_id, status, timestamp in in_order:
+            recommendation_index.record_reading(slot_id, status, timestamp)
+        for state in states:
+            slot_state.upsert_slot(*state)
+        reading_history.extend((slot_id, timestamp, status) for slot_id, status, timestamp in in_order)
+
+    on_commit(session, _update_index)
+    return slots
+
+
 def get_recent_logs(session: Session, slot_id: str, limit: int = 200):
     stmt = (
         select(SensorLog)
         .where(SensorLog.slot_id == slot_id)
-        .order_by(desc(SensorLog.timestamp))
+        .order_by(desc(SensorLog.timestamp), desc(SensorLog.id))
         .limit(limit)
     )
     return list(session.scalars(stmt))
 
 
+def save_predictions(session: Session, predictions: List[tuple[str, str, float]], valid_minutes: int):
+    """Upsert (slot_id, predicted_status, confidence) rows in one executemany statement."""
+    if not predictions:
+        return
+    now = datetime.utcnow()
+    valid_until = now + timedelta(minutes=valid_minutes)
+    stmt = dialect_insert(session, Prediction)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Prediction.slot_id],
+        set_={
+            "prediction_time": stmt.excluded.prediction_time,
+            "predicted_status": stmt.excluded.predicted_status,
+            "confidence": stmt.excluded.confidence,
+            "valid_until": stmt.excluded.valid_until,
+        },
+    )
+    session.execute(
+        stmt,
+        [
+            {
+                "slot_id": slot_id,
+                "prediction_time": now,
+                "predicted_status": predicted_status,
+                "confidence": confidence,
+                "valid_until": valid_until,
+            }
+            for slot_id, predicted_status, confidence in predictions
+        ],
+    )
+
+    def _update_index():
+        for slot_id, predicted_status, confidence in predictions:
+            recommendation_index.set_prediction(slot_id, predicted_status, confidence)
+        slot_state.set_predictions(predictions, valid_until)
+
+    on_commit(session, _update_index)
+
+
 def save_prediction(
     session: Session,
     slot_id: str,
@@ -59,31 +224,73 @@ def save_prediction(
     confidence: float,
     valid_minutes: int,
 ):
-    now = datetime.utcnow()
-    valid_until = now + timedelta(minutes=valid_minutes)
-
-    # upsert-like: delete previous predictions for slot
-    session.query(Prediction).filter(Prediction.slot_id == slot_id).delete()
-    prediction = Prediction(
-        slot_id=slot_id,
-        prediction_time=now,
-        predicted_status=predicted_status,
-        confidence=confidence,
-        valid_until=valid_until,
-    )
-    session.add(prediction)
-    session.flush()
-    return prediction
+    save_predictions(session, [(slot_id, predicted_status, confidence)], valid_minutes)
 
 
 def get_latest_prediction(session: Session, slot_id: str) -> Optional[Prediction]:
+    return session.scalars(select(Prediction).where(Prediction.slot_id == slot_id)).first()
+
+
+def list_predictions(session: Session) -> List[Prediction]:
+    return list(session.scalars(select(Prediction).order_by(Prediction.slot_id)))
+
+
+def get_slots_with_predictions(
+    session: Session, floor: Optional[str] = None, status: Optional[str] = None, zone: Optional[str] = None
+) -> List[tuple[ParkingSlot, Optional[Prediction]]]:
+    """Slots joined to their prediction (one per slot) in a single query."""
+    stmt = select(ParkingSlot, Prediction).outerjoin(Prediction, Prediction.slot_id == ParkingSlot.slot_id)
+    if floor:
+        stmt = stmt.where(ParkingSlot.floor == floor)
+    if status:
+        stmt = stmt.where(ParkingSlot.current_status == status)
+    if zone:
+        stmt = stmt.where(ParkingSlot.zone == zone)
+    stmt = stmt.order_by(ParkingSlot.slot_id)
+    return [(slot, prediction) for slot, prediction in session.execute(stmt)]
+
+
+def get_recent_occupancy_ratios(session: Session, status: Optional[str] = None, limit: int = 50) -> dict[str, float]:
+    """Occupied ratio over the last ``limit`` logs of every slot, in one query.
+
+    The per-slot subquery is correlated, so each slot reads only its newest
+    ``limit`` rows from ix_sensor_logs_slot_id_timestamp instead of ranking
+    the whole table with a window function.
+    """
+    recent = (
+        select(SensorLog.status)
+        .where(SensorLog.slot_id == ParkingSlot.slot_id)
+        .order_by(desc(SensorLog.timestamp), desc(SensorLog.id))
+        .limit(limit)
+        .correlate(ParkingSlot)
+        .subquery()
+    )
+    ratio = select(func.avg(recent.c.status)).scalar_subquery()
+    stmt = select(ParkingSlot.slot_id, ratio)
+    if status:
+        stmt = stmt.where(ParkingSlot.current_status == status)
+    return {slot_id: float(value) for slot_id, value in session.execute(stmt) if value is not None}
+
+
+def get_rollup_occupancy_ratios(
+    session: Session, slot_ids: Optional[Iterable[str]] = None, lookback_hours: Optional[int] = None
+) -> dict[str, float]:
+    """Occupied ratio from hourly rollups, for slots whose raw logs have been compacted away."""
+    if lookback_hours is None:
+        lookback_hours = get_settings().rollup_lookback_hours
+    since = datetime.utcnow() - timedelta(hours=lookback_hours)
     stmt = (
-        select(Prediction)
-        .where(Prediction.slot_id == slot_id)
-        .order_by(desc(Prediction.prediction_time))
-        .limit(1)
+        select(
+            SlotOccupancyHourly.slot_id,
+            func.sum(SlotOccupancyHourly.occupied_samples),
+            func.sum(SlotOccupancyHourly.samples),
+        )
+        .where(SlotOccupancyHourly.hour >= since)
+        .group_by(SlotOccupancyHourly.slot_id)
     )
-    return session.scalars(stmt).first()
+    if slot_ids is not None:
+        stmt = stmt.where(SlotOccupancyHourly.slot_id.in_(list(slot_ids)))
+    return {slot_id: occupied / samples for slot_id, occupied, samples in session.execute(stmt) if samples}
 
 
 def get_map(session: Session, floor: Optional[str] = None) -> tuple[str, List[ParkingSlot]]:
@@ -96,38 +303,61 @@ def get_map(session: Session, floor: Optional[str] = None) -> tuple[str, List[Pa
     return chosen_floor, slots
 
 
-def choose_recommendation(session: Session) -> tuple[Optional[ParkingSlot], float, str]:
-    # get available slots
-    stmt = select(ParkingSlot).where(ParkingSlot.current_status == SlotStatus.available.value)
-    slots = list(session.scalars(stmt))
-    if not slots:
-        return None, 0.0, "No available slots"
+def get_map_with_predictions(
+    session: Session, floor: Optional[str] = None
+) -> tuple[str, List[tuple[ParkingSlot, Optional[Prediction]]]]:
+    rows = get_slots_with_predictions(session, floor=floor)
+    chosen_floor = floor or (rows[0][0].floor if rows else "B1")
+    return chosen_floor, rows
 
-    best_slot = None
-    best_score = -1.0
-    best_prob = 0.0
 
-    for slot in slots:
-        pred = get_latest_prediction(session, slot.slot_id)
+def rank_recommendations(
+    session: Session,
+    top_k: int = 1,
+    floor: Optional[str] = None,
+    zone: Optional[str] = None,
+    use_history: bool = True,
+) -> list[tuple[ParkingSlot, float]]:
+    """Best ``top_k`` available slots with their probability_available, in the recommendation index's order.
+
+    ``use_history=False`` reads occupancy ratios from sensor_logs even when the
+    in-process history is loaded, so the result depends on the database only.
+    """
+    # get available slots with their latest prediction
+    rows = get_slots_with_predictions(session, floor=floor, status=SlotStatus.available.value, zone=zone)
+    if not rows:
+        return []
+    if use_history and reading_history.ready:
+        occupied_ratios = reading_history.occupancy_ratios([slot.slot_id for slot, _ in rows], limit=50)
+    else:
+        occupied_ratios = get_recent_occupancy_ratios(session, status=SlotStatus.available.value, limit=50)
+    without_logs = [slot.slot_id for slot, _ in rows if slot.slot_id not in occupied_ratios]
+    if without_logs:
+        occupied_ratios.update(get_rollup_occupancy_ratios(session, without_logs))
+
+    ranked = []
+    for slot, pred in rows:
         if pred and pred.predicted_status == SlotStatus.predicted_occupied.value:
             probability_available = max(0.0, 1.0 - pred.confidence)
         else:
             # base probability inversely proportional to recent occupancy rate
-            logs = get_recent_logs(session, slot.slot_id, limit=50)
-            if logs:
-                occupied_ratio = sum(l.status for l in logs) / len(logs)
+            occupied_ratio = occupied_ratios.get(slot.slot_id)
+            if occupied_ratio is not None:
                 probability_available = max(0.1, 1.0 - occupied_ratio)
             else:
                 probability_available = 0.8
+        ranked.append((-score_slot(probability_available, slot.distance_from_entry), slot.slot_id, slot, probability_available))
+    return [(slot, probability) for _, _, slot, probability in heapq.nsmallest(top_k, ranked, key=lambda r: r[:2])]
 
-        score = probability_available * 0.7 + (1.0 / (1 + slot.distance_from_entry)) * 0.3
-        if score > best_score:
-            best_score = score
-            best_slot = slot
-            best_prob = probability_available
 
-    reason = "Highest probability & closest" if best_slot else "No slots"
-    return best_slot, best_prob, reason
+def choose_recommendation(
+    session: Session, floor: Optional[str] = None, zone: Optional[str] = None
+) -> tuple[Optional[ParkingSlot], float, str]:
+    ranked = rank_recommendations(session, top_k=1, floor=floor, zone=zone)
+    if not ranked:
+        return None, 0.0, "No available slots"
+    slot, probability = ranked[0]
+    return slot, probability, "Highest probability & closest"
 
 
 # ---- IoT Devices ----
@@ -135,6 +365,13 @@ def get_device_by_api_key(session: Session, api_key: str) -> Optional[IoTDevice]
     return session.query(IoTDevice).filter(IoTDevice.api_key == api_key).first()
 
 
+def get_devices_by_api_keys(session: Session, api_keys: List[str]) -> dict[str, IoTDevice]:
+    if not api_keys:
+        return {}
+    stmt = select(IoTDevice).where(IoTDevice.api_key.in_(set(api_keys)))
+    return {device.api_key: device for device in session.scalars(stmt)}
+
+
 def create_device(
     session: Session,
     slot_id: str,
@@ -148,13 +385,48 @@ def create_device(
     return device
 
 
+def create_missing_devices(session: Session) -> int:
+    """One device per slot that has none yet, added in a single flush."""
+    orphan_slots = session.scalars(
+        select(ParkingSlot.slot_id)
+        .outerjoin(IoTDevice, IoTDevice.slot_id == ParkingSlot.slot_id)
+        .where(IoTDevice.id.is_(None))
+    ).all()
+    session.add_all(
+        IoTDevice(
+            slot_id=slot_id,
+            api_key=generate_api_key(slot_id),
+            is_active=True,
+            description=f"Device for {slot_id}",
+        )
+        for slot_id in orphan_slots
+    )
+    session.flush()
+    return len(orphan_slots)
+
+
 def list_devices(session: Session) -> list[IoTDevice]:
     return list(session.query(IoTDevice).order_by(IoTDevice.id))
 
 
+def _invalidate_device(session: Session, device: IoTDevice):
+    """Drop the device from every worker's cache once this transaction commits.
+
+    This process drops it on commit; other processes (the API workers, when
+    this runs from scripts/manage_devices.py) pick up the device_invalidations
+    row when they poll (main._poll_device_invalidations).
+    """
+    api_key, device_id = device.api_key, device.id
+    session.add(DeviceInvalidation(device_id=device_id))
+    # every worker has polled well past these by now
+    session.execute(delete(DeviceInvalidation).where(DeviceInvalidation.created_at < datetime.utcnow() - timedelta(days=1)))
+    on_commit(session, lambda: device_cache.invalidate(api_key=api_key, device_id=device_id))
+
+
 def set_device_active(session: Session, device_id: int, active: bool) -> Optional[IoTDevice]:
     device = session.get(IoTDevice, device_id)
     if device:
+        _invalidate_device(session, device)
         device.is_active = active
         session.flush()
     return device
@@ -163,18 +435,49 @@ def set_device_active(session: Session, device_id: int, active: bool) -> Optiona
 def regenerate_api_key(session: Session, device_id: int) -> Optional[IoTDevice]:
     device = session.get(IoTDevice, device_id)
     if device:
+        # the old key is the one cached
+        _invalidate_device(session, device)
         device.api_key = generate_api_key(device.slot_id)
         session.flush()
     return device
 
 
+def latest_device_invalidation(session: Session) -> int:
+    return session.scalar(select(func.max(DeviceInvalidation.id))) or 0
+
+
+def get_device_invalidations(session: Session, after_id: int) -> list[tuple[int, int]]:
+    """(id, device_id) of devices disabled or re-keyed by any process since ``after_id``."""
+    rows = session.execute(
+        select(DeviceInvalidation.id, DeviceInvalidation.device_id)
+        .where(DeviceInvalidation.id > after_id)
+        .order_by(DeviceInvalidation.id)
+    )
+    return [tuple(row) for row in rows]
+
+
 def touch_device_last_seen(session: Session, device: IoTDevice):
     device.last_seen = datetime.utcnow()
     session.flush()
 
 
+def flush_device_last_seen(session: Session, seen: dict[int, datetime]):
+    """Write coalesced last_seen timestamps as a single executemany UPDATE."""
+    if not seen:
+        return
+    session.execute(
+        update(IoTDevice),
+        [{"id": device_id, "last_seen": when} for device_id, when in seen.items()],
+    )
+
+
 def clear_all(session: Session):
     session.query(Prediction).delete()
     session.query(SensorLog).delete()
+    session.query(SlotOccupancyHourly).delete()
+    session.query(ZoneOccupancy).delete()
     session.query(ParkingSlot).delete()
+    on_commit(session, recommendation_index.clear)
+    on_commit(session, slot_state.clear)
+    on_commit(session, reading_history.clear)
     session.commit()
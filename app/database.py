@@ -1,17 +1,106 @@
 from __future__ import annotations
 
-from contextlib import contextmanager
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import re
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
 from .config import get_settings
 
 settings = get_settings()
 
-connect_args = {"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
-engine = create_engine(settings.database_url, connect_args=connect_args, echo=False, future=True)
+_is_sqlite = make_url(settings.database_url).get_backend_name() == "sqlite"
+
+
+def _engine_options(read_only: bool = False) -> dict:
+    """create_engine kwargs for the selected ``database_profile``."""
+    if _is_sqlite:
+        return {"connect_args": {"check_same_thread": False}}
+    if settings.database_profile != "tuned":
+        return {}
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+    }
+    if read_only and make_url(settings.database_url).get_backend_name() == "postgresql":
+        options["execution_options"] = {"postgresql_readonly": True}
+    return options
+
+
+def _sqlite_pragmas(read_only: bool = False) -> list[str]:
+    if settings.database_profile != "tuned":
+        return []
+    pragmas = [
+        f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}",
+        # WAL lets readers keep going while a writer commits; journal_mode persists in the file
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA mmap_size={settings.sqlite_mmap_size}",
+        f"PRAGMA cache_size={-settings.sqlite_cache_size_kib}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+
+def _apply_pragmas(bind: Engine, read_only: bool = False):
+    pragmas = _sqlite_pragmas(read_only)
+    if not _is_sqlite or not pragmas:
+        return
+
+    @event.listens_for(bind, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+engine = create_engine(settings.database_url, echo=False, future=True, **_engine_options())
+_apply_pragmas(engine)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+# read-only endpoints use their own pool (and a replica when DATABASE_READ_URL is set),
+# so they never wait for a connection held by a writer
+read_engine = create_engine(
+    settings.database_read_url or settings.database_url, echo=False, future=True, **_engine_options(read_only=True)
+)
+_apply_pragmas(read_engine, read_only=True)
+ReadSessionLocal = sessionmaker(bind=read_engine, autocommit=False, autoflush=False)
+
+
+def async_database_url(url: str) -> str:
+    """Map a sync SQLAlchemy URL onto its asyncio driver (aiosqlite / asyncpg)."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if backend == "postgresql":
+        return parsed.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    return url
+
+
+async_engine = create_async_engine(
+    async_database_url(settings.database_url),
+    echo=False,
+    **{k: v for k, v in _engine_options().items() if k != "connect_args"},
+)
+_apply_pragmas(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -22,3 +111,110 @@ def get_session():
         yield session
     finally:
         session.close()
+
+
+@contextmanager
+def get_read_session():
+    session = ReadSessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@asynccontextmanager
+async def get_async_session():
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+def on_commit(session: Session, callback: Callable[[], None]):
+    """Run ``callback`` once the session's current transaction commits (dropped on rollback).
+
+    Used to keep in-process indexes in step with the database without exposing
+    uncommitted state.
+    """
+    session.info.setdefault("on_commit", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_on_commit(session: Session):
+    for callback in session.info.pop("on_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_commit(session: Session):
+    session.info.pop("on_commit", None)
+
+
+# ---- SQL profiling (opt-in via SQL_PROFILING, see app/profiling.py) ----
+
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Normalise a statement so the same query with different IN-list sizes compares equal."""
+    return _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+@dataclass
+class SqlProfile:
+    queries: int = 0
+    seconds: float = 0.0
+    # shape -> [count, seconds]
+    shapes: dict = field(default_factory=lambda: defaultdict(lambda: [0, 0.0]))
+
+    def record(self, statement: str, elapsed: float):
+        self.queries += 1
+        self.seconds += elapsed
+        entry = self.shapes[statement_shape(statement)]
+        entry[0] += 1
+        entry[1] += elapsed
+
+    def repeated(self, threshold: int) -> list[dict]:
+        """Statement shapes run at least ``threshold`` times, the usual sign of an N+1 loop."""
+        return [
+            {"statement": shape, "count": count, "ms": round(seconds * 1000, 2)}
+            for shape, (count, seconds) in sorted(self.shapes.items(), key=lambda item: -item[1][0])
+            if count >= threshold
+        ]
+
+
+_sql_profile: ContextVar[SqlProfile | None] = ContextVar("sql_profile", default=None)
+
+
+@contextmanager
+def profile_sql():
+    """Record every statement run in this context (including threadpool and run_sync work it starts)."""
+    profile = SqlProfile()
+    token = _sql_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _sql_profile.reset(token)
+
+
+def _profile_before_execute(conn, cursor, statement, parameters, context, executemany):
+    if _sql_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _profile_after_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _sql_profile.get()
+    starts = conn.info.get("profile_query_start")
+    if profile is not None and starts:
+        profile.record(statement, time.perf_counter() - starts.pop())
+
+
+def enable_sql_profiling(bind: Engine):
+    if not event.contains(bind, "before_cursor_execute", _profile_before_execute):
+        event.listen(bind, "before_cursor_execute", _profile_before_execute)
+        event.listen(bind, "after_cursor_execute", _profile_after_execute)
+
+
+if settings.sql_profiling:
+    enable_sql_profiling(engine)
+    enable_sql_profiling(read_engine)
+    enable_sql_profiling(async_engine.sync_engine)
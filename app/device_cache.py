@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+from .config import get_settings
+
+
+@dataclass(frozen=True)
+class CachedDevice:
+    id: int
+    slot_id: str
+    api_key: str
+    is_active: bool
+
+
+class DeviceCache:
+    """Process-local API key -> device cache with TTL and LRU eviction.
+
+    Also collects last_seen timestamps so they can be written in one batched
+    UPDATE instead of once per request.
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0, max_size: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, CachedDevice]] = OrderedDict()
+        self._keys_by_id: dict[int, str] = {}
+        self._pending_seen: dict[int, datetime] = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str) -> CachedDevice | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    self._remove(api_key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(api_key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, device) -> CachedDevice:
+        cached = CachedDevice(
+            id=device.id,
+            slot_id=device.slot_id,
+            api_key=device.api_key,
+            is_active=device.is_active,
+        )
+        with self._lock:
+            old_key = self._keys_by_id.get(cached.id)
+            if old_key is not None and old_key != cached.api_key:
+                self._remove(old_key)
+            self._entries[cached.api_key] = (time.monotonic() + self.ttl_seconds, cached)
+            self._entries.move_to_end(cached.api_key)
+            self._keys_by_id[cached.id] = cached.api_key
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+        return cached
+
+    def invalidate(self, api_key: str | None = None, device_id: int | None = None):
+        with self._lock:
+            if device_id is not None:
+                api_key = self._keys_by_id.get(device_id, api_key)
+            if api_key is not None:
+                self._remove(api_key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_id.clear()
+
+    def _remove(self, api_key: str):
+        entry = self._entries.pop(api_key, None)
+        if entry is not None and self._keys_by_id.get(entry[1].id) == api_key:
+            del self._keys_by_id[entry[1].id]
+
+    def mark_seen(self, device_id: int, when: datetime | None = None):
+        with self._lock:
+            self._pending_seen[device_id] = when or datetime.utcnow()
+
+    def pop_pending_seen(self) -> dict[int, datetime]:
+        with self._lock:
+            pending, self._pending_seen = self._pending_seen, {}
+        return pending
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_settings = get_settings()
+device_cache = DeviceCache(
+    ttl_seconds=_settings.device_cache_ttl_seconds,
+    max_size=_settings.device_cache_max_size,
+)
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Callable, ContextManager, Iterable, Iterator, Optional
+
+from sqlalchemy import exists, select, tuple_
+from sqlalchemy.orm import Session
+
+from .models import ParkingSlot, SensorLog
+from .utils import to_naive_utc
+
+EXPORT_COLUMNS = ("id", "slot_id", "timestamp", "status")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def format_cursor(timestamp: datetime, log_id: int) -> str:
+    """Resume token for the row after (timestamp, id): ``<iso timestamp>,<id>``."""
+    return f"{timestamp.isoformat()},{log_id}"
+
+
+def parse_cursor(value: str) -> tuple[datetime, int]:
+    timestamp, _, log_id = value.rpartition(",")
+    try:
+        # compared with the naive-UTC timestamp column, so an offset has to be applied, not kept
+        return to_naive_utc(datetime.fromisoformat(timestamp)), int(log_id)
+    except ValueError:
+        raise ValueError(f"invalid cursor {value!r}; expected '<iso timestamp>,<id>'") from None
+
+
+def sensor_log_export_stmt(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    slot_ids: Optional[Iterable[str]] = None,
+    floor: Optional[str] = None,
+    after: Optional[tuple[datetime, int]] = None,
+    limit: Optional[int] = None,
+):
+    """Column-only select of sensor_logs in (timestamp, id) order, resumable after a cursor."""
+    stmt = select(SensorLog.id, SensorLog.slot_id, SensorLog.timestamp, SensorLog.status)
+    if start is not None:
+        stmt = stmt.where(SensorLog.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(SensorLog.timestamp < end)
+    if slot_ids:
+        stmt = stmt.where(SensorLog.slot_id.in_(list(slot_ids)))
+    if floor:
+        # correlated EXISTS rather than slot_id IN (...): a floor matches too many rows to sort, and
+        # IN lets SQLite pick the slot index and sort them all; this walks the timestamp index instead
+        stmt = stmt.where(
+            exists().where(ParkingSlot.slot_id == SensorLog.slot_id, ParkingSlot.floor == floor)
+        )
+    if after is not None:
+        stmt = stmt.where(tuple_(SensorLog.timestamp, SensorLog.id) > tuple_(*after))
+    stmt = stmt.order_by(SensorLog.timestamp, SensorLog.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def _encode_ndjson(rows) -> bytes:
+    return "".join(
+        json.dumps({"id": log_id, "slot_id": slot_id, "timestamp": timestamp.isoformat(), "status": status}) + "\n"
+        for log_id, slot_id, timestamp, status in rows
+    ).encode()
+
+
+def _encode_csv(rows, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows((log_id, slot_id, timestamp.isoformat(), status) for log_id, slot_id, timestamp, status in rows)
+    return buffer.getvalue().encode()
+
+
+def stream_sensor_logs(
+    session_factory: Callable[[], ContextManager[Session]],
+    stmt,
+    fmt: str = "ndjson",
+    batch_size: int = 5000,
+    header: bool = True,
+) -> Iterator[bytes]:
+    """Encoded export chunks, one per ``batch_size`` rows.
+
+    Rows are fetched with ``yield_per`` (a server-side cursor on PostgreSQL), so
+    at most one batch is held in memory whatever the export size. The session is
+    opened inside the generator so it lives exactly as long as the stream.
+    """
+    if fmt == "csv" and header:
+        yield _encode_csv([], header=True)
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    with session_factory() as session:
+        result = session.execute(stmt.execution_options(yield_per=batch_size))
+        for rows in result.partitions():
+            yield encode(rows)
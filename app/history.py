@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Iterable
+
+import numpy as np
+from sqlalchemy import desc, func, select
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .models import SensorLog
+
+_EPOCH = np.datetime64(0, "us")
+
+
+def _to_us(timestamp: datetime) -> int:
+    return int((np.datetime64(timestamp, "us") - _EPOCH).astype(np.int64))
+
+
+class ReadingHistory:
+    """Last ``capacity`` (timestamp, status) readings per slot in fixed-size NumPy ring buffers.
+
+    One row per slot in an int64 timestamp matrix and an int8 status matrix, so
+    memory is ``capacity * 9`` bytes per slot regardless of ingest volume.
+    Readings are kept in (timestamp, arrival) order, matching the
+    ``ORDER BY timestamp DESC, id DESC`` the predictor used to query.
+    """
+
+    def __init__(self, capacity: int = 200):
+        self.capacity = capacity
+        self.ready = False
+        self._rows: dict[str, int] = {}
+        self._timestamps = np.zeros((0, capacity), dtype=np.int64)
+        self._statuses = np.zeros((0, capacity), dtype=np.int8)
+        self._head = np.zeros(0, dtype=np.int64)  # next write position
+        self._count = np.zeros(0, dtype=np.int64)
+        self._lock = threading.Lock()
+        self._replay: list | None = None
+
+    # ---- building ----
+    def load(self, session: Session):
+        """Warm from sensor_logs in one windowed query; readings committed meanwhile are replayed."""
+        with self._lock:
+            self._replay = []
+        try:
+            ranked = select(
+                SensorLog.slot_id,
+                SensorLog.timestamp,
+                SensorLog.status,
+                func.row_number()
+                .over(partition_by=SensorLog.slot_id, order_by=(desc(SensorLog.timestamp), desc(SensorLog.id)))
+                .label("rn"),
+            ).subquery()
+            stmt = (
+                select(ranked.c.slot_id, ranked.c.timestamp, ranked.c.status)
+                .where(ranked.c.rn <= self.capacity)
+                .order_by(ranked.c.slot_id, desc(ranked.c.rn))
+            )
+            rows: dict[str, int] = {}
+            slot_index, timestamps, statuses = [], [], []
+            for slot_id, timestamp, status in session.execute(stmt):
+                slot_index.append(rows.setdefault(slot_id, len(rows)))
+                timestamps.append(timestamp)
+                statuses.append(status)
+        except BaseException:
+            with self._lock:
+                self._replay = None
+            raise
+
+        n_slots = len(rows)
+        slot_index = np.asarray(slot_index, dtype=np.int64)
+        count = np.bincount(slot_index, minlength=n_slots).astype(np.int64)
+        # rows arrive oldest-first per slot, so each reading's column is its rank within the slot
+        starts = np.cumsum(count) - count
+        column = np.arange(len(slot_index)) - starts[slot_index]
+        ts_matrix = np.zeros((n_slots, self.capacity), dtype=np.int64)
+        st_matrix = np.zeros((n_slots, self.capacity), dtype=np.int8)
+        if len(slot_index):
+            ts_matrix[slot_index, column] = (np.asarray(timestamps, dtype="datetime64[us]") - _EPOCH).astype(np.int64)
+            st_matrix[slot_index, column] = np.asarray(statuses, dtype=np.int8)
+
+        with self._lock:
+            self._rows = rows
+            self._timestamps, self._statuses = ts_matrix, st_matrix
+            self._count = count
+            self._head = count % self.capacity
+            replay, self._replay = self._replay or [], None
+            # a reading that committed after the replay opened but before the query's snapshot is in
+            # both; consume each loaded (timestamp, status) once instead of appending it again
+            loaded: dict[str, Counter] = {}
+            for slot_id, timestamp, status in replay:
+                row = rows.get(slot_id)
+                if row is not None and row < n_slots and slot_id not in loaded:
+                    n = int(count[row])
+                    loaded[slot_id] = Counter(zip(ts_matrix[row, :n].tolist(), st_matrix[row, :n].tolist()))
+                seen = loaded.get(slot_id)
+                if seen and seen[(timestamp, status)]:
+                    seen[(timestamp, status)] -= 1
+                    continue
+                self._append(slot_id, timestamp, status)
+            self.ready = True
+
+    def clear(self):
+        with self._lock:
+            self._rows = {}
+            self._timestamps = np.zeros((0, self.capacity), dtype=np.int64)
+            self._statuses = np.zeros((0, self.capacity), dtype=np.int8)
+            self._head = np.zeros(0, dtype=np.int64)
+            self._count = np.zeros(0, dtype=np.int64)
+            # like before a load: nothing to replay, and reads go back to the database
+            self._replay = None
+            self.ready = False
+
+    # ---- ingest ----
+    def extend(self, readings: Iterable[tuple[str, datetime, int]]):
+        with self._lock:
+            for slot_id, timestamp, status in readings:
+                timestamp = _to_us(timestamp)
+                if self._replay is not None:
+                    self._replay.append((slot_id, timestamp, status))
+                self._append(slot_id, timestamp, status)
+
+    def append(self, slot_id: str, timestamp: datetime, status: int):
+        self.extend([(slot_id, timestamp, status)])
+
+    def _row(self, slot_id: str) -> int:
+        row = self._rows.get(slot_id)
+        if row is None:
+            row = self._rows[slot_id] = len(self._rows)
+            if row >= len(self._head):
+                grow = max(16, len(self._head))
+                self._timestamps = np.vstack([self._timestamps, np.zeros((grow, self.capacity), dtype=np.int64)])
+                self._statuses = np.vstack([self._statuses, np.zeros((grow, self.capacity), dtype=np.int8)])
+                self._head = np.concatenate([self._head, np.zeros(grow, dtype=np.int64)])
+                self._count = np.concatenate([self._count, np.zeros(grow, dtype=np.int64)])
+        return row
+
+    def _append(self, slot_id: str, timestamp: int, status: int):
+        row = self._row(slot_id)
+        head, count = int(self._head[row]), int(self._count[row])
+        newest = self._timestamps[row, (head - 1) % self.capacity] if count else None
+        if newest is None or timestamp >= newest:
+            self._timestamps[row, head] = timestamp
+            self._statuses[row, head] = status
+            self._head[row] = (head + 1) % self.capacity
+            self._count[row] = min(count + 1, self.capacity)
+            return
+        # late reading: rebuild the row in order (rare; devices send in order)
+        order = (head - count + np.arange(count)) % self.capacity
+        ts, st = self._timestamps[row, order], self._statuses[row, order]
+        at = int(np.searchsorted(ts, timestamp, side="right"))
+        if count == self.capacity and at == 0:
+            return  # older than everything kept
+        ts = np.insert(ts, at, timestamp)[-self.capacity:]
+        st = np.insert(st, at, status)[-self.capacity:]
+        n = len(ts)
+        self._timestamps[row, :n], self._statuses[row, :n] = ts, st
+        self._head[row] = n % self.capacity
+        self._count[row] = n
+
+    # ---- reads ----
+    def recent(self, slot_ids: list[str], limit: int | None = None):
+        """(slot_index, timestamps, statuses) for ``slot_ids``, newest first per slot.
+
+        Same layout as the windowed query in ``app.ai._load_recent_history``.
+        """
+        limit = min(limit or self.capacity, self.capacity)
+        with self._lock:
+            rows = np.asarray([self._rows.get(slot_id, -1) for slot_id in slot_ids], dtype=np.int64)
+            known = rows >= 0
+            counts = np.zeros(len(slot_ids), dtype=np.int64)
+            counts[known] = np.minimum(self._count[rows[known]], limit)
+            k = np.arange(limit)
+            heads = np.zeros(len(slot_ids), dtype=np.int64)
+            heads[known] = self._head[rows[known]]
+            columns = (heads[:, None] - 1 - k[None, :]) % self.capacity
+            mask = k[None, :] < counts[:, None]
+            positions = np.nonzero(mask)
+            source_rows = rows[positions[0]]
+            source_cols = columns[positions]
+            timestamps = self._timestamps[source_rows, source_cols]
+            statuses = self._statuses[source_rows, source_cols].astype(np.int64)
+        return positions[0].astype(np.intp), (timestamps + _EPOCH).astype("datetime64[us]"), statuses
+
+    def occupancy_ratios(self, slot_ids: list[str], limit: int = 50) -> dict[str, float]:
+        """Share of occupied readings among each slot's last ``limit``; slots without readings are left out."""
+        slot_index, _, statuses = self.recent(slot_ids, limit)
+        counts = np.bincount(slot_index, minlength=len(slot_ids))
+        occupied = np.bincount(slot_index, weights=statuses, minlength=len(slot_ids))
+        return {slot_ids[i]: float(occupied[i] / counts[i]) for i in np.flatnonzero(counts)}
+
+    def nbytes(self) -> int:
+        return self._timestamps.nbytes + self._statuses.nbytes + self._head.nbytes + self._count.nbytes
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+reading_history = ReadingHistory(get_settings().reading_history_size)
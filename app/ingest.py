@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from sqlalchemy.orm import Session
+
+from . import crud
+from .ai import refresh_slot_predictions
+from .database import get_session
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def write_readings(session: Session, readings: list[tuple[str, int, datetime]]) -> list[dict]:
+    """Bulk-write readings in one commit and return the events to publish."""
+    slots = crud.log_sensor_updates_bulk(session, readings)
+    events = [
+        {
+            "event": "slot_update",
+            "slot_id": slot.slot_id,
+            "floor": slot.floor,
+            "zone": slot.zone,
+            "status": slot.current_status,
+            "timestamp": slot.last_updated.isoformat(),
+        }
+        for slot in slots.values()
+    ]
+    session.commit()
+    return events
+
+
+def write_reading(session: Session, slot_id: str, status: int, timestamp: datetime) -> dict:
+    slot = crud.log_sensor_update(session, slot_id, status, timestamp)
+    event = {
+        "event": "slot_update",
+        "slot_id": slot.slot_id,
+        "floor": slot.floor,
+        "zone": slot.zone,
+        "status": slot.current_status,
+        "timestamp": timestamp.isoformat(),
+    }
+    session.commit()
+    return event
+
+
+def refresh_predictions(slot_ids: list[str], valid_minutes: int):
+    """Refresh predictions in a session of its own, so async endpoints can run it in a worker thread.
+
+    Inference is CPU work (feature frame, ``predict_proba``); under ``run_sync``
+    it would hold the event loop and delay every WebSocket broadcast.
+    """
+    with get_session() as session:
+        refresh_slot_predictions(session, slot_ids, valid_minutes=valid_minutes)
+
+
+def apply_readings(session: Session, readings: list[tuple[str, int, datetime]], valid_minutes: int) -> list[dict]:
+    """Write readings, then refresh their slots' predictions in the same session (thread callers)."""
+    events = write_readings(session, readings)
+    refresh_slot_predictions(session, [event["slot_id"] for event in events], valid_minutes=valid_minutes)
+    return events
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+class IngestWriteFailed(Exception):
+    """The group-commit batch holding a reading could not be written."""
+
+
+@dataclass
+class _PendingReading:
+    slot_id: str
+    status: int
+    timestamp: datetime
+    committed: asyncio.Future | None = field(default=None, repr=False)
+
+
+class IngestPipeline:
+    """Write-behind group commit for sensor readings.
+
+    Readings are queued by the request handler and a single writer task drains
+    them in batches (every ``max_delay_ms`` or ``max_items``), writing each batch
+    in one transaction before publishing WebSocket events.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[list[dict]], Awaitable[None]],
+        max_queue: int = 10000,
+        max_items: int = 500,
+        max_delay_ms: int = 50,
+        enqueue_timeout_ms: int = 200,
+        prediction_valid_minutes: int = 10,
+    ):
+        self.publish = publish
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.max_items = max_items
+        self.max_delay = max_delay_ms / 1000
+        self.enqueue_timeout = enqueue_timeout_ms / 1000
+        self.prediction_valid_minutes = prediction_valid_minutes
+        self._writer_task: asyncio.Task | None = None
+        self._closed = False
+
+    async def start(self):
+        if self._writer_task is None:
+            self._closed = False
+            self._writer_task = asyncio.create_task(self._writer_loop())
+
+    async def stop(self):
+        """Stop accepting readings and wait until everything queued is committed."""
+        if self._writer_task is None:
+            return
+        self._closed = True
+        await self.queue.put(_STOP)
+        await self._writer_task
+        self._writer_task = None
+
+    async def submit(self, slot_id: str, status: int, timestamp: datetime, wait_commit: bool = False):
+        if self._closed or self._writer_task is None:
+            raise IngestQueueFull("ingest pipeline is not running")
+        committed = asyncio.get_running_loop().create_future() if wait_commit else None
+        item = _PendingReading(slot_id, status, timestamp, committed)
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # backpressure: give the writer a moment before refusing the reading
+            try:
+                await asyncio.wait_for(self.queue.put(item), timeout=self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                raise IngestQueueFull("ingest queue is full") from None
+        if committed is not None:
+            await committed
+
+    async def _writer_loop(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self.queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_items:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[_PendingReading]):
+        try:
+            events = await asyncio.to_thread(self._write_batch, batch)
+        except Exception as exc:
+            logger.exception("Failed to write ingest batch of %d readings", len(batch))
+            for item in batch:
+                if item.committed is not None and not item.committed.done():
+                    error = IngestWriteFailed(f"ingest batch of {len(batch)} readings failed to commit")
+                    error.__cause__ = exc
+                    item.committed.set_exception(error)
+            return
+        for item in batch:
+            if item.committed is not None and not item.committed.done():
+                item.committed.set_result(None)
+        await self.publish(events)
+
+    def _write_batch(self, batch: list[_PendingReading]) -> list[dict]:
+        readings = [(item.slot_id, item.status, item.timestamp) for item in batch]
+        with get_session() as session:
+            return apply_readings(session, readings, self.prediction_valid_minutes)
@@ -1,16 +1,30 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import logging
+import secrets
+import threading
+import time
+import weakref
 from datetime import datetime, timedelta
-from fastapi import FastAPI, Depends, WebSocket, WebSocketDisconnect, Query, HTTPException, Request
+from typing import Literal
+from fastapi import FastAPI, Depends, WebSocket, WebSocketDisconnect, Query, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from .config import get_settings
-from .database import Base, engine, get_session
-from .models import SlotStatus, ParkingSlot, Prediction, IoTDevice
+from .database import async_engine, engine, get_async_session, get_read_session, get_session, read_engine
+from .models import SlotStatus, ParkingSlot
 from . import crud
 from .schemas import (
     SlotUpdate,
+    SlotUpdateBatch,
+    SlotUpdateBatchResponse,
+    SlotUpdateResult,
     ParkingMapResponse,
     ParkingSlotOut,
     RecommendationResponse,
@@ -18,14 +32,65 @@ from .schemas import (
     ImpactRequest,
     ImpactResponse,
     PredictionOut,
+    OccupancyAnalyticsResponse,
 )
 from .websocket_manager import ConnectionManager
+from .broadcast import create_broadcast
+from .device_cache import CachedDevice, device_cache
+from .ingest import IngestPipeline, IngestQueueFull, IngestWriteFailed, refresh_predictions, write_reading, write_readings
+from .recommendation import recommendation_index
+from .slot_state import slot_state
+from .history import reading_history
+from .schema import upgrade_schema
+from .seed import bootstrap_demo
+from .occupancy_model import get_active_model, latest_model_version, load_stored_model, set_active_model
 from .ai import generate_predictions
-from .utils import generate_api_key
+from .analytics import BUCKETS, occupancy_report, refresh_occupancy_rollup
+from .export import MEDIA_TYPES, parse_cursor, sensor_log_export_stmt, stream_sensor_logs
+from .metrics import MetricsMiddleware, instrument_engine, registry
+from .profiling import SqlProfilingMiddleware
+from .utils import generate_api_key, to_naive_utc
 
 settings = get_settings()
 app = FastAPI(title=settings.app_name, version="0.1.0")
-manager = ConnectionManager(max_queue=settings.websocket_broadcast_queue)
+
+
+async def _slot_snapshot() -> list[dict]:
+    async with get_async_session() as session:
+        rows = await session.execute(
+            select(ParkingSlot.slot_id, ParkingSlot.floor, ParkingSlot.zone, ParkingSlot.current_status)
+        )
+        return [
+            {"slot_id": slot_id, "floor": floor, "zone": zone, "status": status}
+            for slot_id, floor, zone, status in rows
+        ]
+
+
+manager = ConnectionManager(
+    max_queue=settings.websocket_broadcast_queue,
+    client_queue=settings.websocket_client_queue,
+    slow_client_seconds=settings.websocket_slow_client_seconds,
+    batch_window_ms=settings.websocket_batch_window_ms,
+    replay_buffer=settings.websocket_replay_buffer,
+    snapshot_provider=_slot_snapshot,
+    backend=create_broadcast(settings.broadcast_backend, settings.broadcast_redis_url, settings.broadcast_channel),
+)
+ingest = IngestPipeline(
+    publish=manager.send_many,
+    max_queue=settings.ingest_queue_size,
+    max_items=settings.ingest_batch_max_items,
+    max_delay_ms=settings.ingest_batch_max_delay_ms,
+    enqueue_timeout_ms=settings.ingest_enqueue_timeout_ms,
+    prediction_valid_minutes=settings.prediction_valid_minutes,
+)
+logger = logging.getLogger(__name__)
+_last_seen_task: asyncio.Task | None = None
+_warmup_task: asyncio.Task | None = None
+_rollup_task: asyncio.Task | None = None
+_model_reload_task: asyncio.Task | None = None
+_device_invalidation_task: asyncio.Task | None = None
+_device_invalidation_cursor = 0
+_warmup: dict = {"status": "pending"}
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,6 +99,37 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+if settings.sql_profiling:
+    app.add_middleware(
+        SqlProfilingMiddleware,
+        repeat_threshold=settings.sql_profiling_repeat_threshold,
+        header=settings.sql_profiling_header,
+    )
+
+instrument_engine(engine)
+instrument_engine(read_engine)
+instrument_engine(async_engine.sync_engine)
+registry.gauge_callback("websocket_connections", "Open /ws/slots connections.", lambda: len(manager.clients))
+registry.gauge_callback(
+    "websocket_broadcast_queue_depth", "Events waiting in the broadcast queue.", lambda: len(manager.pending)
+)
+registry.counter_callback(
+    "websocket_messages_dropped_total",
+    "Messages dropped by the drop-oldest policy, per queue.",
+    lambda: {"broadcast": manager.dropped, "client": manager.client_dropped},
+    labelname="queue",
+)
+registry.counter_callback("websocket_clients_evicted_total", "Slow clients disconnected.", lambda: manager.evicted)
+registry.counter_callback("websocket_frames_sent_total", "Frames handed to client sockets.", lambda: manager.sent)
+registry.gauge_callback("ingest_queue_depth", "Readings waiting for the write-behind writer.", lambda: ingest.queue.qsize())
+registry.counter_callback(
+    "device_cache_requests_total",
+    "API key lookups served by the device cache, by result.",
+    lambda: {"hit": device_cache.hits, "miss": device_cache.misses},
+    labelname="result",
+)
+registry.gauge_callback("device_cache_entries", "Devices held in the API key cache.", lambda: len(device_cache))
 
 
 def get_db():
@@ -41,117 +137,446 @@ def get_db():
         yield session
 
 
-def verify_api_key(request: Request, db: Session = Depends(get_db)) -> IoTDevice:
+def get_read_db():
+    with get_read_session() as session:
+        yield session
+
+
+async def get_async_db():
+    async with get_async_session() as session:
+        yield session
+
+
+async def verify_api_key(request: Request, db: AsyncSession = Depends(get_async_db)) -> CachedDevice:
     api_key = request.headers.get("X-API-Key")
     if not api_key:
         raise HTTPException(status_code=401, detail="Missing API key")
-    device = crud.get_device_by_api_key(db, api_key=api_key)
-    if not device:
-        raise HTTPException(status_code=401, detail="Invalid API key")
+    device = device_cache.get(api_key)
+    if device is None:
+        row = await db.run_sync(crud.get_device_by_api_key, api_key)
+        if not row:
+            raise HTTPException(status_code=401, detail="Invalid API key")
+        device = device_cache.put(row)
     if not device.is_active:
         raise HTTPException(status_code=403, detail="Device disabled")
-    crud.touch_device_last_seen(db, device)
-    db.commit()
+    # last_seen is written in batches by _flush_last_seen_loop
+    device_cache.mark_seen(device.id)
     return device
 
 
+def verify_operator_key(request: Request):
+    if not settings.operator_api_key:
+        raise HTTPException(status_code=403, detail="Export is disabled; set OPERATOR_API_KEY to enable it")
+    key = request.headers.get("X-Operator-Key")
+    if not key:
+        raise HTTPException(status_code=401, detail="Missing operator key")
+    if not secrets.compare_digest(key, settings.operator_api_key):
+        raise HTTPException(status_code=401, detail="Invalid operator key")
+
+
+def _flush_last_seen():
+    pending = device_cache.pop_pending_seen()
+    if not pending:
+        return
+    with get_session() as session:
+        crud.flush_device_last_seen(session, pending)
+        session.commit()
+
+
+async def _flush_last_seen_loop():
+    while True:
+        await asyncio.sleep(settings.device_last_seen_flush_seconds)
+        try:
+            await asyncio.to_thread(_flush_last_seen)
+        except Exception:
+            logger.exception("Failed to flush device last_seen")
+
+
+def _poll_device_invalidations():
+    global _device_invalidation_cursor
+    with get_session() as session:
+        changes = crud.get_device_invalidations(session, _device_invalidation_cursor)
+    for change_id, device_id in changes:
+        device_cache.invalidate(device_id=device_id)
+        _device_invalidation_cursor = change_id
+
+
+def _start_device_invalidations():
+    global _device_invalidation_cursor
+    with get_session() as session:
+        # the cache starts empty, so only changes from now on matter
+        _device_invalidation_cursor = crud.latest_device_invalidation(session)
+
+
+async def _device_invalidation_loop():
+    await asyncio.to_thread(_start_device_invalidations)
+    while True:
+        await asyncio.sleep(settings.device_invalidation_poll_seconds)
+        try:
+            await asyncio.to_thread(_poll_device_invalidations)
+        except Exception:
+            logger.exception("Failed to poll device invalidations")
+
+
+def _refresh_rollup():
+    with get_session() as session:
+        refresh_occupancy_rollup(session)
+
+
+async def _rollup_loop():
+    while True:
+        try:
+            await asyncio.to_thread(_refresh_rollup)
+        except Exception:
+            logger.exception("Failed to refresh analytics rollup")
+        await asyncio.sleep(settings.analytics_rollup_interval_seconds)
+
+
 @app.get("/")
 def root():
     return {"status": "ok", "service": settings.app_name}
 
 
+@app.get("/healthz", include_in_schema=False)
+async def liveness():
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readiness(response: Response, db: AsyncSession = Depends(get_async_db)):
+    # ready as soon as the schema is reachable; warm-up progress is informational
+    try:
+        await db.execute(select(ParkingSlot.slot_id).limit(1))
+    except Exception as exc:
+        response.status_code = 503
+        return {"status": "unavailable", "detail": f"database not ready: {type(exc).__name__}", "warmup": _warmup}
+    return {"status": "ready", "warmup": _warmup, "recommendation_index": recommendation_index.ready}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _reload_model():
+    """Swap in the newest stored artifact if it differs from the active one (trainer runs elsewhere)."""
+    try:
+        with get_read_session() as session:
+            version = latest_model_version(session)
+            active = get_active_model()
+            if version is None or (active is not None and version == active.version):
+                return
+            model = load_stored_model(session)
+    except Exception:
+        logger.exception("Could not load occupancy model from the %s store; keeping the current one", settings.model_store)
+        return
+    if model is not None:
+        set_active_model(model)
+        logger.info("Loaded occupancy model %s", model.version)
+
+
+async def _model_reload_loop():
+    while True:
+        await asyncio.sleep(settings.model_reload_interval_seconds)
+        await asyncio.to_thread(_reload_model)
+
+
+def _warm_up():
+    """Model load, index build and prediction sweep; runs after the app is already serving.
+
+    Until it finishes, reads use the predictions already persisted and the
+    recommendation endpoint falls back to the database query.
+    """
+    _warmup.clear()
+    _warmup.update(status="running", started_at=datetime.utcnow().isoformat())
+    start = time.perf_counter()
+    try:
+        _reload_model()
+        with get_session() as session:
+            if settings.slot_state_store:
+                slot_state.load(session)
+            # left unloaded (never ready), the predictor and /recommendation read the database instead
+            if settings.in_process_history:
+                reading_history.load(session)
+                recommendation_index.rebuild(session)
+            generate_predictions(session, valid_minutes=settings.prediction_valid_minutes)
+    except Exception:
+        _warmup["status"] = "failed"
+        logger.exception("Prediction warm-up failed")
+    else:
+        _warmup["status"] = "done"
+    _warmup["seconds"] = round(time.perf_counter() - start, 3)
+
+
 @app.on_event("startup")
 async def startup_event():
-    Base.metadata.create_all(bind=engine)
+    global _last_seen_task, _warmup_task, _rollup_task, _model_reload_task, _device_invalidation_task
+    if settings.startup_bootstrap:
+        # local development only; deployments run scripts/manage_db.py before starting the app
+        upgrade_schema(engine)
+        with get_session() as session:
+            bootstrap_demo(session)
     await manager.start()
-    # ensure dummy data exists
-    with get_session() as session:
-        if not session.query(ParkingSlot).first():
-            seed_demo(session)
-            session.commit()
-        # ensure devices exist for slots
-        existing_devices = session.query(IoTDevice).count()
-        if existing_devices == 0:
-            slots = session.query(ParkingSlot).all()
-            for slot in slots:
-                crud.create_device(session, slot_id=slot.slot_id, description=f"Device for {slot.slot_id}")
-            session.commit()
-        generate_predictions(session, valid_minutes=settings.prediction_valid_minutes)
+    if settings.ingest_write_behind:
+        await ingest.start()
+    _last_seen_task = asyncio.create_task(_flush_last_seen_loop())
+    if settings.device_invalidation_poll_seconds > 0:
+        _device_invalidation_task = asyncio.create_task(_device_invalidation_loop())
+    _warmup_task = asyncio.create_task(asyncio.to_thread(_warm_up))
+    if settings.analytics_rollup_interval_seconds > 0:
+        _rollup_task = asyncio.create_task(_rollup_loop())
+    if settings.model_reload_interval_seconds > 0:
+        _model_reload_task = asyncio.create_task(_model_reload_loop())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ingest.stop()
+    await manager.stop()
+    if _warmup_task is not None:
+        await asyncio.gather(_warmup_task, return_exceptions=True)
+    if _last_seen_task is not None:
+        _last_seen_task.cancel()
+    if _rollup_task is not None:
+        _rollup_task.cancel()
+    if _model_reload_task is not None:
+        _model_reload_task.cancel()
+    if _device_invalidation_task is not None:
+        _device_invalidation_task.cancel()
+    await asyncio.to_thread(_flush_last_seen)
 
 
 @app.post("/api/iot/slot-update")
-async def update_slot(payload: SlotUpdate, device: IoTDevice = Depends(verify_api_key), db: Session = Depends(get_db)):
+async def update_slot(
+    payload: SlotUpdate,
+    response: Response,
+    device: CachedDevice = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_async_db),
+):
     if device.slot_id and device.slot_id != payload.slot_id:
         raise HTTPException(
             status_code=400,
             detail=f"slot_id mismatch: device={device.slot_id} body={payload.slot_id}",
         )
-    slot = crud.log_sensor_update(db, payload.slot_id, payload.status, payload.timestamp)
-    db.commit()
-    # refresh predictions for this slot context
-    generate_predictions(db, valid_minutes=settings.prediction_valid_minutes)
+    if settings.ingest_write_behind:
+        wait_commit = settings.ingest_ack_mode == "committed"
+        try:
+            await ingest.submit(payload.slot_id, payload.status, payload.timestamp, wait_commit=wait_commit)
+        except (IngestQueueFull, IngestWriteFailed) as exc:
+            raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"})
+        if wait_commit:
+            return {"message": "updated", "slot": payload.slot_id}
+        response.status_code = 202
+        return {"message": "queued", "slot": payload.slot_id}
+
+    # sync crud code runs over the async driver, so the event loop is never blocked on I/O
+    event = await db.run_sync(write_reading, payload.slot_id, payload.status, payload.timestamp)
+    # only the slot touched by this update; inference is CPU work, kept off the event loop
+    await asyncio.to_thread(refresh_predictions, [payload.slot_id], settings.prediction_valid_minutes)
+    await manager.send_json(event)
+    return {"message": "updated", "slot": payload.slot_id}
+
+
+@app.post("/api/iot/slot-updates", response_model=SlotUpdateBatchResponse)
+async def update_slots(
+    payload: SlotUpdateBatch, device: CachedDevice = Depends(verify_api_key), db: AsyncSession = Depends(get_async_db)
+):
+    devices: dict[str, CachedDevice] = {device.api_key: device}
+    misses = []
+    for key in {u.api_key for u in payload.updates if u.api_key and u.api_key != device.api_key}:
+        cached = device_cache.get(key)
+        if cached is None:
+            misses.append(key)
+        else:
+            devices[key] = cached
+    for key, row in (await db.run_sync(crud.get_devices_by_api_keys, misses)).items():
+        devices[key] = device_cache.put(row)
+
+    results: list[SlotUpdateResult] = []
+    readings: list[tuple[str, int, datetime]] = []
+    for index, update in enumerate(payload.updates):
+        owner = devices.get(update.api_key or device.api_key)
+        detail = None
+        if owner is None:
+            detail = "Invalid API key"
+        elif not owner.is_active:
+            detail = "Device disabled"
+        elif owner.slot_id and owner.slot_id != update.slot_id:
+            detail = f"slot_id mismatch: device={owner.slot_id} body={update.slot_id}"
+        if detail is None:
+            readings.append((update.slot_id, update.status, update.timestamp))
+            device_cache.mark_seen(owner.id)
+        results.append(SlotUpdateResult(index=index, slot_id=update.slot_id, accepted=detail is None, detail=detail))
+
+    if readings:
+        events = await db.run_sync(write_readings, readings)
+        await asyncio.to_thread(
+            refresh_predictions, [event["slot_id"] for event in events], settings.prediction_valid_minutes
+        )
+        await manager.send_many(events)
+
+    accepted = len(readings)
+    return SlotUpdateBatchResponse(accepted=accepted, rejected=len(results) - accepted, results=results)
+
 
-    response_payload = {
-        "event": "slot_update",
-        "slot_id": slot.slot_id,
-        "status": slot.current_status,
-        "timestamp": payload.timestamp.isoformat(),
-    }
-    await manager.send_json(response_payload)
-    return {"message": "updated", "slot": slot.slot_id}
+def _cached_json(request: Request, payload: tuple[str, bytes]) -> Response:
+    etag, body = payload
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _map_from_db(floor: str | None) -> ParkingMapResponse:
+    with get_read_session() as db:
+        selected_floor, rows = crud.get_map_with_predictions(db, floor=floor)
+        enriched_slots: list[ParkingSlotOut] = []
+        for slot, prediction in rows:
+            status = slot.current_status
+            if prediction and prediction.predicted_status == SlotStatus.predicted_occupied.value and status == SlotStatus.available.value:
+                status = SlotStatus.predicted_occupied.value
+            enriched_slots.append(
+                ParkingSlotOut(
+                    slot_id=slot.slot_id,
+                    floor=slot.floor,
+                    zone=slot.zone,
+                    distance_from_entry=slot.distance_from_entry,
+                    status=status,
+                    last_updated=slot.last_updated,
+                )
+            )
+        return ParkingMapResponse(floor=selected_floor, slots=enriched_slots)
 
 
 @app.get("/api/parking/map", response_model=ParkingMapResponse)
-def get_parking_map(
+async def get_parking_map(
+    request: Request,
     location: str | None = Query(default=None, description="Optional location code"),
     floor: str | None = Query(default=None, description="Floor identifier e.g. B1"),
-    db: Session = Depends(get_db),
 ):
-    selected_floor, slots = crud.get_map(db, floor=floor)
-    enriched_slots: list[ParkingSlotOut] = []
-    for slot in slots:
-        prediction = crud.get_latest_prediction(db, slot.slot_id)
-        status = slot.current_status
-        if prediction and prediction.predicted_status == SlotStatus.predicted_occupied.value and status == SlotStatus.available.value:
-            status = SlotStatus.predicted_occupied.value
-        enriched_slots.append(
-            ParkingSlotOut(
-                slot_id=slot.slot_id,
-                floor=slot.floor,
-                zone=slot.zone,
-                distance_from_entry=slot.distance_from_entry,
-                status=status,
-                last_updated=slot.last_updated,
-            )
-        )
-    return ParkingMapResponse(floor=selected_floor, slots=enriched_slots)
+    if settings.slot_state_store and slot_state.ready:
+        return _cached_json(request, slot_state.map_payload(floor))
+    return await asyncio.to_thread(_map_from_db, floor)
 
 
 @app.get("/api/parking/recommendation", response_model=RecommendationResponse)
-def recommend_slot(db: Session = Depends(get_db)):
-    slot, probability, reason = crud.choose_recommendation(db)
-    if not slot:
-        return RecommendationResponse(recommended=None, reason=reason)
-    item = RecommendationItem(
-        slot_id=slot.slot_id,
-        distance_from_entry=slot.distance_from_entry,
-        probability_available=round(probability, 3),
-    )
-    return RecommendationResponse(recommended=item, reason=reason)
+def recommend_slot(
+    top_k: int = Query(default=1, ge=1, le=50, description="Number of ranked slots to return"),
+    floor: str | None = Query(default=None, description="Floor identifier e.g. B1"),
+    zone: str | None = Query(default=None, description="Zone identifier e.g. A"),
+    db: Session = Depends(get_read_db),
+):
+    if recommendation_index.ready:
+        ranked = [
+            (r.slot_id, r.distance_from_entry, r.probability_available)
+            for r in recommendation_index.top(top_k, floor=floor, zone=zone)
+        ]
+    else:
+        # warm-up (or several workers ingesting): same ranking, computed from the database
+        ranked = [
+            (slot.slot_id, slot.distance_from_entry, probability)
+            for slot, probability in crud.rank_recommendations(db, top_k, floor=floor, zone=zone)
+        ]
+    if not ranked:
+        return RecommendationResponse(recommended=None, reason="No available slots")
+    items = [
+        RecommendationItem(
+            slot_id=slot_id,
+            distance_from_entry=distance_from_entry,
+            probability_available=round(probability, 3),
+        )
+        for slot_id, distance_from_entry, probability in ranked
+    ]
+    return RecommendationResponse(recommended=items[0], reason="Highest probability & closest", alternatives=items[1:])
+
+
+def _predictions_from_db() -> list[PredictionOut]:
+    with get_read_session() as db:
+        return [
+            PredictionOut(
+                slot_id=p.slot_id,
+                predicted_status=p.predicted_status,
+                confidence=p.confidence,
+                valid_until=p.valid_until,
+            )
+            for p in crud.list_predictions(db)
+        ]
 
 
 @app.get("/api/parking/predictions", response_model=list[PredictionOut])
-def list_predictions(db: Session = Depends(get_db)):
-    predictions = db.query(Prediction).all()
-    return [
-        PredictionOut(
-            slot_id=p.slot_id,
-            predicted_status=p.predicted_status,
-            confidence=p.confidence,
-            valid_until=p.valid_until,
-        )
-        for p in predictions
-    ]
+async def list_predictions(request: Request):
+    if settings.slot_state_store and slot_state.ready:
+        return _cached_json(request, slot_state.predictions_payload())
+    return await asyncio.to_thread(_predictions_from_db)
+
+
+@app.get("/api/analytics/occupancy", response_model=OccupancyAnalyticsResponse)
+def occupancy_analytics(
+    floor: str | None = Query(default=None, description="Floor identifier e.g. B1"),
+    zone: str | None = Query(default=None, description="Zone identifier e.g. A"),
+    start: datetime | None = Query(default=None, alias="from", description="Range start (UTC), default 7 days before 'to'"),
+    end: datetime | None = Query(default=None, alias="to", description="Range end (UTC, exclusive), default now"),
+    bucket: Literal["15m", "1h", "1d"] = Query(default="1h"),
+    db: Session = Depends(get_read_db),
+):
+    end = to_naive_utc(end) if end else datetime.utcnow()
+    start = to_naive_utc(start) if start else end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if (end - start) / BUCKETS[bucket] > settings.analytics_max_buckets:
+        raise HTTPException(status_code=400, detail="Range too long for this bucket size; use a larger bucket")
+    return occupancy_report(db, start, end, bucket=bucket, floor=floor, zone=zone)
+
+
+_export_slots = threading.BoundedSemaphore(settings.export_max_concurrent)
+
+
+def _release_when_done(chunks, release):
+    """``chunks``, calling ``release`` once when the stream ends, fails or is dropped (client gone)."""
+
+    def stream():
+        try:
+            yield from chunks
+        finally:
+            done()
+
+    wrapped = stream()
+    # a generator dropped before its first chunk never runs its finally block
+    done = weakref.finalize(wrapped, release)
+    return wrapped
+
+
+@app.get("/api/export/sensor-logs", dependencies=[Depends(verify_operator_key)])
+def export_sensor_logs(
+    start: datetime | None = Query(default=None, alias="from", description="Range start (UTC)"),
+    end: datetime | None = Query(default=None, alias="to", description="Range end (UTC, exclusive)"),
+    slot_id: str | None = Query(default=None, description="Comma-separated slot ids"),
+    floor: str | None = Query(default=None, description="Floor identifier e.g. B1"),
+    after: str | None = Query(default=None, description="Resume after '<timestamp>,<id>' of the last row received"),
+    limit: int | None = Query(default=None, ge=1),
+    format: Literal["ndjson", "csv"] = Query(default="ndjson"),
+):
+    try:
+        cursor = parse_cursor(after) if after else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    stmt = sensor_log_export_stmt(
+        start=to_naive_utc(start) if start else None,
+        end=to_naive_utc(end) if end else None,
+        slot_ids=_split_param(slot_id),
+        floor=floor,
+        after=cursor,
+        limit=limit,
+    )
+    if not _export_slots.acquire(blocking=False):
+        raise HTTPException(status_code=429, detail="Too many exports in progress", headers={"Retry-After": "30"})
+    return StreamingResponse(
+        _release_when_done(
+            stream_sensor_logs(get_read_session, stmt, format, settings.export_batch_size), _export_slots.release
+        ),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="sensor_logs.{format}"'},
+    )
 
 
 @app.post("/api/impact", response_model=ImpactResponse)
@@ -160,43 +585,70 @@ def calculate_impact(body: ImpactRequest):
     return ImpactResponse(saved_minutes=body.saved_minutes, co2_saved_kg=co2_saved)
 
 
+@app.get("/api/ws/stats")
+def websocket_stats():
+    return manager.stats()
+
+
+def _split_param(value: str | None) -> list[str]:
+    return [v for v in (value or "").split(",") if v]
+
+
+async def _handle_client_message(websocket: WebSocket, message: str):
+    # {"action": "subscribe", "floors": [...], "zones": [...], "slots": [...]}, {"action": "unsubscribe"}
+    # or {"action": "resume", "resume_from": <seq>, "epoch": "..."}; anything else (keep-alive pings) is ignored.
+    # resume needs the epoch from the client's last frame; without it (or after a restart) the client gets a snapshot
+    try:
+        body = json.loads(message)
+    except ValueError:
+        return
+    if not isinstance(body, dict):
+        return
+    action = body.get("action")
+    if action in ("subscribe", "unsubscribe"):
+        if action == "subscribe":
+            try:
+                subscription = manager.subscribe(
+                    websocket,
+                    floors=[str(f) for f in body.get("floors") or []],
+                    zones=[str(z) for z in body.get("zones") or []],
+                    slots=[str(s) for s in body.get("slots") or []],
+                )
+            except TypeError:
+                manager.send_to(websocket, {"event": "error", "detail": "floors/zones/slots must be lists"})
+                return
+        else:
+            subscription = manager.subscribe(websocket)
+        manager.send_to(websocket, {"event": "subscribed", **subscription.as_dict()})
+        # the new selection may cover slots the client has no state for yet
+        await manager.sync(websocket)
+    elif action == "resume":
+        resume_from = body.get("resume_from")
+        if not isinstance(resume_from, int):
+            manager.send_to(websocket, {"event": "error", "detail": "resume_from must be an integer"})
+            return
+        await manager.sync(websocket, resume_from=resume_from, epoch=body.get("epoch"))
+
+
 @app.websocket("/ws/slots")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    resume_from: int | None = None,
+    epoch: str | None = None,
+    floors: str | None = None,
+    zones: str | None = None,
+    slots: str | None = None,
+):
     await manager.connect(websocket)
     try:
+        manager.subscribe(websocket, _split_param(floors), _split_param(zones), _split_param(slots))
+        # snapshot on first connect, only the missed deltas on reconnect with ?resume_from=<seq>&epoch=<epoch>
+        await manager.sync(websocket, resume_from=resume_from, epoch=epoch)
         while True:
-            await websocket.receive_text()  # keep alive; clients can ignore
+            message = await websocket.receive_text()
+            await _handle_client_message(websocket, message)
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
-
-# ---- Demo seed helpers ----
-
-def seed_demo(session: Session):
-    base_slots = [
-        {"slot_id": "A-01", "floor": "B1", "zone": "A", "distance_from_entry": 20},
-        {"slot_id": "A-02", "floor": "B1", "zone": "A", "distance_from_entry": 25},
-        {"slot_id": "A-03", "floor": "B1", "zone": "A", "distance_from_entry": 30},
-        {"slot_id": "A-04", "floor": "B1", "zone": "A", "distance_from_entry": 35},
-        {"slot_id": "A-05", "floor": "B1", "zone": "A", "distance_from_entry": 40},
-    ]
-    now = datetime.utcnow()
-    for slot in base_slots:
-        obj = crud.get_or_create_slot(
-            session,
-            slot_id=slot["slot_id"],
-            default_floor=slot["floor"],
-            zone=slot.get("zone"),
-            distance_from_entry=slot["distance_from_entry"],
-        )
-        obj.current_status = SlotStatus.available.value
-        obj.last_updated = now
-    session.commit()
-
-    # seed logs for each slot to allow predictions
-    for i, slot in enumerate(base_slots):
-        for j in range(10):
-            timestamp = now - timedelta(minutes=60 - j * 6)
-            status = 1 if (i + j) % 3 == 0 else 0
-            crud.log_sensor_update(session, slot["slot_id"], status=status, timestamp=timestamp)
-    session.commit()
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime, timedelta
 from enum import Enum
-from sqlalchemy import Column, String, Integer, DateTime, Float, ForeignKey, Boolean
+from sqlalchemy import Column, String, Integer, DateTime, Float, ForeignKey, Boolean, Index, LargeBinary
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -38,6 +38,36 @@ class SensorLog(Base):
 
     slot = relationship("ParkingSlot", back_populates="logs")
 
+    __table_args__ = (Index("ix_sensor_logs_slot_id_timestamp", "slot_id", "timestamp"),)
+
+
+class SlotOccupancyHourly(Base):
+    """Hourly per-slot rollup of sensor logs that aged out of the raw table."""
+
+    __tablename__ = "slot_occupancy_hourly"
+
+    slot_id = Column(String, ForeignKey("parking_slots.slot_id"), primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    samples = Column(Integer, nullable=False, default=0)
+    occupied_samples = Column(Integer, nullable=False, default=0)
+
+
+class ZoneOccupancy(Base):
+    """Occupancy per floor/zone in 15m, 1h and 1d buckets for the analytics API (zone "" when unset)."""
+
+    __tablename__ = "zone_occupancy"
+
+    grain = Column(String, primary_key=True)  # "15m" rows are built from raw logs, "1h"/"1d" from those
+    floor = Column(String, primary_key=True)
+    zone = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    samples = Column(Integer, nullable=False, default=0)
+    occupied_samples = Column(Integer, nullable=False, default=0)
+    # available -> occupied transitions; unknown (0) for hours seeded from slot_occupancy_hourly
+    arrivals = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (Index("ix_zone_occupancy_grain_bucket_start", "grain", "bucket_start"),)
+
 
 class Prediction(Base):
     __tablename__ = "predictions"
@@ -51,6 +81,9 @@ class Prediction(Base):
 
     slot = relationship("ParkingSlot", back_populates="predictions")
 
+    # one prediction per slot, written with INSERT ... ON CONFLICT (slot_id) DO UPDATE
+    __table_args__ = (Index("uq_predictions_slot_id", "slot_id", unique=True),)
+
 
 class IoTDevice(Base):
     __tablename__ = "iot_devices"
@@ -64,3 +97,29 @@ class IoTDevice(Base):
     last_seen = Column(DateTime, nullable=True)
 
     slot = relationship("ParkingSlot")
+
+
+class DeviceInvalidation(Base):
+    """A device disabled or re-keyed; every worker polls these to drop its cached copy."""
+
+    __tablename__ = "device_invalidations"
+
+    id = Column(Integer, primary_key=True)
+    device_id = Column(Integer, ForeignKey("iot_devices.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ModelArtifact(Base):
+    """Trained occupancy model (joblib bytes) for MODEL_STORE=database, shared by trainer and service.
+
+    ``signature`` is the HMAC-SHA256 of ``payload`` under MODEL_SIGNING_KEY; the
+    payload is a pickle and is never loaded without a matching signature.
+    """
+
+    __tablename__ = "model_artifacts"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(String, unique=True, nullable=False)
+    trained_at = Column(DateTime, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    signature = Column(String, nullable=False)
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import io
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, desc, select
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .models import ModelArtifact, ParkingSlot, SensorLog
+
+FEATURES = ["hour", "weekday", "status", "rolling_occupancy", "zone_code", "distance_from_entry"]
+ROLLING_WINDOW = 12
+LATEST_POINTER = "LATEST"
+
+
+@dataclass
+class OccupancyModel:
+    """Trained classifier for "will this slot be occupied at its next reading"."""
+
+    estimator: object
+    zones: list[str]
+    version: str
+    trained_at: datetime
+    metrics: dict = field(default_factory=dict)
+
+    def encode_zones(self, zones: pd.Series) -> np.ndarray:
+        codes = pd.Categorical(zones, categories=self.zones).codes.astype(float)
+        codes[codes < 0] = np.nan  # unseen zone -> missing
+        return codes
+
+    def predict_proba(self, frame: pd.DataFrame) -> np.ndarray:
+        X = frame.assign(zone_code=self.encode_zones(frame["zone"]))[FEATURES].to_numpy(dtype=float)
+        return self.estimator.predict_proba(X)[:, 1]
+
+
+def build_training_frame(logs: pd.DataFrame) -> pd.DataFrame:
+    """Turn raw (slot_id, timestamp, status, zone, distance_from_entry) rows into features and labels.
+
+    Everything is vectorized over the whole frame: the rolling occupancy is a
+    per-slot cumulative sum difference, the label is each slot's next status.
+    """
+    df = logs.sort_values(["slot_id", "timestamp"], kind="stable").reset_index(drop=True)
+    by_slot = df.groupby("slot_id", sort=False)
+    position = by_slot.cumcount()
+    running = by_slot["status"].cumsum()
+    dropped = running.groupby(df["slot_id"], sort=False).shift(ROLLING_WINDOW).fillna(0)
+    df["rolling_occupancy"] = (running - dropped) / np.minimum(position + 1, ROLLING_WINDOW)
+    df["target"] = by_slot["status"].shift(-1)
+    df = df.dropna(subset=["target"])
+    df["target"] = df["target"].astype(int)
+    df["hour"] = df["timestamp"].dt.hour + df["timestamp"].dt.minute / 60
+    df["weekday"] = df["timestamp"].dt.weekday
+    return df
+
+
+def train_model(logs: pd.DataFrame, holdout_fraction: float = 0.2) -> OccupancyModel:
+    from sklearn.ensemble import HistGradientBoostingClassifier
+    from sklearn.metrics import accuracy_score, log_loss, roc_auc_score
+
+    frame = build_training_frame(logs)
+    if frame["target"].nunique() < 2:
+        raise ValueError("training data needs both occupied and available readings")
+    zones = sorted(z for z in frame["zone"].dropna().unique())
+    model = OccupancyModel(
+        estimator=None,
+        zones=zones,
+        version=datetime.utcnow().strftime("%Y%m%d%H%M%S"),
+        trained_at=datetime.utcnow(),
+    )
+    frame["zone_code"] = model.encode_zones(frame["zone"])
+
+    # hold out the most recent readings to report out-of-time metrics
+    cutoff = frame["timestamp"].quantile(1 - holdout_fraction)
+    train, test = frame[frame["timestamp"] <= cutoff], frame[frame["timestamp"] > cutoff]
+    zone_index = FEATURES.index("zone_code")
+    estimator = HistGradientBoostingClassifier(max_iter=200, categorical_features=[zone_index], random_state=0)
+    estimator.fit(train[FEATURES].to_numpy(dtype=float), train["target"].to_numpy())
+    model.estimator = estimator
+
+    if len(test) and test["target"].nunique() == 2:
+        proba = estimator.predict_proba(test[FEATURES].to_numpy(dtype=float))[:, 1]
+        model.metrics = {
+            "rows": int(len(frame)),
+            "holdout_rows": int(len(test)),
+            "auc": float(roc_auc_score(test["target"], proba)),
+            "log_loss": float(log_loss(test["target"], proba)),
+            "accuracy": float(accuracy_score(test["target"], proba >= 0.5)),
+        }
+    return model
+
+
+def load_training_logs(session: Session, since: Optional[datetime] = None) -> pd.DataFrame:
+    stmt = select(
+        SensorLog.slot_id,
+        SensorLog.timestamp,
+        SensorLog.status,
+        ParkingSlot.zone,
+        ParkingSlot.distance_from_entry,
+    ).join(ParkingSlot, ParkingSlot.slot_id == SensorLog.slot_id)
+    if since is not None:
+        stmt = stmt.where(SensorLog.timestamp >= since)
+    frame = pd.DataFrame(
+        session.execute(stmt).all(),
+        columns=["slot_id", "timestamp", "status", "zone", "distance_from_entry"],
+    )
+    frame["timestamp"] = pd.to_datetime(frame["timestamp"])
+    return frame
+
+
+def check_training_window(logs: pd.DataFrame, since: datetime, slack: timedelta = timedelta(days=1)):
+    """Raise ValueError unless ``logs`` reach back to ``since``.
+
+    Training needs raw readings; scripts/compact_logs.py rolls older ones into
+    hourly aggregates, so a window longer than the raw retention would quietly
+    train on the last few days only.
+    """
+    if logs.empty:
+        raise ValueError(f"no raw sensor logs since {since:%Y-%m-%d %H:%M}")
+    oldest = logs["timestamp"].min().to_pydatetime()
+    if oldest > since + slack:
+        covered = (datetime.utcnow() - oldest) / timedelta(days=1)
+        requested = (datetime.utcnow() - since) / timedelta(days=1)
+        raise ValueError(
+            f"raw sensor logs cover {covered:.1f} of the {requested:.0f} requested days "
+            "(older ones are compacted or were never collected); train on fewer --days "
+            "or keep raw logs for the training window"
+        )
+
+
+def save_model(model: OccupancyModel, model_dir: str) -> str:
+    import joblib
+
+    os.makedirs(model_dir, exist_ok=True)
+    filename = f"occupancy-{model.version}.joblib"
+    path = os.path.join(model_dir, filename)
+    joblib.dump(model, path)
+    # point LATEST at the new artifact only once it is fully written
+    tmp = os.path.join(model_dir, LATEST_POINTER + ".tmp")
+    with open(tmp, "w") as fh:
+        fh.write(filename)
+    os.replace(tmp, os.path.join(model_dir, LATEST_POINTER))
+    return path
+
+
+def load_latest_model(model_dir: str) -> Optional[OccupancyModel]:
+    import joblib
+
+    pointer = os.path.join(model_dir, LATEST_POINTER)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as fh:
+        filename = fh.read().strip()
+    return joblib.load(os.path.join(model_dir, filename))
+
+
+def sign_payload(payload: bytes, key: str) -> str:
+    return hmac.new(key.encode(), payload, hashlib.sha256).hexdigest()
+
+
+def save_model_to_database(session: Session, model: OccupancyModel, key: str, keep: int = 5) -> str:
+    """Store the artifact, signed with ``key``, in model_artifacts (newest ``keep`` are kept).
+
+    The caller owns the commit.
+    """
+    import joblib
+
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    payload = buffer.getvalue()
+    session.add(
+        ModelArtifact(
+            version=model.version,
+            trained_at=model.trained_at,
+            payload=payload,
+            signature=sign_payload(payload, key),
+        )
+    )
+    session.flush()
+    newest = select(ModelArtifact.id).order_by(desc(ModelArtifact.id)).limit(keep)
+    session.execute(delete(ModelArtifact).where(ModelArtifact.id.not_in(newest)))
+    return f"model_artifacts:{model.version}"
+
+
+def load_latest_model_from_database(session: Session, key: str) -> Optional[OccupancyModel]:
+    """Newest artifact in model_artifacts; ValueError if its signature does not match ``key``.
+
+    joblib.load unpickles, i.e. runs code from the payload, so the signature is
+    checked first: a row written by anyone without the key is refused.
+    """
+    import joblib
+
+    row = session.execute(
+        select(ModelArtifact.version, ModelArtifact.payload, ModelArtifact.signature)
+        .order_by(desc(ModelArtifact.id))
+        .limit(1)
+    ).first()
+    if row is None:
+        return None
+    if not hmac.compare_digest(sign_payload(row.payload, key), row.signature):
+        raise ValueError(f"model artifact {row.version} has an invalid signature; not loading it")
+    return joblib.load(io.BytesIO(row.payload))
+
+
+def latest_model_version(session: Session) -> Optional[str]:
+    """Version of the artifact ``load_stored_model`` would return, without loading it."""
+    settings = get_settings()
+    if settings.model_store == "database":
+        return session.scalar(select(ModelArtifact.version).order_by(desc(ModelArtifact.id)).limit(1))
+    pointer = os.path.join(settings.model_dir, LATEST_POINTER)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as fh:
+        # LATEST holds the file name save_model wrote: occupancy-<version>.joblib
+        return fh.read().strip().removeprefix("occupancy-").removesuffix(".joblib")
+
+
+def store_model(session: Session, model: OccupancyModel) -> str:
+    """Save to the configured MODEL_STORE: ``model_dir`` or the model_artifacts table."""
+    settings = get_settings()
+    if settings.model_store == "database":
+        return save_model_to_database(session, model, settings.model_signing_key)
+    return save_model(model, settings.model_dir)
+
+
+def load_stored_model(session: Session) -> Optional[OccupancyModel]:
+    """Newest artifact of the configured MODEL_STORE.
+
+    Artifacts are pickles: whoever can write ``model_dir`` can run code in this
+    process, so keep it writable by the trainer only. Database artifacts must
+    carry a MODEL_SIGNING_KEY signature.
+    """
+    settings = get_settings()
+    if settings.model_store == "database":
+        return load_latest_model_from_database(session, settings.model_signing_key)
+    return load_latest_model(settings.model_dir)
+
+
+_active_model: Optional[OccupancyModel] = None
+
+
+def get_active_model() -> Optional[OccupancyModel]:
+    return _active_model
+
+
+def set_active_model(model: Optional[OccupancyModel]):
+    global _active_model
+    _active_model = model
@@ -0,0 +1,57 @@
+"""Opt-in per-request SQL profile (``SQL_PROFILING=1``).
+
+Each HTTP request gets an ``X-SQL-Profile`` header and one JSON log line with
+its query count, time in the database and any statement shape repeated at
+least ``sql_profiling_repeat_threshold`` times (logged as a warning).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+
+from .database import profile_sql
+
+logger = logging.getLogger("app.sql_profile")
+
+
+class SqlProfilingMiddleware:
+    def __init__(self, app, repeat_threshold: int = 5, header: bool = True):
+        self.app = app
+        self.repeat_threshold = repeat_threshold
+        self.header = header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+        with profile_sql() as profile:
+
+            async def send_wrapper(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    if self.header:
+                        repeated = profile.repeated(self.repeat_threshold)
+                        value = f"queries={profile.queries};db_ms={profile.seconds * 1000:.2f};repeated={len(repeated)}"
+                        message["headers"] = [*message.get("headers", []), (b"x-sql-profile", value.encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                repeated = profile.repeated(self.repeat_threshold)
+                record = {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": getattr(scope.get("route"), "path", None),
+                    "status": status,
+                    "queries": profile.queries,
+                    "db_ms": round(profile.seconds * 1000, 2),
+                    "total_ms": round((time.perf_counter() - start) * 1000, 2),
+                    "repeated": repeated,
+                }
+                logger.log(logging.WARNING if repeated else logging.INFO, "sql_profile %s", json.dumps(record))
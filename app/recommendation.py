@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import heapq
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, desc, func, select
+from sqlalchemy.orm import Session, aliased
+
+from .history import reading_history
+from .models import ParkingSlot, SensorLog, SlotStatus
+
+RECENT_LOGS = 50
+
+
+def score_slot(probability_available: float, distance_from_entry: int) -> float:
+    return probability_available * 0.7 + (1.0 / (1 + distance_from_entry)) * 0.3
+
+
+def _recent_statuses_stmt():
+    """(slot_id, status, timestamp) of each slot's last RECENT_LOGS logs, oldest first.
+
+    A per-slot cutoff (the timestamp of the RECENT_LOGS-th newest log) is
+    computed first, so each slot is an index range scan rather than a window
+    ranking the whole table. Logs tied at the cutoff may add a few older rows;
+    the ``recent`` deques drop them.
+    """
+    older = aliased(SensorLog)
+    cutoff = (
+        select(older.timestamp)
+        .where(older.slot_id == ParkingSlot.slot_id)
+        .order_by(desc(older.timestamp), desc(older.id))
+        .offset(RECENT_LOGS - 1)
+        .limit(1)
+        .correlate(ParkingSlot)
+        .scalar_subquery()
+    )
+    cutoffs = (
+        select(ParkingSlot.slot_id, func.coalesce(cutoff, datetime.min).label("since"))
+        .cte("recent_cutoffs")
+        .prefix_with("MATERIALIZED")
+    )
+    return (
+        select(SensorLog.slot_id, SensorLog.status, SensorLog.timestamp)
+        .select_from(cutoffs)
+        .join(SensorLog, and_(SensorLog.slot_id == cutoffs.c.slot_id, SensorLog.timestamp >= cutoffs.c.since))
+        .order_by(SensorLog.slot_id, SensorLog.timestamp, SensorLog.id)
+    )
+
+
+@dataclass
+class _SlotEntry:
+    slot_id: str
+    floor: str
+    zone: Optional[str]
+    distance_from_entry: int
+    available: bool = True
+    predicted_occupied: bool = False
+    confidence: float = 0.5
+    recent: deque = field(default_factory=lambda: deque(maxlen=RECENT_LOGS))
+    rollup_ratio: Optional[float] = None
+    version: int = 0
+
+    @property
+    def probability_available(self) -> float:
+        if self.predicted_occupied:
+            return max(0.0, 1.0 - self.confidence)
+        if self.recent:
+            return max(0.1, 1.0 - sum(self.recent) / len(self.recent))
+        if self.rollup_ratio is not None:
+            return max(0.1, 1.0 - self.rollup_ratio)
+        return 0.8
+
+    @property
+    def score(self) -> float:
+        return score_slot(self.probability_available, self.distance_from_entry)
+
+
+@dataclass(frozen=True)
+class RankedSlot:
+    slot_id: str
+    floor: str
+    zone: Optional[str]
+    distance_from_entry: int
+    probability_available: float
+    score: float
+
+
+class RecommendationIndex:
+    """In-memory ranking of available slots by the recommendation score.
+
+    Scores live in lazily-invalidated heaps (global, per floor, per zone and per
+    floor+zone), so a lookup pops only as many entries as it returns plus any
+    stale ones. Crud write paths feed it after their transaction commits.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._slots: dict[str, _SlotEntry] = {}
+        self._heaps: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        # updates committed while a rebuild is reading the database, replayed onto its result
+        self._replay: list | None = None
+
+    # ---- building ----
+    def rebuild(self, session: Session):
+        """Reload from the database; safe to run while crud writes keep feeding the index."""
+        from .crud import get_rollup_occupancy_ratios, get_slots_with_predictions  # local import to avoid circular
+
+        with self._lock:
+            self._replay = []
+        try:
+            slots: dict[str, _SlotEntry] = {}
+            for slot, prediction in get_slots_with_predictions(session):
+                entry = _SlotEntry(
+                    slot_id=slot.slot_id,
+                    floor=slot.floor,
+                    zone=slot.zone,
+                    distance_from_entry=slot.distance_from_entry,
+                    available=slot.current_status == SlotStatus.available.value,
+                )
+                if prediction is not None:
+                    entry.predicted_occupied = prediction.predicted_status == SlotStatus.predicted_occupied.value
+                    entry.confidence = prediction.confidence
+                slots[slot.slot_id] = entry
+            # (timestamp, status) of what went into each ``recent``, to recognise it among the replayed readings
+            loaded: dict[str, Counter] = {}
+            if reading_history.ready:
+                slot_ids = list(slots)
+                slot_index, timestamps, statuses = reading_history.recent(slot_ids, RECENT_LOGS)
+                # newest-first from the history; the deques want oldest-first
+                readings = zip(slot_index[::-1].tolist(), statuses[::-1].tolist(), timestamps[::-1].tolist())
+                readings = ((slot_ids[i], status, timestamp) for i, status, timestamp in readings)
+            else:
+                readings = session.execute(_recent_statuses_stmt())
+            for slot_id, status, timestamp in readings:
+                if slot_id in slots:
+                    slots[slot_id].recent.append(status)
+                    loaded.setdefault(slot_id, Counter())[(timestamp, status)] += 1
+            for slot_id, ratio in get_rollup_occupancy_ratios(session).items():
+                if slot_id in slots:
+                    slots[slot_id].rollup_ratio = ratio
+        except BaseException:
+            with self._lock:
+                self._replay = None
+            raise
+
+        with self._lock:
+            self._slots = slots
+            self._heaps = {}
+            for entry in slots.values():
+                self._push(entry)
+            replay, self._replay = self._replay or [], None
+            for apply, args in replay:
+                if apply == self._record_reading:
+                    # committed after the replay opened but before the read: already in ``recent``
+                    slot_id, status, timestamp = args
+                    seen = loaded.get(slot_id)
+                    if seen and seen[(timestamp, status)]:
+                        seen[(timestamp, status)] -= 1
+                        self._record_reading(slot_id, status, timestamp, in_recent=True)
+                        continue
+                apply(*args)
+            self.ready = True
+
+    def clear(self):
+        with self._lock:
+            self._slots = {}
+            self._heaps = {}
+            self._replay = None
+            self.ready = False
+
+    # ---- incremental updates ----
+    def upsert_slot(self, slot_id: str, floor: str, zone: Optional[str], distance_from_entry: int, available: bool):
+        self._apply(self._upsert_slot, slot_id, floor, zone, distance_from_entry, available)
+
+    def record_reading(self, slot_id: str, status: int, timestamp: datetime):
+        self._apply(self._record_reading, slot_id, status, timestamp)
+
+    def set_prediction(self, slot_id: str, predicted_status: str, confidence: float):
+        self._apply(self._set_prediction, slot_id, predicted_status, confidence)
+
+    def _apply(self, apply, *args):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((apply, args))
+            apply(*args)
+
+    def _upsert_slot(self, slot_id, floor, zone, distance_from_entry, available):
+        entry = self._slots.get(slot_id)
+        if entry is None:
+            entry = self._slots[slot_id] = _SlotEntry(slot_id, floor, zone, distance_from_entry)
+        entry.floor, entry.zone, entry.distance_from_entry = floor, zone, distance_from_entry
+        entry.available = available
+        self._touch(entry)
+
+    def _record_reading(self, slot_id, status, timestamp, in_recent=False):
+        entry = self._slots.get(slot_id)
+        if entry is None:
+            return
+        if not in_recent:
+            entry.recent.append(status)
+        entry.available = status != 1
+        self._touch(entry)
+
+    def _set_prediction(self, slot_id, predicted_status, confidence):
+        entry = self._slots.get(slot_id)
+        if entry is None:
+            return
+        entry.predicted_occupied = predicted_status == SlotStatus.predicted_occupied.value
+        entry.confidence = confidence
+        self._touch(entry)
+
+    def _touch(self, entry: _SlotEntry):
+        entry.version += 1
+        if entry.available:
+            self._push(entry)
+        if sum(len(h) for h in self._heaps.values()) > 8 * len(self._slots) + 1024:
+            self._compact()
+
+    def _push(self, entry: _SlotEntry):
+        if not entry.available:
+            return
+        item = (-entry.score, entry.slot_id, entry.version)
+        for key in self._keys(entry):
+            heapq.heappush(self._heaps.setdefault(key, []), item)
+
+    @staticmethod
+    def _keys(entry: _SlotEntry):
+        return ((), ("floor", entry.floor), ("zone", entry.zone), ("floor_zone", entry.floor, entry.zone))
+
+    def _compact(self):
+        self._heaps = {}
+        for entry in self._slots.values():
+            self._push(entry)
+
+    def _is_live(self, item) -> bool:
+        entry = self._slots.get(item[1])
+        return entry is not None and entry.available and entry.version == item[2]
+
+    # ---- queries ----
+    def top(self, k: int = 1, floor: Optional[str] = None, zone: Optional[str] = None) -> list[RankedSlot]:
+        if floor and zone:
+            key = ("floor_zone", floor, zone)
+        elif floor:
+            key = ("floor", floor)
+        elif zone:
+            key = ("zone", zone)
+        else:
+            key = ()
+        with self._lock:
+            heap = self._heaps.get(key, [])
+            taken = []
+            while heap and len(taken) < k:
+                item = heapq.heappop(heap)
+                if self._is_live(item):
+                    taken.append(item)
+            for item in taken:
+                heapq.heappush(heap, item)
+            result = []
+            for _, slot_id, _ in taken:
+                entry = self._slots[slot_id]
+                result.append(
+                    RankedSlot(
+                        slot_id=entry.slot_id,
+                        floor=entry.floor,
+                        zone=entry.zone,
+                        distance_from_entry=entry.distance_from_entry,
+                        probability_available=entry.probability_available,
+                        score=entry.score,
+                    )
+                )
+            return result
+
+    def check_consistency(self, session: Session, tolerance: float = 1e-9) -> list[str]:
+        """Compare the indexed best slot with a ranking read from the database only; returns mismatch descriptions.
+
+        The in-process history is bypassed: it is fed by the same writes as the
+        index, so it would drift along with it.
+        """
+        from .crud import rank_recommendations  # local import to avoid circular
+
+        ranked = rank_recommendations(session, top_k=1, use_history=False)
+        slot, probability = ranked[0] if ranked else (None, 0.0)
+        top = self.top(1)
+        problems = []
+        if slot is None or not top:
+            if (slot is None) != (not top):
+                problems.append(f"scan={slot and slot.slot_id} index={top and top[0].slot_id}")
+            return problems
+        expected = score_slot(probability, slot.distance_from_entry)
+        if abs(top[0].score - expected) > tolerance:
+            problems.append(f"score scan={expected:.6f} index={top[0].score:.6f}")
+        elif top[0].slot_id != slot.slot_id:
+            problems.append(f"tie broken differently: scan={slot.slot_id} index={top[0].slot_id}")
+        return problems
+
+
+recommendation_index = RecommendationIndex()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, delete, func, select, type_coerce
+from sqlalchemy.orm import Session
+
+from .models import SensorLog, SlotOccupancyHourly
+
+
+def hour_bucket(session: Session, column):
+    if session.get_bind().dialect.name == "sqlite":
+        # same text layout SQLAlchemy uses for DateTime on SQLite
+        return type_coerce(func.strftime("%Y-%m-%d %H:00:00.000000", column), DateTime)
+    return func.date_trunc("hour", column)
+
+
+def upsert_hourly(session: Session, rows: list[dict]):
+    """Add sample counts into existing rollup rows, inserting missing hours."""
+    from .crud import dialect_insert  # local import to avoid circular
+
+    if not rows:
+        return
+    stmt = dialect_insert(session, SlotOccupancyHourly)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SlotOccupancyHourly.slot_id, SlotOccupancyHourly.hour],
+        set_={
+            "samples": SlotOccupancyHourly.samples + stmt.excluded.samples,
+            "occupied_samples": SlotOccupancyHourly.occupied_samples + stmt.excluded.occupied_samples,
+        },
+    )
+    session.execute(stmt, rows)
+
+
+def compact_sensor_logs(
+    session: Session,
+    older_than: timedelta,
+    batch_size: int = 5000,
+    max_batches: int | None = None,
+) -> int:
+    """Roll raw logs older than ``older_than`` into hourly aggregates and delete them.
+
+    Works in batches of at most ``batch_size`` rows, each rolled up and pruned in
+    its own short transaction, so a row is never counted twice and writers are
+    not blocked for long. Returns the number of raw rows removed.
+    """
+    cutoff = datetime.utcnow() - older_than
+    bucket = hour_bucket(session, SensorLog.timestamp)
+    removed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(
+            session.scalars(
+                select(SensorLog.id)
+                .where(SensorLog.timestamp < cutoff)
+                .order_by(SensorLog.timestamp, SensorLog.id)
+                .limit(batch_size)
+            )
+        )
+        if not ids:
+            break
+        grouped = session.execute(
+            select(SensorLog.slot_id, bucket, func.count(), func.sum(SensorLog.status))
+            .where(SensorLog.id.in_(ids))
+            .group_by(SensorLog.slot_id, bucket)
+        )
+        upsert_hourly(
+            session,
+            [
+                {"slot_id": slot_id, "hour": hour, "samples": samples, "occupied_samples": int(occupied or 0)}
+                for slot_id, hour, samples, occupied in grouped
+            ],
+        )
+        session.execute(delete(SensorLog).where(SensorLog.id.in_(ids)))
+        session.commit()
+        removed += len(ids)
+        batches += 1
+    return removed
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from sqlalchemy import delete, func, inspect, select
+from sqlalchemy.engine import Engine
+
+from .database import Base
+from .models import Prediction
+
+
+def ensure_indexes(bind: Engine):
+    """Create indexes added after a table already existed (create_all skips those)."""
+    existing = {index["name"] for index in inspect(bind).get_indexes(Prediction.__tablename__)}
+    if "uq_predictions_slot_id" not in existing:
+        # older databases may hold several predictions per slot; keep the newest before enforcing one per slot
+        with bind.begin() as conn:
+            newest = select(func.max(Prediction.id)).group_by(Prediction.slot_id)
+            conn.execute(delete(Prediction).where(Prediction.id.not_in(newest)))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
+def upgrade_schema(bind: Engine):
+    Base.metadata.create_all(bind=bind)
+    ensure_indexes(bind)
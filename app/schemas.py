@@ -4,11 +4,13 @@ from datetime import datetime
 from typing import List, Union
 from pydantic import BaseModel, Field, field_validator
 
+from .utils import to_naive_utc
+
 
 class SlotUpdate(BaseModel):
     slot_id: str = Field(..., examples=["A-03"])
     status: int = Field(..., ge=0, le=1, examples=[1])
-    timestamp: Union[datetime, int, float, None] = None
+    timestamp: Union[datetime, int, float, None] = Field(default=None, validate_default=True)
 
     @field_validator("timestamp", mode="before")
     @classmethod
@@ -20,6 +22,34 @@ class SlotUpdate(BaseModel):
         # string ISO atau datetime akan diparse otomatis oleh Pydantic
         return v
 
+    @field_validator("timestamp")
+    @classmethod
+    def naive_utc(cls, v: datetime) -> datetime:
+        # offsets ("Z", "+07:00") become naive UTC like the rest of the stored timestamps
+        return to_naive_utc(v)
+
+
+class BatchSlotUpdate(SlotUpdate):
+    # gateways may forward readings for several devices; defaults to the caller's key
+    api_key: str | None = None
+
+
+class SlotUpdateBatch(BaseModel):
+    updates: List[BatchSlotUpdate] = Field(..., min_length=1, max_length=1000)
+
+
+class SlotUpdateResult(BaseModel):
+    index: int
+    slot_id: str
+    accepted: bool
+    detail: str | None = None
+
+
+class SlotUpdateBatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[SlotUpdateResult]
+
 
 class ParkingSlotOut(BaseModel):
     slot_id: str
@@ -55,6 +85,7 @@ class RecommendationItem(BaseModel):
 class RecommendationResponse(BaseModel):
     recommended: RecommendationItem | None
     reason: str | None = None
+    alternatives: List[RecommendationItem] = []
 
 
 class ImpactRequest(BaseModel):
@@ -64,3 +95,26 @@ class ImpactRequest(BaseModel):
 class ImpactResponse(BaseModel):
     saved_minutes: float
     co2_saved_kg: float
+
+
+class OccupancyBucketOut(BaseModel):
+    start: datetime
+    samples: int
+    occupancy_ratio: float | None
+    arrivals: int
+    turnover: float  # arrivals per slot
+
+
+class OccupancyAnalyticsResponse(BaseModel):
+    floor: str | None
+    zone: str | None
+    bucket: str
+    start: datetime
+    end: datetime
+    slots: int
+    samples: int
+    occupancy_ratio: float | None
+    arrivals: int
+    turnover: float
+    peaks: List[OccupancyBucketOut]
+    buckets: List[OccupancyBucketOut]
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from . import crud
+from .models import ParkingSlot, SlotStatus
+
+DEMO_SLOTS = [
+    {"slot_id": "A-01", "floor": "B1", "zone": "A", "distance_from_entry": 20},
+    {"slot_id": "A-02", "floor": "B1", "zone": "A", "distance_from_entry": 25},
+    {"slot_id": "A-03", "floor": "B1", "zone": "A", "distance_from_entry": 30},
+    {"slot_id": "A-04", "floor": "B1", "zone": "A", "distance_from_entry": 35},
+    {"slot_id": "A-05", "floor": "B1", "zone": "A", "distance_from_entry": 40},
+]
+
+
+def seed_demo(session: Session):
+    now = datetime.utcnow()
+    for slot in DEMO_SLOTS:
+        obj = crud.get_or_create_slot(
+            session,
+            slot_id=slot["slot_id"],
+            default_floor=slot["floor"],
+            zone=slot.get("zone"),
+            distance_from_entry=slot["distance_from_entry"],
+        )
+        obj.current_status = SlotStatus.available.value
+        obj.last_updated = now
+    session.commit()
+
+    # seed logs for each slot to allow predictions
+    for i, slot in enumerate(DEMO_SLOTS):
+        for j in range(10):
+            timestamp = now - timedelta(minutes=60 - j * 6)
+            status = 1 if (i + j) % 3 == 0 else 0
+            crud.log_sensor_update(session, slot["slot_id"], status=status, timestamp=timestamp)
+    session.commit()
+
+
+def bootstrap_demo(session: Session) -> tuple[bool, int]:
+    """Seed the demo slots into an empty database and give every slot a device.
+
+    Returns (seeded, devices_created).
+    """
+    seeded = session.query(ParkingSlot).first() is None
+    if seeded:
+        seed_demo(session)
+    devices = crud.create_missing_devices(session)
+    session.commit()
+    return seeded, devices
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from datetime import datetime
+from typing import Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from .models import SlotStatus
+from .schemas import ParkingMapResponse, ParkingSlotOut, PredictionOut
+
+_predictions_adapter = TypeAdapter(list[PredictionOut])
+
+
+class SlotRecord:
+    __slots__ = (
+        "slot_id",
+        "floor",
+        "zone",
+        "distance_from_entry",
+        "status",
+        "last_updated",
+        "predicted_status",
+        "confidence",
+        "valid_until",
+    )
+
+    def __init__(self, slot_id: str, floor: str, zone: Optional[str], distance_from_entry: int, status: str, last_updated: datetime):
+        self.slot_id = slot_id
+        self.floor = floor
+        self.zone = zone
+        self.distance_from_entry = distance_from_entry
+        self.status = status
+        self.last_updated = last_updated
+        self.predicted_status: Optional[str] = None
+        self.confidence: Optional[float] = None
+        self.valid_until: Optional[datetime] = None
+
+    @property
+    def map_status(self) -> str:
+        if self.predicted_status == SlotStatus.predicted_occupied.value and self.status == SlotStatus.available.value:
+            return SlotStatus.predicted_occupied.value
+        return self.status
+
+
+class SlotStateStore:
+    """In-memory copy of every slot and its prediction, serving the map and predictions endpoints.
+
+    Crud write paths update it after their transaction commits (like the
+    recommendation index). Responses are serialized once per floor and cached
+    with a content ETag until a slot on that floor changes.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._records: dict[str, SlotRecord] = {}
+        self._floors: dict[str, dict[str, SlotRecord]] = {}
+        # (kind, floor) -> (etag, body); dropped when something it covers changes
+        self._payloads: dict[tuple, tuple[str, bytes]] = {}
+        self._lock = threading.Lock()
+        self._replay: list | None = None
+
+    # ---- building ----
+    def load(self, session: Session):
+        """Reload from the database; safe to run while crud writes keep feeding the store."""
+        from .crud import get_slots_with_predictions  # local import to avoid circular
+
+        with self._lock:
+            self._replay = []
+        try:
+            records: dict[str, SlotRecord] = {}
+            for slot, prediction in get_slots_with_predictions(session):
+                record = SlotRecord(
+                    slot.slot_id, slot.floor, slot.zone, slot.distance_from_entry, slot.current_status, slot.last_updated
+                )
+                if prediction is not None:
+                    record.predicted_status = prediction.predicted_status
+                    record.confidence = prediction.confidence
+                    record.valid_until = prediction.valid_until
+                records[slot.slot_id] = record
+        except BaseException:
+            with self._lock:
+                self._replay = None
+            raise
+
+        with self._lock:
+            self._records = records
+            self._floors = {}
+            for record in records.values():
+                self._floors.setdefault(record.floor, {})[record.slot_id] = record
+            self._payloads = {}
+            replay, self._replay = self._replay or [], None
+            for apply, args in replay:
+                apply(*args)
+            self.ready = True
+
+    def clear(self):
+        with self._lock:
+            self._records = {}
+            self._floors = {}
+            self._payloads = {}
+
+    # ---- incremental updates ----
+    def upsert_slot(self, slot_id: str, floor: str, zone: Optional[str], distance_from_entry: int, status: str, last_updated: datetime):
+        self._apply(self._upsert_slot, slot_id, floor, zone, distance_from_entry, status, last_updated)
+
+    def set_predictions(self, predictions: list[tuple[str, str, float]], valid_until: datetime):
+        self._apply(self._set_predictions, predictions, valid_until)
+
+    def _apply(self, apply, *args):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((apply, args))
+            apply(*args)
+
+    def _upsert_slot(self, slot_id, floor, zone, distance_from_entry, status, last_updated):
+        record = self._records.get(slot_id)
+        if record is None:
+            record = self._records[slot_id] = SlotRecord(slot_id, floor, zone, distance_from_entry, status, last_updated)
+        elif record.floor != floor:
+            self._floors.get(record.floor, {}).pop(slot_id, None)
+            self._invalidate(record.floor)
+        record.floor, record.zone, record.distance_from_entry = floor, zone, distance_from_entry
+        record.status, record.last_updated = status, last_updated
+        self._floors.setdefault(floor, {})[slot_id] = record
+        self._invalidate(floor)
+
+    def _set_predictions(self, predictions, valid_until):
+        for slot_id, predicted_status, confidence in predictions:
+            record = self._records.get(slot_id)
+            if record is None:
+                continue
+            record.predicted_status, record.confidence, record.valid_until = predicted_status, confidence, valid_until
+            self._invalidate(record.floor)
+        self._payloads.pop(("predictions", None), None)
+
+    def _invalidate(self, floor: str):
+        self._payloads.pop(("map", floor), None)
+        self._payloads.pop(("map", None), None)
+
+    # ---- serialized reads ----
+    def map_payload(self, floor: Optional[str] = None) -> tuple[str, bytes]:
+        with self._lock:
+            cached = self._payloads.get(("map", floor))
+            if cached is not None:
+                return cached
+            if floor:
+                records = sorted(self._floors.get(floor, {}).values(), key=lambda r: r.slot_id)
+                chosen_floor = floor
+            else:
+                records = sorted(self._records.values(), key=lambda r: r.slot_id)
+                chosen_floor = records[0].floor if records else "B1"
+            response = ParkingMapResponse(
+                floor=chosen_floor,
+                slots=[
+                    ParkingSlotOut(
+                        slot_id=r.slot_id,
+                        floor=r.floor,
+                        zone=r.zone,
+                        distance_from_entry=r.distance_from_entry,
+                        status=r.map_status,
+                        last_updated=r.last_updated,
+                    )
+                    for r in records
+                ],
+            )
+            return self._cache(("map", floor), response.model_dump_json().encode())
+
+    def predictions_payload(self) -> tuple[str, bytes]:
+        with self._lock:
+            cached = self._payloads.get(("predictions", None))
+            if cached is not None:
+                return cached
+            predictions = [
+                PredictionOut(
+                    slot_id=r.slot_id,
+                    predicted_status=r.predicted_status,
+                    confidence=r.confidence,
+                    valid_until=r.valid_until,
+                )
+                for r in sorted(self._records.values(), key=lambda r: r.slot_id)
+                if r.predicted_status is not None
+            ]
+            return self._cache(("predictions", None), _predictions_adapter.dump_json(predictions))
+
+    def _cache(self, key: tuple, body: bytes) -> tuple[str, bytes]:
+        # content hash, so every worker hands out the same ETag for the same state
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self._payloads[key] = (etag, body)
+        return etag, body
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+slot_state = SlotStateStore()
@@ -1,9 +1,17 @@
 from __future__ import annotations
 
 import secrets
+from datetime import datetime, timezone
 
 
 def generate_api_key(slot_id: str | None = None) -> str:
     rand = secrets.token_urlsafe(18)  # ~24 chars
     slot_part = f"{slot_id}_" if slot_id else ""
     return f"psai_{slot_part}{rand}"
+
+
+def to_naive_utc(moment: datetime) -> datetime:
+    """Naive UTC datetime, the form every DateTime column (and the in-memory stores) hold."""
+    if moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
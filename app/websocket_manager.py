@@ -1,43 +1,364 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Set
+import json
+import logging
+import secrets
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict
 from fastapi import WebSocket
 
+from .broadcast import InProcessBroadcast
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Floor/zone/slot filter for a client; an empty subscription receives everything."""
+
+    __slots__ = ("floors", "zones", "slots", "key")
+
+    def __init__(self, floors=(), zones=(), slots=()):
+        self.floors = frozenset(floors)
+        self.zones = frozenset(zones)
+        self.slots = frozenset(slots)
+        self.key = (self.floors, self.zones, self.slots)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.floors or self.zones or self.slots)
+
+    def matches(self, event: dict) -> bool:
+        if self.is_empty or "slot_id" not in event:
+            return True
+        if event["slot_id"] in self.slots:
+            return True
+        if not (self.floors or self.zones):
+            return False
+        return (not self.floors or event.get("floor") in self.floors) and (
+            not self.zones or event.get("zone") in self.zones
+        )
+
+    def as_dict(self) -> dict:
+        return {"floors": sorted(self.floors), "zones": sorted(self.zones), "slots": sorted(self.slots)}
+
+
+_ALL = Subscription()
+
+
+class _Client:
+    __slots__ = ("websocket", "queue", "task", "behind_since", "subscription", "live")
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=max_queue)
+        self.task: asyncio.Task | None = None
+        self.behind_since: float | None = None
+        self.subscription = _ALL
+        # only live clients receive broadcast frames; others are still being synced
+        self.live = False
+
 
 class ConnectionManager:
-    def __init__(self, max_queue: int = 100):
-        self.active_connections: Set[WebSocket] = set()
-        self.queue = asyncio.Queue(maxsize=max_queue)
+    """Fan-out of JSON events to WebSocket clients.
+
+    Events are merged by slot_id as they arrive (latest state per slot wins),
+    so a large ingest batch never overflows anything, and are flushed every
+    ``batch_window_ms`` as one ``slot_updates`` frame, filtered by each client's
+    subscription. Each distinct frame is encoded once and handed to every
+    matching client's own bounded queue, drained by a per-client sender task,
+    so one slow socket never holds up the others. A client whose queue stays
+    full for ``slow_client_seconds`` is evicted.
+
+    Every delta gets a sequence number and is kept in a ring buffer of the last
+    ``replay_buffer`` deltas. A (re)connecting client is synced either by
+    replaying the deltas after its ``resume_from`` sequence or, when the gap
+    is no longer buffered, with a snapshot from ``snapshot_provider``.
+    Resuming requires the ``epoch`` the client was last sent: sequence numbers
+    from another process run (or a request without an epoch) get a snapshot.
+
+    ``send_json``/``send_many`` publish through ``backend`` (a batch travels as
+    one message); with a pub/sub backend every worker receives every event and
+    sequences it for its own connections. Only events without a slot_id are
+    bounded by ``max_queue`` and dropped oldest-first.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 100,
+        client_queue: int = 100,
+        slow_client_seconds: float = 5.0,
+        batch_window_ms: int = 100,
+        replay_buffer: int = 1000,
+        snapshot_provider: Callable[[], Awaitable[list[dict]]] | None = None,
+        backend=None,
+    ):
+        self.clients: Dict[WebSocket, _Client] = {}
+        # carries events between workers; see app/broadcast.py
+        self.backend = backend or InProcessBroadcast()
+        self.batch_window = batch_window_ms / 1000
+        self.snapshot_provider = snapshot_provider
+        # sequence numbers restart with the process; the epoch tells clients which run they belong to
+        self.epoch = secrets.token_hex(4)
+        self.seq = 0
+        self.history: deque[dict] = deque(maxlen=replay_buffer)
+        self._snapshot_inflight: asyncio.Future | None = None
+        self.snapshots = 0
+        self.replays = 0
+        # events waiting for the next flush, keyed by slot_id (or a counter for other events)
+        self.pending: dict = {}
+        self.max_queue = max_queue
+        self._other_events = 0
+        self._other_key = 0
+        self._wake = asyncio.Event()
+        self.client_queue = client_queue
+        self.slow_client_seconds = slow_client_seconds
         self._broadcast_task: asyncio.Task | None = None
+        # close() calls of evicted clients; referenced here so they are not collected before they run
+        self._closing: set[asyncio.Task] = set()
+        self.dropped = 0  # events without a slot_id dropped from the pending set (drop-oldest)
+        self.client_dropped = 0  # messages dropped from per-client queues
+        self.evicted = 0
+        self.sent = 0
+
+    @property
+    def active_connections(self):
+        return self.clients.keys()
 
     async def start(self):
         if self._broadcast_task is None:
             self._broadcast_task = asyncio.create_task(self._broadcast_loop())
+            await self.backend.start(self._receive)
+
+    async def stop(self):
+        if self._broadcast_task is not None:
+            await self.backend.stop()
+            self._broadcast_task.cancel()
+        tasks = [self._broadcast_task] if self._broadcast_task is not None else []
+        self._broadcast_task = None
+        for websocket in list(self.clients):
+            client = self.clients.pop(websocket)
+            if client.task is not None:
+                client.task.cancel()
+                tasks.append(client.task)
+        tasks.extend(self._closing)
+        await asyncio.gather(*tasks, return_exceptions=True)
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.add(websocket)
+        client = _Client(websocket, self.client_queue)
+        client.task = asyncio.create_task(self._sender(client))
+        self.clients[websocket] = client
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.discard(websocket)
+        client = self.clients.pop(websocket, None)
+        if client is not None and client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
 
-    async def send_json(self, data):
+    async def sync(self, websocket: WebSocket, resume_from: int | None = None, epoch: str | None = None):
+        """Bring a client up to date, then mark it live for broadcasts.
+
+        Replays only when ``epoch`` matches this run; a missing or different epoch means a snapshot.
+        """
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        client.live = False
+        if resume_from is not None and epoch == self.epoch and self._can_resume(resume_from):
+            self.replays += 1
+            self._replay(client, resume_from)
+        else:
+            seq, slots = await self._snapshot()
+            if self.clients.get(websocket) is not client:
+                return
+            if not self._can_resume(seq):
+                # the buffer rolled over while the snapshot was loading; take a fresh one
+                seq, slots = await self._snapshot(fresh=True)
+                if self.clients.get(websocket) is not client:
+                    return
+            self.snapshots += 1
+            frame = {
+                "event": "snapshot",
+                "epoch": self.epoch,
+                "seq": seq,
+                "slots": [s for s in slots if client.subscription.matches(s)],
+            }
+            self._enqueue(client, json.dumps(frame, default=str))
+            self._replay(client, seq)
+        # no await between the replay above and going live, so nothing is missed or duplicated
+        client.live = True
+
+    def _can_resume(self, after: int) -> bool:
+        if after > self.seq:
+            return False
+        if after == self.seq:
+            return True
+        return bool(self.history) and self.history[0]["seq"] <= after + 1
+
+    def _replay(self, client: _Client, after: int):
+        latest: dict = {}
+        for event in self.history:
+            if event["seq"] > after and client.subscription.matches(event):
+                latest[event.get("slot_id") or event["seq"]] = event
+        if latest:
+            updates = sorted(latest.values(), key=lambda e: e["seq"])
+            frame = {"event": "slot_updates", "epoch": self.epoch, "seq": self.seq, "updates": updates}
+            self._enqueue(client, json.dumps(frame, default=str))
+
+    async def _snapshot(self, fresh: bool = False) -> tuple[int, list[dict]]:
+        # concurrent (re)connects share one in-flight snapshot load
+        if self._snapshot_inflight is None or fresh:
+            self._snapshot_inflight = asyncio.ensure_future(self._load_snapshot())
+        inflight = self._snapshot_inflight
         try:
-            self.queue.put_nowait(data)
+            return await asyncio.shield(inflight)
+        finally:
+            if self._snapshot_inflight is inflight and inflight.done():
+                self._snapshot_inflight = None
+
+    async def _load_snapshot(self) -> tuple[int, list[dict]]:
+        # record the sequence first: every delta up to it is already committed and so in the snapshot
+        seq = self.seq
+        slots = await self.snapshot_provider() if self.snapshot_provider else []
+        return seq, slots
+
+    def subscribe(self, websocket: WebSocket, floors=(), zones=(), slots=()) -> Subscription:
+        subscription = Subscription(floors, zones, slots)
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.subscription = _ALL if subscription.is_empty else subscription
+        return subscription
+
+    def send_to(self, websocket: WebSocket, data) -> bool:
+        """Queue a message for a single client (acks, errors); False if it is gone or full."""
+        client = self.clients.get(websocket)
+        if client is None:
+            return False
+        try:
+            client.queue.put_nowait(json.dumps(data, default=str))
         except asyncio.QueueFull:
-            # drop oldest to avoid blocking
-            _ = self.queue.get_nowait()
-            self.queue.put_nowait(data)
+            return False
+        return True
+
+    async def send_json(self, data):
+        await self.backend.publish(data)
+
+    async def send_many(self, events: list[dict]):
+        """Publish a batch of events as a single backend message."""
+        if events:
+            await self.backend.publish({"event": "batch", "events": events})
+
+    def _receive(self, data):
+        # events from every worker (or just this one, in-process) are merged into the pending set here
+        events = data["events"] if data.get("event") == "batch" else [data]
+        for event in events:
+            slot_id = event.get("slot_id")
+            if slot_id is not None:
+                # re-insert so the flush order follows the latest update
+                self.pending.pop(slot_id, None)
+                self.pending[slot_id] = event
+                continue
+            if self._other_events >= self.max_queue:
+                oldest = next(key for key in self.pending if isinstance(key, int))
+                del self.pending[oldest]
+                self._other_events -= 1
+                self.dropped += 1
+            self._other_key += 1
+            self.pending[self._other_key] = event
+            self._other_events += 1
+        self._wake.set()
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.clients),
+            "queue_depth": len(self.pending),
+            "dropped": self.dropped,
+            "client_dropped": self.client_dropped,
+            "evicted": self.evicted,
+            "sent": self.sent,
+            "seq": self.seq,
+            "snapshots": self.snapshots,
+            "replays": self.replays,
+            **{f"backend_{k}": v for k, v in self.backend.stats().items()},
+        }
 
     async def _broadcast_loop(self):
         while True:
-            data = await self.queue.get()
-            stale = []
-            for conn in list(self.active_connections):
-                try:
-                    await conn.send_json(data)
-                except Exception:
-                    stale.append(conn)
-            for conn in stale:
-                self.disconnect(conn)
+            await self._wake.wait()
+            if self.batch_window > 0:
+                await asyncio.sleep(self.batch_window)
+            self._wake.clear()
+            pending, self.pending, self._other_events = self.pending, {}, 0
+            if pending:
+                self._fan_out(list(pending.values()))
+
+    def _fan_out(self, events: list[dict]):
+        sequenced = []
+        for event in events:
+            self.seq += 1
+            event = {**event, "seq": self.seq}
+            self.history.append(event)
+            sequenced.append(event)
+
+        frames: dict[tuple, str | None] = {}
+        for client in list(self.clients.values()):
+            if not client.live:
+                continue
+            key = client.subscription.key
+            if key not in frames:
+                matching = [e for e in sequenced if client.subscription.matches(e)]
+                frames[key] = (
+                    json.dumps(
+                        {"event": "slot_updates", "epoch": self.epoch, "seq": self.seq, "updates": matching},
+                        default=str,
+                    )
+                    if matching
+                    else None
+                )
+            if frames[key] is not None:
+                self._enqueue(client, frames[key])
+
+    def _enqueue(self, client: _Client, message: str):
+        try:
+            client.queue.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            pass
+        now = time.monotonic()
+        if client.behind_since is None:
+            client.behind_since = now
+        elif now - client.behind_since > self.slow_client_seconds:
+            self._evict(client)
+            return
+        _ = client.queue.get_nowait()
+        self.client_dropped += 1
+        client.queue.put_nowait(message)
+
+    def _evict(self, client: _Client):
+        self.evicted += 1
+        self.disconnect(client.websocket)
+        task = asyncio.create_task(self._close(client.websocket, code=1013))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            # usually the socket is already gone, which is why the client fell behind
+            logger.debug("Closing an evicted WebSocket failed", exc_info=True)
+
+    async def _sender(self, client: _Client):
+        try:
+            while True:
+                message = await client.queue.get()
+                await client.websocket.send_text(message)
+                self.sent += 1
+                if client.queue.empty():
+                    client.behind_since = None
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.disconnect(client.websocket)
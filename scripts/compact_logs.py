@@ -0,0 +1,44 @@
+"""Compact old sensor logs into hourly rollups and prune the raw rows.
+
+The analytics rollup is refreshed first, so no raw log is pruned before it is counted there.
+"""
+
+import argparse
+import time
+from datetime import timedelta
+
+from app.analytics import refresh_occupancy_rollup
+from app.database import engine, get_session
+from app.config import get_settings
+from app.retention import compact_sensor_logs
+from app.schema import upgrade_schema
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Roll up and prune raw sensor_logs")
+    # the occupancy model trains on raw readings, so keep them for its whole window by default
+    parser.add_argument(
+        "--older-than-hours",
+        type=int,
+        default=max(settings.log_raw_retention_hours, settings.model_training_days * 24),
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.log_compaction_batch_size)
+    parser.add_argument("--max-batches", type=int, default=None, help="stop after this many batches")
+    args = parser.parse_args()
+
+    upgrade_schema(engine)
+    start = time.perf_counter()
+    with get_session() as session:
+        refresh_occupancy_rollup(session)
+        removed = compact_sensor_logs(
+            session,
+            older_than=timedelta(hours=args.older_than_hours),
+            batch_size=args.batch_size,
+            max_batches=args.max_batches,
+        )
+    print(f"Compacted {removed} raw rows in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Mixed read/write database benchmark for comparing DATABASE_PROFILE settings.
+
+Writer threads commit one sensor reading at a time (as /api/iot/slot-update does)
+while reader threads run the map query on the read-only sessions:
+
+    DATABASE_URL=sqlite:///bench.db DATABASE_PROFILE=default PYTHONPATH=. python scripts/db_benchmark.py
+    DATABASE_URL=sqlite:///bench.db DATABASE_PROFILE=tuned PYTHONPATH=. python scripts/db_benchmark.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+
+from app import crud
+from app.config import get_settings
+from app.database import engine, get_read_session, get_session
+from app.models import ParkingSlot, SlotStatus
+from app.schema import upgrade_schema
+
+
+def prepare(slots: int):
+    upgrade_schema(engine)
+    with get_session() as session:
+        crud.clear_all(session)
+        session.execute(
+            insert(ParkingSlot),
+            [
+                {
+                    "slot_id": f"DB-{i:05d}",
+                    "floor": f"B{i % 4 + 1}",
+                    "zone": "ABCD"[i // 4 % 4],
+                    "distance_from_entry": 10 + i % 90,
+                    "current_status": SlotStatus.available.value,
+                    "last_updated": datetime.utcnow(),
+                }
+                for i in range(slots)
+            ],
+        )
+        session.commit()
+
+
+def writer(slots: int, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            with get_session() as session:
+                crud.log_sensor_update(
+                    session, f"DB-{random.randrange(slots):05d}", random.randint(0, 1), datetime.utcnow()
+                )
+                session.commit()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors.append(1)
+
+
+def reader(deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            with get_read_session() as session:
+                crud.get_map_with_predictions(session, floor=f"B{random.randint(1, 4)}")
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors.append(1)
+
+
+def summarize(latencies: list, errors: list, duration: float) -> dict:
+    values = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) if len(values) else (0.0, 0.0, 0.0)
+    return {
+        "ops_per_s": round(len(values) / duration, 1),
+        "errors": len(errors),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed read/write benchmark against DATABASE_URL")
+    parser.add_argument("--slots", type=int, default=2000)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args()
+
+    prepare(args.slots)
+    deadline = time.perf_counter() + args.duration
+    writes, write_errors, reads, read_errors = [], [], [], []
+    threads = [
+        threading.Thread(target=writer, args=(args.slots, deadline, writes, write_errors)) for _ in range(args.writers)
+    ]
+    threads += [threading.Thread(target=reader, args=(deadline, reads, read_errors)) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(
+        json.dumps(
+            {
+                "profile": get_settings().database_profile,
+                "write": summarize(writes, write_errors, args.duration),
+                "read": summarize(reads, read_errors, args.duration),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
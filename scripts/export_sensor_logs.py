@@ -0,0 +1,90 @@
+"""Export raw sensor logs as NDJSON or CSV with flat memory use.
+
+    PYTHONPATH=. python scripts/export_sensor_logs.py --from 2026-01-01 --to 2026-02-01 --floor B1 -o b1.ndjson
+    PYTHONPATH=. python scripts/export_sensor_logs.py --from 2026-01-01 --to 2026-02-01 --floor B1 -o b1.ndjson --resume
+
+--resume reads the (timestamp, id) of the last complete row in the output file
+and appends everything after it, so an interrupted export can be continued.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from app.config import get_settings
+from app.database import get_read_session
+from app.export import format_cursor, parse_cursor, sensor_log_export_stmt, stream_sensor_logs
+
+
+def last_cursor(path: str, fmt: str) -> str | None:
+    """Cursor of the last complete line of an earlier export, dropping a partial trailing line."""
+    with open(path, "rb+") as handle:
+        handle.seek(0, os.SEEK_END)
+        size = handle.tell()
+        tail_start = max(0, size - 64 * 1024)
+        handle.seek(tail_start)
+        tail = handle.read()
+        complete = tail[: tail.rfind(b"\n") + 1]
+        handle.truncate(tail_start + len(complete))
+    lines = complete.decode().splitlines()
+    if not lines or (fmt == "csv" and lines[-1].startswith("id,")):
+        return None
+    if fmt == "csv":
+        log_id, _, timestamp, _ = next(csv.reader([lines[-1]]))
+        return format_cursor(datetime.fromisoformat(timestamp), int(log_id))
+    row = json.loads(lines[-1])
+    return format_cursor(datetime.fromisoformat(row["timestamp"]), row["id"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream sensor_logs to NDJSON/CSV")
+    parser.add_argument("--from", dest="start", type=datetime.fromisoformat, default=None, help="range start (UTC)")
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat, default=None, help="range end (UTC, exclusive)")
+    parser.add_argument("--slot", action="append", default=[], help="slot id; repeat or comma-separate")
+    parser.add_argument("--floor", default=None)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--after", default=None, help="resume after '<timestamp>,<id>'")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=get_settings().export_batch_size)
+    parser.add_argument("-o", "--output", default=None, help="file to write (default: stdout)")
+    parser.add_argument("--resume", action="store_true", help="continue after the last row already in --output")
+    args = parser.parse_args()
+
+    if args.resume and not args.output:
+        parser.error("--resume needs --output")
+    after = args.after
+    resuming = args.resume and os.path.exists(args.output)
+    if resuming:
+        after = last_cursor(args.output, args.format) or after
+        # a file cut inside the CSV header is empty again and gets a fresh header
+        resuming = os.path.getsize(args.output) > 0
+
+    stmt = sensor_log_export_stmt(
+        start=args.start,
+        end=args.end,
+        slot_ids=[slot for value in args.slot for slot in value.split(",") if slot],
+        floor=args.floor,
+        after=parse_cursor(after) if after else None,
+        limit=args.limit,
+    )
+    chunks = stream_sensor_logs(get_read_session, stmt, args.format, args.batch_size, header=not resuming)
+    out = open(args.output, "ab" if resuming else "wb") if args.output else sys.stdout.buffer
+    start = time.perf_counter()
+    written = 0
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    resumed = f" (resumed after {after})" if resuming and after else ""
+    print(f"Wrote {written / 2**20:.1f} MiB in {time.perf_counter() - start:.1f}s{resumed}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
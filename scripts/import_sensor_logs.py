@@ -0,0 +1,188 @@
+"""Stream historical sensor CSVs (timestamp,slot_id,status) into sensor_logs."""
+
+import argparse
+import io
+import time
+from datetime import timedelta
+
+import pandas as pd
+from sqlalchemy import bindparam, insert, select, update
+
+from app import crud
+from app.analytics import backfill_occupancy_rollup
+from app.database import engine, get_session
+from app.models import ParkingSlot, SensorLog, SlotStatus
+from app.schema import upgrade_schema
+
+_PG_STAGING = "sensor_logs_import"
+
+
+def read_chunks(path: str, chunk_size: int):
+    """Yield cleaned DataFrames of at most ``chunk_size`` rows; memory stays bounded by the chunk."""
+    reader = pd.read_csv(
+        path,
+        usecols=["timestamp", "slot_id", "status"],
+        dtype={"slot_id": "string", "status": "Int64", "timestamp": "string"},
+        chunksize=chunk_size,
+    )
+    for chunk in reader:
+        # timestamps may carry an offset (e.g. trailing Z); the database stores naive UTC
+        chunk["timestamp"] = pd.to_datetime(chunk["timestamp"], utc=True, errors="coerce").dt.tz_localize(None)
+        chunk = chunk.dropna(subset=["timestamp", "slot_id", "status"])
+        chunk = chunk[chunk["status"].isin([0, 1])]
+        chunk = chunk.drop_duplicates(subset=["slot_id", "timestamp"], keep="last")
+        yield chunk.astype({"status": "int64", "slot_id": "object"})
+
+
+def create_missing_slots(session, known: set, newest: dict, floor: str, distance: int) -> int:
+    """Insert every slot of ``newest`` (slot_id -> (timestamp, status)) not seen yet, in one statement."""
+    missing = sorted(set(newest) - known)
+    if not missing:
+        return 0
+    stmt = crud.dialect_insert(session, ParkingSlot).on_conflict_do_nothing(index_elements=[ParkingSlot.slot_id])
+    session.execute(
+        stmt,
+        [
+            {
+                "slot_id": slot_id,
+                "floor": floor,
+                "zone": None,
+                "distance_from_entry": distance,
+                "current_status": SlotStatus.occupied.value if newest[slot_id][1] == 1 else SlotStatus.available.value,
+                "last_updated": newest[slot_id][0],
+            }
+            for slot_id in missing
+        ],
+    )
+    known.update(missing)
+    return len(missing)
+
+
+def insert_chunk_generic(session, chunk: pd.DataFrame) -> int:
+    """Drop rows already in sensor_logs (same slot_id + timestamp), then executemany the rest."""
+    existing = session.execute(
+        select(SensorLog.slot_id, SensorLog.timestamp).where(
+            SensorLog.slot_id.in_(chunk["slot_id"].unique().tolist()),
+            SensorLog.timestamp >= chunk["timestamp"].min().to_pydatetime(),
+            SensorLog.timestamp <= chunk["timestamp"].max().to_pydatetime(),
+        )
+    ).all()
+    if existing:
+        seen = pd.MultiIndex.from_tuples(existing, names=["slot_id", "timestamp"])
+        keys = pd.MultiIndex.from_frame(chunk[["slot_id", "timestamp"]])
+        chunk = chunk[~keys.isin(seen)]
+    if chunk.empty:
+        return 0
+    rows = [
+        {"slot_id": slot_id, "timestamp": ts.to_pydatetime(), "status": status}
+        for slot_id, ts, status in chunk[["slot_id", "timestamp", "status"]].itertuples(index=False)
+    ]
+    session.execute(insert(SensorLog), rows)
+    return len(rows)
+
+
+def insert_chunk_postgres(session, chunk: pd.DataFrame) -> int:
+    """COPY the chunk into a temp staging table and insert the rows not already present."""
+    cursor = session.connection().connection.dbapi_connection.cursor()
+    cursor.execute(
+        f"CREATE TEMP TABLE IF NOT EXISTS {_PG_STAGING} "
+        "(slot_id text, timestamp timestamp, status integer) ON COMMIT DELETE ROWS"
+    )
+    buffer = io.StringIO()
+    chunk[["slot_id", "timestamp", "status"]].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {_PG_STAGING} (slot_id, timestamp, status) FROM STDIN WITH (FORMAT csv)", buffer)
+    cursor.execute(
+        f"INSERT INTO sensor_logs (slot_id, timestamp, status) "
+        f"SELECT i.slot_id, i.timestamp, i.status FROM {_PG_STAGING} i "
+        "WHERE NOT EXISTS (SELECT 1 FROM sensor_logs s WHERE s.slot_id = i.slot_id AND s.timestamp = i.timestamp)"
+    )
+    return cursor.rowcount
+
+
+def refresh_slot_status(session, latest: dict):
+    """Move current_status forward for slots whose newest imported reading beats last_updated."""
+    if not latest:
+        return
+    stmt = (
+        update(ParkingSlot)
+        .where(ParkingSlot.slot_id == bindparam("b_slot_id"))
+        .where(ParkingSlot.last_updated < bindparam("b_timestamp"))
+        .values(current_status=bindparam("b_status"), last_updated=bindparam("b_timestamp"))
+    )
+    session.connection().execute(
+        stmt,
+        [
+            {
+                "b_slot_id": slot_id,
+                "b_timestamp": ts,
+                "b_status": SlotStatus.occupied.value if status == 1 else SlotStatus.available.value,
+            }
+            for slot_id, (ts, status) in latest.items()
+        ],
+    )
+
+
+def run(paths, chunk_size: int, floor: str, distance: int, use_copy: bool):
+    upgrade_schema(engine)
+    total_read = total_inserted = slots_created = 0
+    latest: dict = {}
+    span = None  # (oldest, newest) timestamp read, for the analytics backfill
+    start = time.perf_counter()
+    with get_session() as session:
+        postgres = use_copy and session.get_bind().dialect.driver == "psycopg2"
+        insert_chunk = insert_chunk_postgres if postgres else insert_chunk_generic
+        known = set(session.scalars(select(ParkingSlot.slot_id)))
+        for path in paths:
+            for chunk in read_chunks(path, chunk_size):
+                if chunk.empty:
+                    continue
+                newest_rows = chunk.sort_values("timestamp").drop_duplicates("slot_id", keep="last")
+                newest = {
+                    slot_id: (ts.to_pydatetime(), int(status))
+                    for slot_id, ts, status in newest_rows[["slot_id", "timestamp", "status"]].itertuples(index=False)
+                }
+                slots_created += create_missing_slots(session, known, newest, floor, distance)
+                inserted = insert_chunk(session, chunk)
+                session.commit()
+
+                for slot_id, (ts, status) in newest.items():
+                    if slot_id not in latest or ts > latest[slot_id][0]:
+                        latest[slot_id] = (ts, status)
+                oldest, newest_ts = chunk["timestamp"].min().to_pydatetime(), chunk["timestamp"].max().to_pydatetime()
+                span = (min(span[0], oldest), max(span[1], newest_ts)) if span else (oldest, newest_ts)
+
+                total_read += len(chunk)
+                total_inserted += inserted
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{path}: read={total_read} inserted={total_inserted} "
+                    f"duplicates={total_read - total_inserted} rows/s={total_read / elapsed:,.0f}"
+                )
+        refresh_slot_status(session, latest)
+        session.commit()
+        if total_inserted and span:
+            # history older than the rollup refresh's lookback would never reach /api/analytics otherwise
+            rolled = backfill_occupancy_rollup(session, span[0], span[1] + timedelta(microseconds=1))
+            print(f"Analytics rollup: rebuilt {rolled} 15-minute rows for {span[0]} .. {span[1]}")
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Done: {total_inserted} inserted, {total_read - total_inserted} duplicates skipped, "
+        f"{slots_created} slots created in {elapsed:.1f}s ({total_read / max(elapsed, 1e-9):,.0f} rows/s)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import sensor CSV files (timestamp,slot_id,status)")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--default-floor", default="B1", help="floor for slots created by the import")
+    parser.add_argument("--default-distance", type=int, default=30)
+    parser.add_argument("--no-copy", action="store_true", help="use INSERT even on PostgreSQL")
+    args = parser.parse_args()
+    run(args.paths, args.chunk_size, args.default_floor, args.default_distance, use_copy=not args.no_copy)
+
+
+if __name__ == "__main__":
+    main()
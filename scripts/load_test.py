@@ -0,0 +1,340 @@
+"""Local load test: devices posting readings, dashboards on /ws/slots and readers on the REST API.
+
+Starts the app with uvicorn against a throw-away SQLite database (or --database-url),
+drives it for --duration seconds and writes throughput and latency percentiles as
+JSON so runs can be diffed between releases:
+
+    PYTHONPATH=. python scripts/load_test.py --devices 500 --ws-clients 100 -o bench/current.json
+    PYTHONPATH=. python scripts/load_test.py --compare bench/baseline.json -o bench/current.json
+
+With --workers N --broadcast redis it also checks that every dashboard sees every
+update, whichever worker took the post (--fake-redis starts a local stand-in and
+needs the fakeredis package).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+import numpy as np
+from sqlalchemy import create_engine, insert
+from tabulate import tabulate
+from websockets.asyncio.client import connect as ws_connect
+
+from app.models import IoTDevice, ParkingSlot, SlotStatus
+from app.schema import upgrade_schema
+from app.utils import generate_api_key
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def prepare_database(url: str, devices: int, floors: int) -> list[tuple[str, str]]:
+    """Create ``devices`` slots spread over floors/zones, one device each; returns (slot_id, api_key)."""
+    engine = create_engine(url)
+    upgrade_schema(engine)
+    now = datetime.utcnow()
+    slots, keys = [], []
+    for i in range(devices):
+        slot_id = f"LT-{i:05d}"
+        slots.append(
+            {
+                "slot_id": slot_id,
+                "floor": f"B{i % floors + 1}",
+                "zone": "ABCD"[i // floors % 4],
+                "distance_from_entry": 10 + i % 90,
+                "current_status": SlotStatus.available.value,
+                "last_updated": now,
+            }
+        )
+        keys.append((slot_id, generate_api_key()))
+    with engine.begin() as conn:
+        conn.execute(insert(ParkingSlot), slots)
+        conn.execute(
+            insert(IoTDevice),
+            [{"slot_id": slot_id, "api_key": key, "is_active": True} for slot_id, key in keys],
+        )
+    engine.dispose()
+    return keys
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(url: str, port: int, workers: int, env_overrides: dict) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_URL": url, "PYTHONPATH": str(ROOT), **env_overrides}
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+
+
+def start_fake_redis() -> str:
+    """Serve fakeredis over TCP from a background thread; returns its URL."""
+    from fakeredis import TcpFakeServer
+
+    port = free_port()
+    server = TcpFakeServer(("127.0.0.1", port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0"
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 120.0) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("server did not become ready")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.accepted: set[tuple[str, str]] = set()  # (slot_id, timestamp) of readings the API took
+        self.seen: list[set[tuple[str, str]]] = []  # per dashboard, readings it received
+
+    def ok(self, name: str, seconds: float):
+        self.latencies.setdefault(name, []).append(seconds * 1000)
+
+    def error(self, name: str):
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def delivery(self) -> dict:
+        """Share of accepted readings each dashboard received (the batch window can merge a slot's rapid updates)."""
+        if not self.accepted or not self.seen:
+            return {}
+        ratios = [len(seen & self.accepted) / len(self.accepted) for seen in self.seen]
+        return {"min": round(min(ratios), 4), "mean": round(sum(ratios) / len(ratios), 4)}
+
+    def summary(self, duration: float) -> dict:
+        result = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            values = np.asarray(self.latencies.get(name, []))
+            p50, p95, p99 = np.percentile(values, [50, 95, 99]) if len(values) else (0.0, 0.0, 0.0)
+            result[name] = {
+                "count": int(len(values)),
+                "errors": self.errors.get(name, 0),
+                "throughput_per_s": round(len(values) / duration, 2),
+                "p50_ms": round(float(p50), 2),
+                "p95_ms": round(float(p95), 2),
+                "p99_ms": round(float(p99), 2),
+                "max_ms": round(float(values.max()), 2) if len(values) else 0.0,
+            }
+        return result
+
+
+async def device_loop(client, slot_id, api_key, rate, deadline, recorder):
+    # open loop: the next reading is due 1/rate after the previous one was due, however long the request took
+    interval = 1.0 / rate
+    due = time.perf_counter() + random.uniform(0, interval)
+    status = 0
+    while True:
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        if time.perf_counter() >= deadline:
+            return
+        status ^= 1
+        body = {"slot_id": slot_id, "status": status, "timestamp": datetime.utcnow().isoformat()}
+        start = time.perf_counter()
+        try:
+            response = await client.post("/api/iot/slot-update", json=body, headers={"X-API-Key": api_key})
+            if response.status_code in (200, 202):
+                recorder.ok("slot_update", time.perf_counter() - start)
+                recorder.accepted.add((slot_id, body["timestamp"]))
+            else:
+                recorder.error("slot_update")
+        except httpx.HTTPError:
+            recorder.error("slot_update")
+        due += interval
+
+
+async def reader_loop(client, floors, deadline, recorder):
+    while time.perf_counter() < deadline:
+        for name, path in (
+            ("parking_map", f"/api/parking/map?floor=B{random.randint(1, floors)}"),
+            ("recommendation", "/api/parking/recommendation?top_k=5"),
+        ):
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code == 200:
+                    recorder.ok(name, time.perf_counter() - start)
+                else:
+                    recorder.error(name)
+            except httpx.HTTPError:
+                recorder.error(name)
+
+
+async def ws_client(base_ws: str, deadline, recorder, ready: asyncio.Event):
+    seen: set[tuple[str, str]] = set()
+    recorder.seen.append(seen)
+    try:
+        async with ws_connect(f"{base_ws}/ws/slots", max_size=None, open_timeout=30) as ws:
+            first = json.loads(await ws.recv())
+            if first.get("event") == "snapshot":
+                ready.set()
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return
+                try:
+                    frame = json.loads(await asyncio.wait_for(ws.recv(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    return
+                if frame.get("event") != "slot_updates":
+                    continue
+                received = datetime.utcnow()
+                for update in frame["updates"]:
+                    # the reading's timestamp is set by the device just before it posts
+                    sent = datetime.fromisoformat(update["timestamp"])
+                    recorder.ok("sensor_to_ws", (received - sent).total_seconds())
+                    seen.add((update["slot_id"], update["timestamp"]))
+    except Exception:
+        recorder.error("sensor_to_ws")
+
+
+async def drive(args, base_url: str, keys) -> dict:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        startup_seconds = await wait_ready(client)
+        base_ws = base_url.replace("http://", "ws://")
+        connect_deadline = time.perf_counter() + 3600
+        connected = [asyncio.Event() for _ in range(args.ws_clients)]
+        ws_tasks = [
+            asyncio.create_task(ws_client(base_ws, connect_deadline, recorder, event)) for event in connected
+        ]
+        await asyncio.wait_for(asyncio.gather(*(e.wait() for e in connected)), timeout=120)
+
+        start = time.perf_counter()
+        deadline = start + args.duration
+        tasks = [
+            asyncio.create_task(device_loop(client, slot_id, key, args.rate, deadline, recorder))
+            for slot_id, key in keys
+        ]
+        tasks += [
+            asyncio.create_task(reader_loop(client, args.floors, deadline, recorder)) for _ in range(args.readers)
+        ]
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        # let the last broadcast window drain before the dashboards hang up
+        await asyncio.sleep(1.0)
+        for task in ws_tasks:
+            task.cancel()
+        await asyncio.gather(*ws_tasks, return_exceptions=True)
+        ws_stats = (await client.get("/api/ws/stats")).json()
+
+    return {
+        "startup_s": round(startup_seconds, 2),
+        "elapsed_s": round(elapsed, 2),
+        "metrics": recorder.summary(elapsed),
+        "ws_delivery": recorder.delivery(),
+        # with several workers this is whichever worker answered
+        "ws_stats": ws_stats,
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result: dict, baseline: dict | None):
+    headers = ["metric", "count", "errors", "per_s", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+    rows = []
+    for name, m in result["metrics"].items():
+        row = [name, m["count"], m["errors"], m["throughput_per_s"], m["p50_ms"], m["p95_ms"], m["p99_ms"], m["max_ms"]]
+        base = (baseline or {}).get("metrics", {}).get(name)
+        if base:
+            for i, key in enumerate(["throughput_per_s", "p50_ms", "p95_ms", "p99_ms"], start=3):
+                if base[key]:
+                    row[i] = f"{m[key]} ({(m[key] - base[key]) / base[key]:+.0%})"
+        rows.append(row)
+    print(tabulate(rows, headers=headers))
+    print(f"startup {result['startup_s']}s, ws delivery: {result['ws_delivery']}, ws stats: {result['ws_stats']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API and WebSocket paths against a local server")
+    parser.add_argument("--devices", type=int, default=500, help="simulated devices, one slot each")
+    parser.add_argument("--rate", type=float, default=0.2, help="readings per second per device")
+    parser.add_argument("--ws-clients", type=int, default=100, help="dashboards listening on /ws/slots")
+    parser.add_argument("--readers", type=int, default=5, help="clients looping over map + recommendation")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--floors", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=200, help="max open HTTP connections")
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    parser.add_argument("--write-behind", action="store_true", help="run the server with INGEST_WRITE_BEHIND=1")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--broadcast", choices=["memory", "redis"], default="memory")
+    parser.add_argument("--redis-url", default=None, help="for --broadcast redis")
+    parser.add_argument("--fake-redis", action="store_true", help="use a local fakeredis server for --broadcast redis")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default=None, help="write results as JSON here")
+    parser.add_argument("--compare", default=None, help="baseline JSON to report deltas against")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    tmpdir = None
+    url = args.database_url
+    if url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{tmpdir.name}/load_test.db"
+    keys = prepare_database(url, args.devices, args.floors)
+
+    port = free_port()
+    env = {"INGEST_WRITE_BEHIND": "1"} if args.write_behind else {}
+    if args.broadcast == "redis":
+        redis_url = start_fake_redis() if args.fake_redis else args.redis_url
+        env.update(BROADCAST_BACKEND="redis", **({"BROADCAST_REDIS_URL": redis_url} if redis_url else {}))
+    server = start_server(url, port, args.workers, env)
+    try:
+        run = asyncio.run(drive(args, f"http://127.0.0.1:{port}", keys))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "compare", "database_url", "redis_url")}
+    config["database"] = url.split(":", 1)[0] if args.database_url else "sqlite (temporary)"
+    result = {
+        "config": config,
+        "environment": {"git": git_revision(), "python": platform.python_version(), "platform": platform.platform()},
+        **run,
+    }
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(result, baseline)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(result, indent=2, sort_keys=True) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Schema and demo-data commands, run before (not during) app startup."""
+
+import argparse
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from app import crud
+from app.ai import generate_predictions
+from app.analytics import backfill_occupancy_rollup, refresh_occupancy_rollup
+from app.config import get_settings
+from app.database import engine, get_session
+from app.models import SensorLog
+from app.schema import upgrade_schema
+from app.seed import bootstrap_demo
+
+
+def cmd_upgrade(args):
+    upgrade_schema(engine)
+    print("Schema is up to date")
+
+
+def cmd_seed_demo(args):
+    upgrade_schema(engine)
+    with get_session() as session:
+        seeded, devices = bootstrap_demo(session)
+        print("Seeded demo slots" if seeded else "Slots already present, demo seed skipped")
+        print("Created", devices, "devices")
+
+
+def cmd_devices(args):
+    with get_session() as session:
+        created = crud.create_missing_devices(session)
+        session.commit()
+        print("Created", created, "devices")
+
+
+def cmd_predict(args):
+    with get_session() as session:
+        generate_predictions(session, valid_minutes=get_settings().prediction_valid_minutes)
+        print("Predictions refreshed")
+
+
+def cmd_rollup(args):
+    with get_session() as session:
+        if args.start or args.end:
+            # a range backfill, e.g. after importing history older than the refresh lookback
+            start = args.start or session.scalar(select(func.min(SensorLog.timestamp)))
+            end = args.end or datetime.utcnow()
+            written = backfill_occupancy_rollup(session, start, end) if start is not None else 0
+        else:
+            written = refresh_occupancy_rollup(session)
+        print("Wrote", written, "analytics rollup rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the database schema and demo data")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    sub.add_parser("upgrade", help="create missing tables and indexes").set_defaults(func=cmd_upgrade)
+    sub.add_parser("seed-demo", help="seed demo slots/logs into an empty database").set_defaults(func=cmd_seed_demo)
+    sub.add_parser("devices", help="create a device for every slot without one").set_defaults(func=cmd_devices)
+    sub.add_parser("predict", help="run a full prediction sweep").set_defaults(func=cmd_predict)
+    rollup = sub.add_parser("rollup", help="refresh the floor/zone analytics rollup")
+    rollup.add_argument("--from", dest="start", type=datetime.fromisoformat, default=None, help="backfill from (UTC)")
+    rollup.add_argument("--to", dest="end", type=datetime.fromisoformat, default=None, help="backfill to (UTC, exclusive)")
+    rollup.set_defaults(func=cmd_rollup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,170 @@
-"""Regenerate predictions based on latest sensor logs."""
+"""Train the occupancy model and regenerate predictions based on latest sensor logs."""
 
-from app.database import get_session, Base, engine
-from app.ai import generate_predictions
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from app.database import get_session, engine
+from app.ai import generate_predictions, compute_occupancy_probabilities, _compute_future_occupancy_probability
 from app.config import get_settings
+from app.occupancy_model import (
+    build_training_frame,
+    check_training_window,
+    load_stored_model,
+    load_training_logs,
+    set_active_model,
+    store_model,
+    train_model,
+)
+from app.schema import upgrade_schema
 
 
-def run():
+def run(train: bool = True, days: int | None = None):
     settings = get_settings()
-    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
     with get_session() as session:
+        if train:
+            days = days or settings.model_training_days
+            since = datetime.utcnow() - timedelta(days=days)
+            logs = load_training_logs(session, since=since)
+            try:
+                check_training_window(logs, since)
+                model = train_model(logs)
+            except ValueError as exc:
+                print("Skipping training:", exc)
+            else:
+                path = store_model(session, model)
+                session.commit()
+                print("Trained", path, model.metrics)
+        set_active_model(load_stored_model(session))
         generate_predictions(session, valid_minutes=settings.prediction_valid_minutes)
     print("Predictions regenerated")
 
 
+class _Log:
+    __slots__ = ("timestamp", "status")
+
+    def __init__(self, timestamp: datetime, status: int):
+        self.timestamp = timestamp
+        self.status = status
+
+
+def benchmark(n_slots: int, n_logs: int, seed: int = 42):
+    """Compare the per-slot Python loop with the vectorized pass on synthetic history."""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    history = []
+    for _ in range(n_slots):
+        # newest first, spread over the last ~5 hours so both time windows are exercised
+        offsets = sorted(rng.randint(0, 5 * 3600) for _ in range(n_logs))
+        history.append([_Log(now - timedelta(seconds=o), int(rng.random() < 0.4)) for o in offsets])
+
+    start = time.perf_counter()
+    expected = [_compute_future_occupancy_probability(logs, now=now) for logs in history]
+    loop_seconds = time.perf_counter() - start
+
+    slot_index = np.repeat(np.arange(n_slots), [len(logs) for logs in history])
+    timestamps = np.array([log.timestamp for logs in history for log in logs], dtype="datetime64[us]")
+    statuses = np.array([log.status for logs in history for log in logs], dtype=np.int64)
+    start = time.perf_counter()
+    actual = compute_occupancy_probabilities(slot_index, timestamps, statuses, n_slots, now=now)
+    vector_seconds = time.perf_counter() - start
+
+    identical = np.array_equal(np.asarray(expected), actual)
+    print(f"slots={n_slots} logs/slot={n_logs} rows={len(statuses)}")
+    print(f"python loop: {loop_seconds * 1000:.1f} ms")
+    print(f"vectorized:  {vector_seconds * 1000:.1f} ms ({loop_seconds / vector_seconds:.1f}x)")
+    print(f"identical output: {identical}")
+
+
+def synthetic_logs(n_slots: int, days: int, interval_minutes: int = 30, seed: int = 42) -> pd.DataFrame:
+    """Readings with daily/weekly peaks, zone/distance effects and per-slot persistence."""
+    rng = np.random.default_rng(seed)
+    steps = days * 24 * 60 // interval_minutes
+    start = np.datetime64(datetime.utcnow() - timedelta(days=days), "m")
+    times = start + np.arange(steps) * np.timedelta64(interval_minutes, "m")
+    hours = (times.astype("datetime64[h]").astype(int) % 24).astype(float)
+    weekdays = (times.astype("datetime64[D]").astype(int) + 3) % 7  # 1970-01-01 was a Thursday
+    zones = np.array(list("ABCD"))[rng.integers(0, 4, n_slots)]
+    distance = rng.integers(5, 120, n_slots)
+
+    peak = np.exp(-((hours - 12.5) ** 2) / 6) + 0.8 * np.exp(-((hours - 19) ** 2) / 4)
+    base = 0.15 + 0.5 * peak + 0.15 * (weekdays >= 5)
+    slot_bias = 0.2 * (zones == "A") - 0.15 * (distance / 120)
+    p = np.clip(base[None, :] + slot_bias[:, None], 0.02, 0.98)
+    # persistence: keep the previous state with some probability
+    status = np.zeros((n_slots, steps), dtype=np.int8)
+    draws = rng.random((n_slots, steps))
+    keep = rng.random((n_slots, steps)) < 0.6
+    status[:, 0] = draws[:, 0] < p[:, 0]
+    for t in range(1, steps):
+        fresh = draws[:, t] < p[:, t]
+        status[:, t] = np.where(keep[:, t], status[:, t - 1], fresh)
+
+    return pd.DataFrame(
+        {
+            "slot_id": np.repeat([f"S-{i:05d}" for i in range(n_slots)], steps),
+            "timestamp": np.tile(times.astype("datetime64[ns]"), n_slots),
+            "status": status.ravel(),
+            "zone": np.repeat(zones, steps),
+            "distance_from_entry": np.repeat(distance, steps),
+        }
+    )
+
+
+def benchmark_model(n_slots: int, days: int):
+    """Time feature building, training and all-slots inference on a synthetic dataset."""
+    from app.ai import _model_probabilities
+
+    start = time.perf_counter()
+    logs = synthetic_logs(n_slots, days)
+    print(f"synthetic rows={len(logs)} ({n_slots} slots x {days} days) in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    build_training_frame(logs)
+    print(f"feature build: {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    model = train_model(logs)
+    print(f"train (incl. features): {time.perf_counter() - start:.2f}s metrics={model.metrics}")
+
+    class _Slot:
+        def __init__(self, slot_id, zone, distance):
+            self.slot_id, self.zone, self.distance_from_entry = slot_id, zone, distance
+
+    tail = logs.groupby("slot_id", sort=True).tail(200).iloc[::-1]
+    first = logs.drop_duplicates("slot_id").sort_values("slot_id")
+    slots = [_Slot(*row) for row in first[["slot_id", "zone", "distance_from_entry"]].itertuples(index=False)]
+    position = {slot.slot_id: i for i, slot in enumerate(slots)}
+    slot_index = tail["slot_id"].map(position).to_numpy()
+    timestamps = tail["timestamp"].to_numpy(dtype="datetime64[us]")
+    statuses = tail["status"].to_numpy(dtype=np.int64)
+    start = time.perf_counter()
+    proba = _model_probabilities(model, slots, slot_index, timestamps, statuses)
+    print(f"inference for {len(slots)} slots: {(time.perf_counter() - start) * 1000:.1f} ms (mean p={proba.mean():.3f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the occupancy model and regenerate predictions")
+    parser.add_argument("--no-train", action="store_true", help="only regenerate predictions with the latest model")
+    parser.add_argument("--days", type=int, default=None, help="training window in days")
+    parser.add_argument("--benchmark", action="store_true", help="benchmark the vectorized heuristic pass")
+    parser.add_argument("--benchmark-model", action="store_true", help="time training/inference on synthetic data")
+    parser.add_argument("--slots", type=int, default=10000)
+    parser.add_argument("--logs", type=int, default=200)
+    parser.add_argument("--synthetic-days", type=int, default=90)
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.slots, args.logs)
+    elif args.benchmark_model:
+        benchmark_model(args.slots, args.synthetic_days)
+    else:
+        run(train=not args.no_train, days=args.days)
+
+
 if __name__ == "__main__":
-    run()
+    main()
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+# settings are read once at import time, so the test environment has to be in place before app is imported
+_tmp = tempfile.mkdtemp(prefix="parksmart-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{_tmp}/test.db",
+    MODEL_DIR=os.path.join(_tmp, "models"),
+    # background loops would add their own statements to the counts below
+    ANALYTICS_ROLLUP_INTERVAL_SECONDS="0",
+    DEVICE_LAST_SEEN_FLUSH_SECONDS="3600",
+    DEVICE_INVALIDATION_POLL_SECONDS="0",
+    BROADCAST_BACKEND="memory",
+)
+
+from sqlalchemy import event, insert  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import crud  # noqa: E402
+from app import main  # noqa: E402
+from app.database import (  # noqa: E402
+    async_engine,
+    enable_sql_profiling,
+    engine,
+    get_session,
+    profile_sql,
+    read_engine,
+)
+from app.history import reading_history  # noqa: E402
+from app.models import IoTDevice, ParkingSlot, Prediction, SensorLog, SlotStatus  # noqa: E402
+from app.recommendation import recommendation_index  # noqa: E402
+from app.schema import upgrade_schema  # noqa: E402
+from app.slot_state import slot_state  # noqa: E402
+
+LOGS_PER_SLOT = 60
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    upgrade_schema(engine)
+
+
+def _reset_stores():
+    for store in (slot_state, recommendation_index, reading_history):
+        store.clear()
+        store.ready = False
+
+
+@pytest.fixture
+def seed_slots():
+    """Factory: replace the database contents with ``count`` slots, their logs, predictions and devices."""
+
+    def seed(count: int, logs_per_slot: int = LOGS_PER_SLOT) -> dict[str, str]:
+        now = datetime.utcnow().replace(microsecond=0)
+        with get_session() as session:
+            crud.clear_all(session)
+            session.query(IoTDevice).delete()
+            slot_ids = [f"T-{i:04d}" for i in range(count)]
+            session.execute(
+                insert(ParkingSlot),
+                [
+                    {
+                        "slot_id": slot_id,
+                        "floor": "B1" if i % 2 else "B2",
+                        "zone": "AB"[i % 2],
+                        "distance_from_entry": 10 + i,
+                        "current_status": SlotStatus.occupied.value if i % 3 == 0 else SlotStatus.available.value,
+                        "last_updated": now,
+                    }
+                    for i, slot_id in enumerate(slot_ids)
+                ],
+            )
+            session.execute(
+                insert(SensorLog),
+                [
+                    {"slot_id": slot_id, "status": (i + j) % 2, "timestamp": now - timedelta(minutes=5 * (logs_per_slot - j))}
+                    for i, slot_id in enumerate(slot_ids)
+                    for j in range(logs_per_slot)
+                ],
+            )
+            session.execute(
+                insert(Prediction),
+                [
+                    {
+                        "slot_id": slot_id,
+                        "predicted_status": SlotStatus.available.value,
+                        "confidence": 0.6,
+                        "valid_until": now + timedelta(minutes=10),
+                    }
+                    for slot_id in slot_ids[::2]
+                ],
+            )
+            crud.create_missing_devices(session)
+            session.commit()
+            keys = {device.slot_id: device.api_key for device in crud.list_devices(session)}
+        _reset_stores()
+        return keys
+
+    yield seed
+    _reset_stores()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """App client with warm-up disabled, so reads take the database paths unless a test loads the stores.
+
+    Every HTTP request runs inside ``profile_sql()``; ``client.sql_profiles``
+    collects one (route, SqlProfile) per request for ``query_budget``.
+    """
+    monkeypatch.setattr(main, "_warm_up", lambda: None)
+    for bind in (engine, read_engine, async_engine.sync_engine):
+        enable_sql_profiling(bind)
+    profiles = []
+
+    async def profiled_app(scope, receive, send):
+        if scope["type"] != "http":
+            await main.app(scope, receive, send)
+            return
+        # entered in the request's own task, so to_thread and run_sync work is recorded too
+        with profile_sql() as profile:
+            try:
+                await main.app(scope, receive, send)
+            finally:
+                profiles.append((f"{scope['method']} {scope['path']}", profile))
+
+    with TestClient(profiled_app) as test_client:
+        test_client.sql_profiles = profiles
+        yield test_client
+
+
+@pytest.fixture
+def query_budget(client):
+    """``with query_budget(n):`` fails the test if any request made inside runs more than ``n`` statements."""
+
+    @contextmanager
+    def budget(max_queries: int):
+        start = len(client.sql_profiles)
+        yield
+        over = [(route, profile) for route, profile in client.sql_profiles[start:] if profile.queries > max_queries]
+        if over:
+            lines = []
+            for route, profile in over:
+                lines.append(f"{route}: {profile.queries} queries (budget {max_queries})")
+                lines.extend(f"    {shape['count']}x {shape['statement'][:160]}" for shape in profile.repeated(2))
+            pytest.fail("\n".join(lines), pytrace=False)
+
+    return budget
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_queries():
+    """Context manager counting every statement sent on the app's engines, from any thread."""
+    engines = (engine, read_engine, async_engine.sync_engine)
+
+    @contextmanager
+    def counting():
+        counter = StatementCounter()
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            counter.statements.append(statement)
+
+        for bind in engines:
+            event.listen(bind, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield counter
+        finally:
+            for bind in engines:
+                event.remove(bind, "before_cursor_execute", before_cursor_execute)
+
+    return counting
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from app.database import get_session
+from app.main import manager
+from app.occupancy_model import load_training_logs, set_active_model, train_model
+
+MODEL_SECONDS = 1.0
+
+
+class SlowModel:
+    """The trained model, with inference stretched to what a large fleet costs."""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+
+    def predict_proba(self, frame):
+        self.calls += 1
+        time.sleep(MODEL_SECONDS)
+        return self.model.predict_proba(frame)
+
+
+@pytest.fixture
+def slow_model(seed_slots):
+    keys = seed_slots(300)
+    with get_session() as session:
+        model = SlowModel(train_model(load_training_logs(session)))
+    set_active_model(model)
+    yield model, keys
+    set_active_model(None)
+
+
+def test_broadcasts_are_not_delayed_by_ingest(client, slow_model):
+    model, keys = slow_model
+    updates = [{"slot_id": slot_id, "status": 1, "api_key": key} for slot_id, key in keys.items()]
+    headers = {"X-API-Key": updates[0]["api_key"]}
+    stop = threading.Event()
+    errors = []
+
+    def ingest():
+        status = 0
+        while not stop.is_set():
+            status ^= 1
+            batch = [{**update, "status": status} for update in updates]
+            response = client.post("/api/iot/slot-updates", headers=headers, json={"updates": batch})
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    probes = 10
+    sent: dict[int, float] = {}
+    latencies: dict[int, float] = {}
+    with client.websocket_connect("/ws/slots") as ws:
+        assert ws.receive_json()["event"] == "snapshot"
+        writers = [threading.Thread(target=ingest) for _ in range(3)]
+        for writer in writers:
+            writer.start()
+
+        def probe():
+            time.sleep(MODEL_SECONDS)
+            for n in range(probes):
+                sent[n] = time.perf_counter()
+                client.portal.call(manager.send_json, {"event": "probe", "n": n})
+                time.sleep(0.1)
+
+        prober = threading.Thread(target=probe)
+        prober.start()
+        try:
+            while len(latencies) < probes:
+                frame = ws.receive_json()
+                for event in frame.get("updates", []):
+                    if event.get("event") == "probe":
+                        latencies[event["n"]] = time.perf_counter() - sent[event["n"]]
+        finally:
+            stop.set()
+            prober.join()
+            for writer in writers:
+                writer.join()
+
+    assert not errors
+    assert model.calls >= 3
+    batch_window = manager.batch_window
+    # a prediction on the event loop would hold every probe sent meanwhile for up to MODEL_SECONDS
+    assert max(latencies.values()) < batch_window + MODEL_SECONDS / 2, latencies
@@ -0,0 +1,34 @@
+import pytest
+
+from app import main
+from app.config import Settings
+from app.history import reading_history
+from app.recommendation import recommendation_index
+
+
+@pytest.mark.parametrize("backend,expected", [("memory", True), ("redis", False)])
+def test_in_process_stores_default_off_with_several_workers(monkeypatch, backend, expected):
+    monkeypatch.setenv("BROADCAST_BACKEND", backend)
+    settings = Settings()
+    assert settings.slot_state_store is expected
+    assert settings.in_process_history is expected
+
+
+def test_in_process_stores_can_be_forced(monkeypatch):
+    monkeypatch.setenv("BROADCAST_BACKEND", "redis")
+    monkeypatch.setenv("IN_PROCESS_HISTORY", "true")
+    assert Settings().in_process_history is True
+
+
+def test_warm_up_skips_history_when_disabled(monkeypatch, seed_slots):
+    seed_slots(5)
+    monkeypatch.setattr(main.settings, "in_process_history", False)
+    main._warm_up()
+    assert main._warmup["status"] == "done"
+    assert not reading_history.ready
+    assert not recommendation_index.ready
+
+    monkeypatch.setattr(main.settings, "in_process_history", True)
+    main._warm_up()
+    assert reading_history.ready
+    assert recommendation_index.ready
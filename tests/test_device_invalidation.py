@@ -0,0 +1,57 @@
+from app import crud, main
+from app.database import get_session
+from app.device_cache import DeviceCache, device_cache
+
+
+def _post(client, slot_id, key):
+    return client.post("/api/iot/slot-update", headers={"X-API-Key": key}, json={"slot_id": slot_id, "status": 1})
+
+
+def _device_id(slot_id):
+    with get_session() as session:
+        return next(device.id for device in crud.list_devices(session) if device.slot_id == slot_id)
+
+
+def test_device_changes_from_another_process_reach_the_cache(client, seed_slots, monkeypatch):
+    keys = seed_slots(3)
+    slot_id, key = next(iter(keys.items()))
+    device_id = _device_id(slot_id)
+    main._start_device_invalidations()
+    assert _post(client, slot_id, key).status_code == 200
+    assert device_cache.get(key) is not None
+
+    # scripts/manage_devices.py runs in its own process, with its own cache
+    monkeypatch.setattr(crud, "device_cache", DeviceCache())
+    with get_session() as session:
+        crud.set_device_active(session, device_id, False)
+        session.commit()
+    assert _post(client, slot_id, key).status_code == 200  # still cached here
+
+    main._poll_device_invalidations()
+    assert _post(client, slot_id, key).status_code == 403
+
+    with get_session() as session:
+        crud.set_device_active(session, device_id, True)
+        new_key = crud.regenerate_api_key(session, device_id).api_key
+        session.commit()
+    main._poll_device_invalidations()
+    assert _post(client, slot_id, key).status_code == 401
+    assert _post(client, slot_id, new_key).status_code == 200
+
+
+def test_in_process_invalidation_waits_for_commit(client, seed_slots):
+    keys = seed_slots(3)
+    slot_id, key = next(iter(keys.items()))
+    assert _post(client, slot_id, key).status_code == 200
+
+    with get_session() as session:
+        crud.set_device_active(session, _device_id(slot_id), False)
+        assert device_cache.get(key) is not None
+        session.rollback()
+    assert _post(client, slot_id, key).status_code == 200
+
+    with get_session() as session:
+        crud.set_device_active(session, _device_id(slot_id), False)
+        session.commit()
+    assert device_cache.get(key) is None
+    assert _post(client, slot_id, key).status_code == 403
@@ -0,0 +1,68 @@
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import main
+
+URL = "/api/export/sensor-logs"
+
+
+@pytest.fixture
+def operator(monkeypatch):
+    monkeypatch.setattr(main.settings, "operator_api_key", "operator-secret")
+    monkeypatch.setattr(main, "_export_slots", threading.BoundedSemaphore(1))
+    return {"X-Operator-Key": "operator-secret"}
+
+
+def test_export_requires_operator_key(client, seed_slots, operator):
+    keys = seed_slots(3)
+    assert client.get(URL).status_code == 401
+    assert client.get(URL, headers={"X-Operator-Key": "wrong"}).status_code == 401
+    # a device key is not enough for a fleet-wide dump
+    assert client.get(URL, headers={"X-API-Key": next(iter(keys.values()))}).status_code == 401
+    response = client.get(URL, headers=operator)
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 3 * 60
+
+
+def test_export_is_disabled_without_operator_key(client, seed_slots, monkeypatch):
+    seed_slots(3)
+    monkeypatch.setattr(main.settings, "operator_api_key", "")
+    assert client.get(URL, headers={"X-Operator-Key": ""}).status_code == 403
+
+
+def test_concurrent_exports_are_capped(client, seed_slots, operator):
+    seed_slots(3)
+    assert main._export_slots.acquire(blocking=False)  # an export already streaming
+    response = client.get(URL, headers=operator)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"]
+    main._export_slots.release()
+
+    assert client.get(URL, headers=operator).status_code == 200
+    assert client.get(URL, headers=operator).status_code == 200  # the finished stream gave its slot back
+
+
+def test_export_slot_released_when_stream_is_dropped_unstarted():
+    released = []
+    stream = main._release_when_done(iter([b"x"]), lambda: released.append(1))
+    del stream
+    assert released == [1]
+
+    stream = main._release_when_done(iter([b"x"]), lambda: released.append(2))
+    assert list(stream) == [b"x"]
+    del stream
+    assert released == [1, 2]
+
+
+def test_resume_cursor_with_an_offset_continues_after_the_same_row(client, seed_slots, operator):
+    seed_slots(2)
+    rows = [json.loads(line) for line in client.get(URL, headers=operator).text.splitlines()]
+    last = rows[9]
+    utc = datetime.fromisoformat(last["timestamp"]).replace(tzinfo=timezone.utc)
+    for stamp in (utc.replace(tzinfo=None), utc.astimezone(timezone(timedelta(hours=7)))):
+        response = client.get(URL, headers=operator, params={"after": f"{stamp.isoformat()},{last['id']}"})
+        assert response.status_code == 200
+        assert [json.loads(line)["id"] for line in response.text.splitlines()] == [row["id"] for row in rows[10:]]
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import delete, insert
+
+from app.ai import generate_predictions
+from app.database import get_session
+from app.models import Prediction, SensorLog, SlotOccupancyHourly, SlotStatus
+from app.occupancy_model import ROLLING_WINDOW, set_active_model
+
+
+class RecordingModel:
+    version = "recording"
+
+    def __init__(self):
+        self.frames = []
+
+    def predict_proba(self, frame):
+        self.frames.append(frame)
+        return np.full(len(frame), 0.9)
+
+
+def test_model_sees_the_features_of_each_slots_newest_reading(seed_slots):
+    seed_slots(4)
+    last_reading = datetime(2026, 10, 14, 7, 30)  # a Wednesday
+    with get_session() as session:
+        session.execute(delete(SensorLog))
+        session.execute(
+            insert(SensorLog),
+            [
+                # T-0000: 20 readings, the last ROLLING_WINDOW of them a quarter occupied
+                {"slot_id": "T-0000", "status": int(j % 4 == 0), "timestamp": last_reading - timedelta(minutes=5 * (19 - j))}
+                for j in range(20)
+            ],
+        )
+        # T-0001 only has compacted history; T-0002/T-0003 have none at all
+        session.execute(insert(SlotOccupancyHourly), [{"slot_id": "T-0001", "hour": last_reading, "samples": 10, "occupied_samples": 8}])
+        session.commit()
+
+        model = RecordingModel()
+        set_active_model(model)
+        try:
+            generate_predictions(session)
+        finally:
+            set_active_model(None)
+        predictions = {p.slot_id: p for p in session.query(Prediction)}
+
+    (frame,) = model.frames
+    assert len(frame) == 1
+    row = frame.iloc[0]
+    assert row["hour"] == 7.5
+    assert row["weekday"] == 2
+    # the newest reading's status (available), as in training, not the slot row's current_status (occupied)
+    assert row["status"] == 0
+    assert row["rolling_occupancy"] == ROLLING_WINDOW // 4 / ROLLING_WINDOW
+    # the rollup-only slot keeps the heuristic's rollup ratio instead of a feature the model never saw
+    assert predictions["T-0001"].confidence == 0.8
+    assert predictions["T-0002"].predicted_status == SlotStatus.available.value
+    assert predictions["T-0002"].confidence == 0.7
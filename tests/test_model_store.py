@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import delete, func, select, update
+
+from app import main
+from app.config import Settings
+from app.database import get_session
+from app.models import ModelArtifact
+from app.occupancy_model import (
+    get_active_model,
+    latest_model_version,
+    load_stored_model,
+    load_training_logs,
+    set_active_model,
+    store_model,
+    train_model,
+)
+
+
+@pytest.fixture
+def trained(seed_slots):
+    seed_slots(20)
+    with get_session() as session:
+        session.execute(delete(ModelArtifact))
+        session.commit()
+        model = train_model(load_training_logs(session))
+    yield model
+    set_active_model(None)
+
+
+def test_database_store_round_trip_and_reload(monkeypatch, trained):
+    # the trainer (another machine) and the service only share the database
+    monkeypatch.setenv("MODEL_STORE", "database")
+    monkeypatch.setenv("MODEL_SIGNING_KEY", "trainer-and-service")
+    monkeypatch.setenv("MODEL_DIR", "/nonexistent")
+    with get_session() as session:
+        assert store_model(session, trained) == f"model_artifacts:{trained.version}"
+        session.commit()
+        assert latest_model_version(session) == trained.version
+        assert load_stored_model(session).version == trained.version
+
+    main._reload_model()
+    assert get_active_model().version == trained.version
+
+
+def test_database_store_keeps_newest_artifacts(monkeypatch, trained):
+    monkeypatch.setenv("MODEL_STORE", "database")
+    monkeypatch.setenv("MODEL_SIGNING_KEY", "trainer-and-service")
+    with get_session() as session:
+        for n in range(7):
+            trained.version = f"v{n}"
+            store_model(session, trained)
+        session.commit()
+        assert session.scalar(select(func.count()).select_from(ModelArtifact)) == 5
+        assert latest_model_version(session) == "v6"
+
+
+def test_directory_store_version_matches_model(monkeypatch, tmp_path, trained):
+    monkeypatch.setenv("MODEL_DIR", str(tmp_path))
+    with get_session() as session:
+        store_model(session, trained)
+        assert latest_model_version(session) == trained.version
+
+
+def test_database_store_refuses_unsigned_artifacts(monkeypatch, trained):
+    monkeypatch.setenv("MODEL_STORE", "database")
+    monkeypatch.setenv("MODEL_SIGNING_KEY", "trainer-and-service")
+    with get_session() as session:
+        store_model(session, trained)
+        # someone with write access to the table, but not the key, swaps the payload
+        session.execute(update(ModelArtifact).values(payload=b"not the signed pickle"))
+        session.commit()
+        with pytest.raises(ValueError, match="invalid signature"):
+            load_stored_model(session)
+
+    main._reload_model()
+    assert get_active_model() is None
+
+
+def test_database_store_needs_a_signing_key(monkeypatch):
+    monkeypatch.setenv("MODEL_STORE", "database")
+    with pytest.raises(ValueError, match="MODEL_SIGNING_KEY"):
+        Settings()
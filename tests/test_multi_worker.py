@@ -0,0 +1,139 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, insert
+
+from app.models import IoTDevice, ParkingSlot, SlotStatus
+from app.schema import upgrade_schema
+
+fakeredis = pytest.importorskip("fakeredis")
+ws_connect = pytest.importorskip("websockets.sync.client").connect
+
+ROOT = Path(__file__).resolve().parent.parent
+SLOTS = {"MW-01": "mw-key-01", "MW-02": "mw-key-02"}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def redis_url():
+    server = fakeredis.TcpFakeServer(("127.0.0.1", _free_port()))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"redis://127.0.0.1:{server.server_address[1]}/0"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    url = f"sqlite:///{tmp_path}/workers.db"
+    engine = create_engine(url)
+    upgrade_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(ParkingSlot),
+            [
+                {
+                    "slot_id": slot_id,
+                    "floor": "B1",
+                    "zone": "A",
+                    "distance_from_entry": 10,
+                    "current_status": SlotStatus.available.value,
+                    "last_updated": datetime.utcnow(),
+                }
+                for slot_id in SLOTS
+            ],
+        )
+        conn.execute(
+            insert(IoTDevice), [{"slot_id": slot_id, "api_key": key, "is_active": True} for slot_id, key in SLOTS.items()]
+        )
+    engine.dispose()
+    return url
+
+
+@pytest.fixture
+def workers(database_url, redis_url):
+    """Two separate app processes sharing the database and the (fake) Redis broadcast channel."""
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "DATABASE_URL": database_url,
+        "BROADCAST_BACKEND": "redis",
+        "BROADCAST_REDIS_URL": redis_url,
+        "ANALYTICS_ROLLUP_INTERVAL_SECONDS": "0",
+    }
+    ports = [_free_port(), _free_port()]
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT,
+            env=env,
+        )
+        for port in ports
+    ]
+    try:
+        deadline = time.monotonic() + 60
+        for port in ports:
+            while True:
+                try:
+                    if httpx.get(f"http://127.0.0.1:{port}/readyz").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    pytest.fail(f"worker on port {port} did not start")
+                time.sleep(0.1)
+        yield ports
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+def _wait_for_update(ws, slot_id: str, status: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        frame = json.loads(ws.recv(timeout=max(0.0, deadline - time.monotonic())))
+        for update in frame.get("updates", []):
+            if update.get("slot_id") == slot_id and update.get("status") == status:
+                return frame
+
+
+def test_updates_reach_clients_of_the_other_worker(workers):
+    port_a, port_b = workers
+    with ws_connect(f"ws://127.0.0.1:{port_a}/ws/slots") as ws_a, ws_connect(f"ws://127.0.0.1:{port_b}/ws/slots") as ws_b:
+        assert json.loads(ws_a.recv(timeout=10))["event"] == "snapshot"
+        assert json.loads(ws_b.recv(timeout=10))["event"] == "snapshot"
+
+        response = httpx.post(
+            f"http://127.0.0.1:{port_a}/api/iot/slot-update",
+            headers={"X-API-Key": SLOTS["MW-01"]},
+            json={"slot_id": "MW-01", "status": 1},
+        )
+        assert response.status_code == 200
+        # the worker that took the write and the other one both deliver it
+        _wait_for_update(ws_a, "MW-01", SlotStatus.occupied.value)
+        _wait_for_update(ws_b, "MW-01", SlotStatus.occupied.value)
+
+        response = httpx.post(
+            f"http://127.0.0.1:{port_b}/api/iot/slot-updates",
+            headers={"X-API-Key": SLOTS["MW-02"]},
+            json={"updates": [{"slot_id": slot_id, "status": 1, "api_key": key} for slot_id, key in SLOTS.items()]},
+        )
+        assert response.status_code == 200
+        frame = _wait_for_update(ws_a, "MW-02", SlotStatus.occupied.value)
+        assert frame["event"] == "slot_updates"
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app import crud
+from app.database import get_session
+from app.history import reading_history
+from app.models import ParkingSlot
+from app.slot_state import slot_state
+
+WIB = timezone(timedelta(hours=7))
+
+
+@pytest.fixture
+def loaded_stores(seed_slots):
+    keys = seed_slots(4)
+    with get_session() as session:
+        slot_state.load(session)
+        reading_history.load(session)
+    return keys
+
+
+def _db_last_updated(slot_id):
+    with get_session() as session:
+        return session.get(ParkingSlot, slot_id).last_updated
+
+
+def _store_last_updated(slot_id):
+    return slot_state._records[slot_id].last_updated
+
+
+def _history_newest(slot_id):
+    _, timestamps, _ = reading_history.recent([slot_id], limit=1)
+    return timestamps[0]
+
+
+def test_offset_timestamps_reach_stores_and_database_as_the_same_instant(client, loaded_stores):
+    keys = loaded_stores
+    (first, first_key), (second, second_key), (third, _) = list(keys.items())[:3]
+    moment = datetime.utcnow().replace(microsecond=0) + timedelta(minutes=1)
+    local = moment.replace(tzinfo=timezone.utc).astimezone(WIB)
+
+    response = client.post(
+        "/api/iot/slot-update", headers={"X-API-Key": first_key}, json={"slot_id": first, "status": 1, "timestamp": local.isoformat()}
+    )
+    assert response.status_code == 200
+    response = client.post(
+        "/api/iot/slot-updates",
+        headers={"X-API-Key": second_key},
+        json={
+            "updates": [
+                {"slot_id": second, "status": 1, "timestamp": local.isoformat(), "api_key": second_key},
+                {"slot_id": third, "status": 1, "timestamp": moment.isoformat() + "Z", "api_key": keys[third]},
+            ]
+        },
+    )
+    assert response.status_code == 200
+
+    for slot_id in (first, second, third):
+        assert _db_last_updated(slot_id) == moment
+        assert _store_last_updated(slot_id) == moment
+        assert _history_newest(slot_id) == np.datetime64(moment, "us")
+
+
+def test_crud_normalizes_aware_timestamps_for_every_caller(loaded_stores):
+    slot_id = next(iter(loaded_stores))
+    moment = datetime.utcnow().replace(microsecond=0) + timedelta(minutes=2)
+    with get_session() as session:
+        crud.log_sensor_updates_bulk(session, [(slot_id, 0, moment.replace(tzinfo=timezone.utc).astimezone(WIB))])
+        session.commit()
+    assert _db_last_updated(slot_id) == _store_last_updated(slot_id) == moment
+    assert _history_newest(slot_id) == np.datetime64(moment, "us")
@@ -0,0 +1,34 @@
+import pytest
+
+BUDGETS = {
+    "/api/parking/map": 1,
+    "/api/parking/map?floor=B1": 1,
+    "/api/parking/predictions": 1,
+    "/api/parking/recommendation?top_k=3": 3,
+    "/api/parking/recommendation?floor=B1&zone=B": 3,
+}
+
+
+@pytest.mark.parametrize("path,budget", BUDGETS.items())
+def test_read_routes_stay_within_query_budget(client, seed_slots, query_budget, path, budget):
+    seed_slots(200)
+    with query_budget(budget):
+        assert client.get(path).status_code == 200
+
+
+def test_ingest_routes_stay_within_query_budget(client, seed_slots, query_budget):
+    keys = seed_slots(200)
+    updates = [{"slot_id": slot_id, "status": 1, "api_key": key} for slot_id, key in keys.items()]
+    slot_id, key = next(iter(keys.items()))
+    with query_budget(10):
+        response = client.post("/api/iot/slot-updates", headers={"X-API-Key": key}, json={"updates": updates})
+        assert response.status_code == 200
+        response = client.post("/api/iot/slot-update", headers={"X-API-Key": key}, json={"slot_id": slot_id, "status": 0})
+        assert response.status_code == 200
+
+
+def test_query_budget_fails_over_budget(client, seed_slots, query_budget):
+    seed_slots(5)
+    with pytest.raises(pytest.fail.Exception, match=r"GET /api/parking/recommendation: \d+ queries \(budget 0\)"):
+        with query_budget(0):
+            client.get("/api/parking/recommendation")
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import func, select, update
+
+from app import crud
+from app.database import get_session
+from app.models import ParkingSlot, SensorLog, SlotStatus
+
+SIZES = (5, 50, 500)
+
+
+def _counts(seed_slots, count_queries, request_fn):
+    counts = {}
+    for size in SIZES:
+        seed_slots(size)
+        with count_queries() as counter:
+            request_fn()
+        counts[size] = counter.count
+    return counts
+
+
+@pytest.mark.parametrize("path", ["/api/parking/map", "/api/parking/map?floor=B1"])
+def test_map_query_count_is_flat(client, seed_slots, count_queries, path):
+    def request():
+        response = client.get(path)
+        assert response.status_code == 200
+
+    counts = _counts(seed_slots, count_queries, request)
+    assert len(set(counts.values())) == 1, counts
+
+
+@pytest.mark.parametrize("path", ["/api/parking/recommendation", "/api/parking/recommendation?floor=B1&zone=B"])
+def test_recommendation_query_count_is_flat(client, seed_slots, count_queries, path):
+    def request():
+        response = client.get(path)
+        assert response.status_code == 200
+        assert response.json()["recommended"] is not None
+
+    counts = _counts(seed_slots, count_queries, request)
+    assert len(set(counts.values())) == 1, counts
+
+
+def test_recent_occupancy_ratios_use_last_logs_of_each_slot(seed_slots):
+    seed_slots(5, logs_per_slot=120)
+    with get_session() as session:
+        # everything before the last 50 logs is occupied; the last 50 alternate
+        newest = session.scalar(select(func.max(SensorLog.timestamp)))
+        session.execute(
+            update(SensorLog).where(SensorLog.timestamp <= newest - timedelta(minutes=5 * 50)).values(status=1)
+        )
+        session.commit()
+        ratios = crud.get_recent_occupancy_ratios(session, limit=50)
+        overall = session.scalar(select(func.avg(SensorLog.status)))
+    assert overall > 0.7
+    assert ratios == {slot_id: pytest.approx(0.5) for slot_id in ratios}
+    assert len(ratios) == 5
+
+
+def test_batch_ingest_query_count_is_flat(client, seed_slots, count_queries):
+    counts = {}
+    for size in (10, 100, 300):
+        keys = seed_slots(size)
+        updates = [{"slot_id": slot_id, "status": 1, "api_key": key} for slot_id, key in keys.items()]
+        with count_queries() as counter:
+            response = client.post("/api/iot/slot-updates", headers={"X-API-Key": updates[0]["api_key"]}, json={"updates": updates})
+        assert response.status_code == 200
+        assert response.json()["accepted"] == size
+        counts[size] = counter.count
+        with get_session() as session:
+            occupied = session.scalar(
+                select(func.count()).where(ParkingSlot.current_status == SlotStatus.occupied.value)
+            )
+        assert occupied == size
+    assert len(set(counts.values())) == 1, counts
+
+
+def test_single_update_query_count_is_flat(client, seed_slots, count_queries):
+    counts = {}
+    for size in (10, 100, 300):
+        keys = seed_slots(size)
+        slot_id, key = next(iter(keys.items()))
+        with count_queries() as counter:
+            response = client.post("/api/iot/slot-update", headers={"X-API-Key": key}, json={"slot_id": slot_id, "status": 1})
+        assert response.status_code == 200
+        counts[size] = counter.count
+    assert len(set(counts.values())) == 1, counts
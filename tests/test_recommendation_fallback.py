@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database import get_session
+from app.history import reading_history
+from app.recommendation import RECENT_LOGS, recommendation_index
+
+
+@pytest.mark.parametrize("query", ["top_k=3", "top_k=3&floor=B1&zone=B"])
+def test_fallback_honours_top_k_and_matches_the_index(client, seed_slots, query):
+    seed_slots(12)
+    assert not recommendation_index.ready
+    fallback = client.get(f"/api/parking/recommendation?{query}").json()
+    assert fallback["recommended"] is not None
+    assert len(fallback["alternatives"]) == 2
+
+    with get_session() as session:
+        recommendation_index.rebuild(session)
+    indexed = client.get(f"/api/parking/recommendation?{query}").json()
+    assert fallback == indexed
+
+
+def test_consistency_check_catches_drift_shared_with_the_history(seed_slots):
+    seed_slots(12)
+    with get_session() as session:
+        reading_history.load(session)
+        recommendation_index.rebuild(session)
+        assert recommendation_index.check_consistency(session) == []
+
+        # readings that reached the in-process stores but never the database
+        best = recommendation_index.top(1)[0].slot_id
+        moment = datetime.utcnow()
+        for n in range(RECENT_LOGS):
+            status = 1 if n < RECENT_LOGS - 1 else 0
+            reading_history.append(best, moment + timedelta(seconds=n), status)
+            recommendation_index.record_reading(best, status, moment + timedelta(seconds=n))
+        assert recommendation_index.top(1)[0].slot_id != best
+        assert recommendation_index.check_consistency(session)
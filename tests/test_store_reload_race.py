@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import desc, select
+
+from app import crud
+from app.database import get_session
+from app.history import reading_history
+from app.models import SensorLog
+from app.recommendation import RECENT_LOGS, recommendation_index
+
+SLOT = "T-0001"
+
+
+class CommitsBeforeFirstQuery:
+    """The session a store loads from, with a reading committed elsewhere just before its first query.
+
+    That reading reaches the store both through the replay (its on_commit) and
+    through the query, which already sees it.
+    """
+
+    def __init__(self, session):
+        self._session = session
+        self.committed_at = None
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def _commit_reading(self):
+        if self.committed_at is None:
+            self.committed_at = datetime.utcnow().replace(microsecond=0)
+            with get_session() as other:
+                crud.log_sensor_update(other, SLOT, 1, self.committed_at)
+                other.commit()
+
+    def execute(self, *args, **kwargs):
+        self._commit_reading()
+        return self._session.execute(*args, **kwargs)
+
+    def scalars(self, *args, **kwargs):
+        self._commit_reading()
+        return self._session.scalars(*args, **kwargs)
+
+
+def _db_statuses(limit):
+    with get_session() as session:
+        rows = session.execute(
+            select(SensorLog.timestamp, SensorLog.status)
+            .where(SensorLog.slot_id == SLOT)
+            .order_by(desc(SensorLog.timestamp), desc(SensorLog.id))
+            .limit(limit)
+        ).all()
+    return [timestamp for timestamp, _ in rows], [status for _, status in rows]
+
+
+def test_history_load_keeps_a_reading_committed_during_the_load_once(seed_slots):
+    seed_slots(4)
+    with get_session() as session:
+        racing = CommitsBeforeFirstQuery(session)
+        reading_history.load(racing)
+    assert racing.committed_at is not None
+
+    _, timestamps, statuses = reading_history.recent([SLOT])
+    expected_timestamps, expected_statuses = _db_statuses(reading_history.capacity)
+    assert statuses.tolist() == expected_statuses
+    assert timestamps.tolist() == [np.datetime64(t, "us").tolist() for t in expected_timestamps]
+
+
+@pytest.mark.parametrize("from_history", [False, True])
+def test_index_rebuild_keeps_a_reading_committed_during_the_rebuild_once(seed_slots, from_history):
+    seed_slots(4)
+    if from_history:
+        with get_session() as session:
+            reading_history.load(session)
+    with get_session() as session:
+        racing = CommitsBeforeFirstQuery(session)
+        recommendation_index.rebuild(racing)
+    assert racing.committed_at is not None
+
+    _, expected = _db_statuses(RECENT_LOGS)
+    entry = recommendation_index._slots[SLOT]
+    assert list(entry.recent) == expected[::-1]
+    assert not entry.available
+
+
+def test_clear_resets_ready(seed_slots):
+    seed_slots(2)
+    with get_session() as session:
+        reading_history.load(session)
+        recommendation_index.rebuild(session)
+    reading_history.clear()
+    recommendation_index.clear()
+    assert not reading_history.ready
+    assert not recommendation_index.ready
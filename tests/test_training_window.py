@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database import get_session
+from app.occupancy_model import check_training_window, load_training_logs
+
+
+def test_training_refuses_a_window_the_raw_logs_do_not_cover(seed_slots):
+    seed_slots(5)  # five hours of raw readings, as if everything older had been compacted
+    since = datetime.utcnow() - timedelta(days=90)
+    with get_session() as session:
+        logs = load_training_logs(session, since=since)
+    with pytest.raises(ValueError, match="cover 0.2 of the 90 requested days"):
+        check_training_window(logs, since)
+    check_training_window(logs, datetime.utcnow() - timedelta(hours=6))
+
+
+def test_training_refuses_without_raw_logs(seed_slots):
+    seed_slots(5)
+    since = datetime.utcnow()
+    with get_session() as session:
+        logs = load_training_logs(session, since=since)
+    with pytest.raises(ValueError, match="no raw sensor logs"):
+        check_training_window(logs, since)
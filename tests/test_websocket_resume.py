@@ -0,0 +1,22 @@
+def _resume(client, query: str) -> dict:
+    with client.websocket_connect(f"/ws/slots?{query}") as ws:
+        return ws.receive_json()
+
+
+def test_resume_requires_matching_epoch(client, seed_slots):
+    keys = seed_slots(5)
+    slot_id, key = next(iter(keys.items()))
+    with client.websocket_connect("/ws/slots") as ws:
+        snapshot = ws.receive_json()
+        assert snapshot["event"] == "snapshot"
+        response = client.post("/api/iot/slot-update", headers={"X-API-Key": key}, json={"slot_id": slot_id, "status": 1})
+        assert response.status_code == 200
+        assert ws.receive_json()["event"] == "slot_updates"
+    epoch, seq = snapshot["epoch"], snapshot["seq"]
+
+    replay = _resume(client, f"resume_from={seq}&epoch={epoch}")
+    assert replay["event"] == "slot_updates"
+    assert [update["slot_id"] for update in replay["updates"]] == [slot_id]
+
+    assert _resume(client, f"resume_from={seq}")["event"] == "snapshot"
+    assert _resume(client, f"resume_from={seq}&epoch=0000")["event"] == "snapshot"
@@ -0,0 +1,61 @@
+import asyncio
+import gc
+
+from app.websocket_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self, stall: bool = False):
+        self.stall = stall
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        if self.stall:
+            await asyncio.Event().wait()  # a client that never reads
+        self.sent.append(message)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_stop_cancels_and_awaits_client_senders():
+    async def scenario():
+        manager = ConnectionManager(batch_window_ms=1)
+        await manager.start()
+        sockets = [FakeWebSocket(stall=True), FakeWebSocket()]
+        for ws in sockets:
+            await manager.connect(ws)
+        tasks = [client.task for client in manager.clients.values()]
+        await manager.stop()
+        return manager, tasks
+
+    manager, tasks = asyncio.run(scenario())
+    assert not manager.clients
+    assert all(task.done() for task in tasks)
+
+
+def test_evicted_clients_are_closed_even_after_a_collection():
+    async def scenario():
+        manager = ConnectionManager(client_queue=1, slow_client_seconds=0, batch_window_ms=1)
+        ws = FakeWebSocket(stall=True)
+        await manager.connect(ws)
+        client = manager.clients[ws]
+        n = 0
+        while ws in manager.clients:  # queue of one, sender stuck on the first message
+            manager._enqueue(client, str(n))
+            n += 1
+        assert manager.evicted == 1
+        assert len(manager._closing) == 1
+        gc.collect()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        await manager.stop()
+        return manager, ws
+
+    manager, ws = asyncio.run(scenario())
+    assert ws.closed_with == 1013
+    assert not manager._closing